@@ -0,0 +1,394 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import resource
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import instrument
+
+# Benchmark suite for the scripts' hot functions. Inputs are generated from a
+# seed (Verilog trees, filelists, <pl> templates, debug-bus RTL, workbooks), so
+# the same --seed and scale always produce the same files. Each case runs in a
+# fresh process and every timed call in a child forked from it once the inputs
+# exist, so the peak RSS reported covers the call and not the input
+# generation. The results are written as JSON that can be stored and used as
+# a --baseline.
+
+SCALES = {'small': 1, 'medium': 10, 'large': 100}
+DEFAULT_THRESHOLD = 0.2
+
+TARGET_MODULE = 'bench_target'
+HEADER_LINE = '// bench header'
+
+# Generators
+
+def gen_verilog_tree(root, files=20, lines_per_file=200, instance_density=0.05, seed=0, depth=3):
+    """Write a tree of .v files, each one module with ports, logic and instances.
+
+    Roughly instance_density of the body lines are instantiations, a tenth of
+    them of TARGET_MODULE. Some instances sit in comments or `ifdef blocks.
+    Returns the list of paths.
+    """
+    rng = random.Random(seed)
+    paths = []
+    for n in range(files):
+        directory = os.path.join(root, *[f"d{rng.randrange(4)}" for _ in range(rng.randrange(depth + 1))])
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"m{n}.v")
+        lines = [HEADER_LINE, f"module m{n} ("]
+        nports = rng.randint(4, 16)
+        for p in range(nports):
+            direction = rng.choice(('input', 'output'))
+            kind = rng.choice(('wire', 'reg', 'logic'))
+            width = rng.choice(('', '[7:0] ', '[31:0] ', '[WIDTH-1:0] '))
+            lines.append(f"    {direction} {kind} {width}p{p}{',' if p < nports - 1 else ''}")
+        lines.append(");")
+        for i in range(max(lines_per_file - len(lines) - 1, 0)):
+            roll = rng.random()
+            if roll < instance_density:
+                module = TARGET_MODULE if rng.random() < 0.1 else f"m{rng.randrange(files)}"
+                instance = f"    {module} #(.WIDTH({rng.choice((8, 16, 32))})) u{i} (.clk(clk), .d(s{i}), .q(q{i}));"
+                if rng.random() < 0.1:
+                    instance = f"    // {instance.strip()}"
+                elif rng.random() < 0.1:
+                    instance = f"`ifdef BENCH_OPT\n{instance}\n`endif"
+                lines.append(instance)
+            elif roll < 0.3:
+                lines.append(f"    // comment {rng.getrandbits(32):08x}")
+            else:
+                lines.append(f"    assign s{i} = p{rng.randrange(nports)} ^ {rng.getrandbits(16)};")
+        lines.append("endmodule")
+        with open(path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        paths.append(path)
+    return paths
+
+def gen_change_file(path):
+    # A unified diff that rewrites HEADER_LINE, so it applies to every generated module
+    with open(path, 'w') as f:
+        f.write(f"--- a.v\n+++ a.v\n@@ -1,1 +1,1 @@\n-{HEADER_LINE}\n+{HEADER_LINE} (patched)\n")
+    return path
+
+def gen_filelists(directory, lines=20000, sublist_fraction=0.1, seed=0):
+    """Write a superlist of `lines` paths and a sublist naming a fraction of them."""
+    rng = random.Random(seed)
+    superlist = os.path.join(directory, 'super.f')
+    sublist = os.path.join(directory, 'sub.f')
+    with open(superlist, 'w') as sup, open(sublist, 'w') as sub:
+        for n in range(lines):
+            name = f"file_{n}.sv"
+            path = f"/proj/{rng.choice(('rtl', 'tb', 'ip', 'lib'))}/{rng.getrandbits(16):04x}/{name}"
+            sup.write(path + '\n')
+            if rng.random() < sublist_fraction:
+                sub.write(f"../other/{name}\n")
+    return sublist, superlist
+
+def gen_pl_template(path, lines=5000, seed=0, max_depth=6):
+    """Write a template with nested <pl> if/elsif/else/for blocks around Verilog lines."""
+    rng = random.Random(seed)
+    out = []
+    depth = 0
+    while len(out) < lines:
+        roll = rng.random()
+        if roll < 0.08 and depth < max_depth:
+            out.append(f"<pl> if ($cfg{{{rng.randrange(50)}}} == {rng.randrange(4)}) {{")
+            depth += 1
+        elif roll < 0.10 and depth < max_depth:
+            out.append(f"<pl> for ($i{depth} = 0; $i{depth} < {rng.randrange(1, 8)}; $i{depth}++) {{")
+            depth += 1
+        elif roll < 0.13 and depth:
+            out.append(f"<pl> }} elsif ($mode == {rng.randrange(4)}) {{")
+        elif roll < 0.15 and depth:
+            out.append("<pl> } else {")
+        elif roll < 0.22 and depth:
+            out.append("<pl> }")
+            depth -= 1
+        else:
+            out.append(f"    assign w{len(out)} = r{rng.randrange(1000)};")
+    out.extend(["<pl> }"] * depth)
+    with open(path, 'w') as f:
+        f.write('\n'.join(out) + '\n')
+    return path
+
+def gen_debug_bus_rtl(path, buses=50, fields_per_bus=8, seed=0):
+    """Write debug-bus RTL in the form rtl2json.py reads (fields with // [msb:lsb] comments)."""
+    rng = random.Random(seed)
+    out = ["module dbg_top;", "// Begin of Debug Bus", "always @* begin"]
+    for b in range(buses):
+        widths = [rng.choice((1, 4, 8, 16)) for _ in range(fields_per_bus)]
+        msb = sum(widths) - 1
+        out.append(f"    assign dbg_bus{b} = {{")
+        for f, width in enumerate(widths):
+            lsb = msb - width + 1
+            separator = ',' if f < fields_per_bus - 1 else ''
+            out.append(f"        field{b}_{f}[{width - 1}:0]{separator} // [{msb}:{lsb}]")
+            msb = lsb - 1
+        out.append("    };")
+    out += ["end", "// End of Debug Bus", "endmodule"]
+    with open(path, 'w') as f:
+        f.write('\n'.join(out) + '\n')
+    return path
+
+def gen_workbook(path, sheets=5, rows=200, seed=0):
+    """Write a workbook with one Field/Comment sheet per queue (needs pandas and openpyxl)."""
+    import pandas as pd
+    rng = random.Random(seed)
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for s in range(sheets):
+            frame = pd.DataFrame({
+                'Field': [f"fld_{s}_{r}-{rng.choice(('a', 'b', 'c'))}" for r in range(rows)],
+                'Comment': [f"comment {rng.getrandbits(24):06x}" for _ in range(rows)],
+                'Reset': [rng.randrange(2) for _ in range(rows)],
+            })
+            frame.to_excel(writer, sheet_name=f"Queue_{s}", index=False)
+    return path
+
+# Cases: setup(workdir, factor, seed) -> (run, units, unit name, bytes)
+
+def _tree_bytes(paths):
+    return sum(os.path.getsize(p) for p in paths)
+
+def _setup_patch(workdir, factor, seed, parallel=False):
+    import patch
+    root = os.path.join(workdir, 'tree')
+    paths = gen_verilog_tree(root, files=20 * factor, seed=seed)
+    change_file = gen_change_file(os.path.join(workdir, 'change.diff'))
+    if parallel:
+        run = lambda: patch.apply_patch_to_files_parallel([TARGET_MODULE], change_file, root, [])
+    else:
+        run = lambda: patch.apply_patch_to_files([TARGET_MODULE], change_file, root, [])
+    return run, len(paths), 'files', _tree_bytes(paths)
+
+def _setup_extract_vports(workdir, factor, seed):
+    import extract_vports
+    paths = gen_verilog_tree(os.path.join(workdir, 'tree'), files=20 * factor, seed=seed)
+    run = lambda: [extract_vports.extract_vports(p) for p in paths]
+    return run, len(paths), 'files', _tree_bytes(paths)
+
+def _setup_extract_vports_batch(workdir, factor, seed):
+    import extract_vports
+    paths = gen_verilog_tree(os.path.join(workdir, 'tree'), files=20 * factor, seed=seed)
+    output = os.path.join(workdir, 'ports.jsonl')
+    run = lambda: extract_vports.extract_vports_batch(paths, output)
+    return run, len(paths), 'files', _tree_bytes(paths)
+
+def _setup_find_if_statements(workdir, factor, seed):
+    import detif
+    path = gen_pl_template(os.path.join(workdir, 'template.pl'), lines=5000 * factor, seed=seed)
+    lines = 5000 * factor
+    # The last line is the worst case for the line-by-line scan
+    run = lambda: detif.find_if_statements(lines, path)
+    return run, lines, 'lines', os.path.getsize(path)
+
+def _setup_condition_map(workdir, factor, seed):
+    import detif
+    path = gen_pl_template(os.path.join(workdir, 'template.pl'), lines=5000 * factor, seed=seed)
+    lines = 5000 * factor
+    run = lambda: detif.ConditionMap.from_file(path).describe(lines)
+    return run, lines, 'lines', os.path.getsize(path)
+
+def _setup_filter_files(workdir, factor, seed, streaming=False):
+    import filter_filelist
+    lines = 20000 * factor
+    sublist, superlist = gen_filelists(workdir, lines=lines, seed=seed)
+    output = os.path.join(workdir, 'filtered.f')
+    if streaming:
+        run = lambda: filter_filelist.filter_files_streaming([sublist], superlist, [output])
+    else:
+        run = lambda: filter_filelist.filter_files(sublist, superlist, output)
+    return run, lines, 'lines', os.path.getsize(sublist) + os.path.getsize(superlist)
+
+def _setup_rtl2json(workdir, factor, seed):
+    from rtl2json.rtl2json import rtl2json
+    path = gen_debug_bus_rtl(os.path.join(workdir, 'dbg.v'), buses=50 * factor, seed=seed)
+    run = lambda: rtl2json(path)
+    return run, 50 * factor, 'buses', os.path.getsize(path)
+
+def _setup_read_queue_fields(workdir, factor, seed, fast=False):
+    import xls2json
+    rows = 200 * factor
+    path = gen_workbook(os.path.join(workdir, 'queues.xlsx'), rows=rows, seed=seed)
+    if fast:
+        # The uncached parse; a cache hit would only measure a JSON load
+        run = lambda: xls2json._parse_workbook_fast(path)
+    else:
+        run = lambda: xls2json.read_queue_fields_from_excel(path)
+    return run, 5 * rows, 'rows', os.path.getsize(path)
+
+CASES = {
+    'apply_patch_to_files': _setup_patch,
+    'apply_patch_to_files_parallel': lambda w, f, s: _setup_patch(w, f, s, parallel=True),
+    'extract_vports': _setup_extract_vports,
+    'extract_vports_batch': _setup_extract_vports_batch,
+    'find_if_statements': _setup_find_if_statements,
+    'ConditionMap': _setup_condition_map,
+    'filter_files': _setup_filter_files,
+    'filter_files_streaming': lambda w, f, s: _setup_filter_files(w, f, s, streaming=True),
+    'rtl2json': _setup_rtl2json,
+    'read_queue_fields_from_excel': _setup_read_queue_fields,
+    'read_queue_fields_fast': lambda w, f, s: _setup_read_queue_fields(w, f, s, fast=True),
+}
+
+# Running
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS; pools count as children
+    scale = 1 if sys.platform == 'darwin' else 1024
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak * scale / (1 << 20)
+
+def _timed_run(run):
+    # Time run in a forked child: its peak RSS starts from what the process
+    # holds at the fork (the inputs and imported modules), not from the peak
+    # the input generators reached
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        try:
+            start = time.perf_counter()
+            run()
+            report = {'wall_s': time.perf_counter() - start, 'peak_rss_mb': _peak_rss_mb()}
+        except BaseException as e:
+            report = {'error': f"{type(e).__name__}: {e}"}
+        sys.stdout.flush()
+        os.write(write_fd, json.dumps(report).encode())
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd, 'rb') as pipe:
+        data = pipe.read()
+    os.waitpid(pid, 0)
+    report = json.loads(data) if data else {'error': 'benchmark process died'}
+    if 'error' in report:
+        raise RuntimeError(report['error'])
+    return report['wall_s'], report['peak_rss_mb']
+
+def _run_case(case, scale, factor, seed, repeat):
+    # Runs in its own process. The scripts print progress, so stdout (including
+    # that of `patch` subprocesses) goes to /dev/null while timing.
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    saved = os.dup(1)
+    walls, peaks = [], []
+    try:
+        for _ in range(repeat):
+            # Fresh inputs every repeat, since some cases modify them
+            workdir = tempfile.mkdtemp(prefix='bench_')
+            try:
+                run, units, unit, nbytes = CASES[case](workdir, factor, seed)
+                sys.stdout.flush()
+                os.dup2(devnull, 1)
+                try:
+                    wall, peak = _timed_run(run)
+                    walls.append(wall)
+                    peaks.append(peak)
+                finally:
+                    sys.stdout.flush()
+                    os.dup2(saved, 1)
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+    finally:
+        os.close(devnull)
+        os.close(saved)
+
+    wall = min(walls)
+    return {
+        'case': case,
+        'scale': scale,
+        'factor': factor,
+        'units': units,
+        'unit': unit,
+        'bytes': nbytes,
+        'wall_s': wall,
+        'walls_s': walls,
+        'peak_rss_mb': max(peaks),
+        'units_per_s': units / wall if wall else None,
+        'mb_per_s': nbytes / wall / (1 << 20) if wall else None,
+    }
+
+def run_benchmarks(cases, scales, seed=0, repeat=3):
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for case in cases:
+        for scale in scales:
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                try:
+                    result = executor.submit(_run_case, case, scale, SCALES[scale], seed, repeat).result()
+                except Exception as e:
+                    # e.g. a missing optional dependency for one case
+                    result = {'case': case, 'scale': scale, 'error': f"{type(e).__name__}: {e}"}
+            results.append(result)
+            if 'error' in result:
+                print(f"{case:<32} {scale:<7} failed: {result['error']}")
+            else:
+                print(f"{case:<32} {scale:<7} {result['wall_s']:9.3f}s {result['peak_rss_mb']:8.1f} MB "
+                      f"{result['units_per_s']:12.0f} {result['unit']}/s {result['mb_per_s']:8.2f} MB/s")
+    return results
+
+def find_regressions(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """Results whose wall time exceeds the baseline's by more than threshold (a fraction)."""
+    previous = {(r['case'], r['scale']): r for r in baseline.get('results', []) if 'error' not in r}
+    regressions = []
+    for result in results:
+        old = previous.get((result['case'], result['scale']))
+        if old is None or 'error' in result:
+            continue
+        ratio = result['wall_s'] / old['wall_s'] if old['wall_s'] else float('inf')
+        if ratio > 1 + threshold:
+            regressions.append({'case': result['case'], 'scale': result['scale'],
+                                'baseline_s': old['wall_s'], 'wall_s': result['wall_s'], 'ratio': ratio})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot functions on seeded synthetic inputs.')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES), help='Cases to run (default: all)')
+    parser.add_argument('--scales', nargs='+', choices=list(SCALES), default=['small', 'medium'],
+                        help='Input scales (default: small medium)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the input generators')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per case; the fastest is reported')
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help='Results JSON file')
+    parser.add_argument('--baseline', help='Results JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed slowdown against the baseline as a fraction (default: 0.2)')
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args):
+        results = run_benchmarks(args.cases, args.scales, args.seed, args.repeat)
+        report = {
+            'meta': {
+                'seed': args.seed,
+                'repeat': args.repeat,
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'results': results,
+        }
+
+        regressions = []
+        if args.baseline:
+            with open(args.baseline, 'r') as f:
+                regressions = find_regressions(results, json.load(f), args.threshold)
+            report['regressions'] = regressions
+            for r in regressions:
+                print(f"REGRESSION {r['case']} ({r['scale']}): {r['baseline_s']:.3f}s -> {r['wall_s']:.3f}s ({r['ratio']:.2f}x)")
+            print(f"{len(regressions)} regression(s) against {args.baseline}")
+
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"Results written to {args.output}")
+
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,36 @@
+import os
 import re
 import sys
+import json
+import time
+import bisect
+import io
 import argparse
+import instrument
+from concurrent.futures import ProcessPoolExecutor
 
-def find_if_statements(line_number, file_path, debug=False):
+def iter_line_conditions(code_lines, debug=False, start=1, state=None, checkpoints=None, checkpoint_every=256):
+    # Yields (line number, conditions in effect after that line) for every line.
+    # Parsing can resume at line `start` from a saved state, and when a
+    # checkpoints dict is given the state before every checkpoint_every-th
+    # line is saved into it, keyed by line number.
     if_pattern = re.compile(r'^\s*<pl>\s*if\s*\((.*?)\)\s*(?:\{)?')
     else_pattern = re.compile(r'^\s*<pl>\s*}\s*else\s*(?:\{)?')
     elsif_pattern = re.compile(r'^\s*<pl>\s*}\s*elsif\s*\((.*?)\)\s*(?:\{)?')
     for_pattern = re.compile(r'^\s*<pl>\s*for\s*\(\$(.*?)=.*?\)\s*(?:\{)?')
     closing_brace_pattern = re.compile(r'^\s*<pl>\s*}\s*$')
     
-    with open(file_path, 'r') as f:
-        code_lines = f.readlines()
-
     condition_stack = []
     brace_stack = []
     nesting_depth = 0
     current_conditions = []
+    if state is not None:
+        condition_stack, brace_stack, nesting_depth, current_conditions = (
+            list(state[0]), list(state[1]), state[2], list(state[3]))
 
-    for i, line in enumerate(code_lines, 1):
+    for i, line in enumerate(code_lines, start):
+        if checkpoints is not None and (i - 1) % checkpoint_every == 0:
+            checkpoints[i] = (tuple(condition_stack), tuple(brace_stack), nesting_depth, tuple(current_conditions))
         line = line.strip()
         if debug:
             print(f"Processing line {i}: '{line}'")  # Debug print to show the line being processed
@@ -83,30 +96,359 @@ def find_if_statements(line_number, file_path, debug=False):
                     if debug:
                         print(f"Line {i}: Final closing brace encountered. Clearing condition_stack.")
         
+        yield i, current_conditions
+
+def describe_conditions(line_number, conditions):
+    if conditions:
+        return f"Line {line_number} is executed when: {' AND '.join(conditions)}"
+    else:
+        return f"Line {line_number} is not under any conditional block."
+
+def find_if_statements(line_number, file_path, debug=False):
+    with open(file_path, 'r') as f:
+        code_lines = f.readlines()
+    instrument.count('files_read')
+    instrument.count('lines_scanned', len(code_lines))
+
+    for i, current_conditions in iter_line_conditions(code_lines, debug):
         if i == line_number:
-            if current_conditions:
-                return f"Line {line_number} is executed when: {' AND '.join(current_conditions)}"
-            else:
-                return f"Line {line_number} is not under any conditional block."
+            return describe_conditions(line_number, current_conditions)
 
     return f"Line {line_number} is not under any conditional block."
 
+class ConditionMap:
+    # Line -> condition stack index built in one pass over a template.
+    # Every distinct stack is interned once as a tuple; lines are stored as
+    # runs (first line of each run, condition id), looked up with bisect.
+
+    # With checkpoint_every, the source lines and the parser state every
+    # checkpoint_every lines are kept as well, so update() can reparse an
+    # edited file from the last checkpoint before the first changed line.
+
+    def __init__(self, code_lines, debug=False, checkpoint_every=None):
+        self.conditions = []
+        self.run_starts = []
+        self.run_ids = []
+        self.total_lines = 0
+        self.debug = debug
+        self.checkpoint_every = checkpoint_every
+        self.checkpoints = {} if checkpoint_every else None
+        self.lines = None
+        self._interned = {}
+        if checkpoint_every:
+            self.lines = list(code_lines)
+            code_lines = self.lines
+        self._parse(code_lines, 1, None)
+
+    def _parse(self, code_lines, start, state):
+        interned = self._interned
+        last_id = self.run_ids[-1] if self.run_ids else None
+        self.total_lines = start - 1
+        for i, current_conditions in iter_line_conditions(code_lines, self.debug, start, state,
+                                                          self.checkpoints, self.checkpoint_every or 1):
+            key = tuple(current_conditions)
+            condition_id = interned.get(key)
+            if condition_id is None:
+                condition_id = interned[key] = len(self.conditions)
+                self.conditions.append(key)
+            if condition_id != last_id:
+                self.run_starts.append(i)
+                self.run_ids.append(condition_id)
+                last_id = condition_id
+            self.total_lines = i
+        instrument.count('lines_scanned', self.total_lines - start + 1)
+
+    def update(self, code_lines):
+        """Replace the source with code_lines, reparsing from the first changed line.
+
+        Returns the line number parsing resumed from (total_lines + 1 if
+        nothing changed). Needs a map built with checkpoint_every.
+        """
+        if self.lines is None:
+            raise ValueError("update() needs a ConditionMap built with checkpoint_every")
+        new_lines = list(code_lines)
+        old_lines = self.lines
+        first = 0
+        limit = min(len(old_lines), len(new_lines))
+        while first < limit and old_lines[first] == new_lines[first]:
+            first += 1
+        self.lines = new_lines
+        if first == len(old_lines) == len(new_lines):
+            return self.total_lines + 1
+
+        # Resume from the last checkpoint at or before the first changed line
+        changed_line = first + 1
+        resume = max((n for n in self.checkpoints if n <= changed_line), default=1)
+        state = self.checkpoints.get(resume)
+        for n in [n for n in self.checkpoints if n >= resume]:
+            del self.checkpoints[n]
+        keep = bisect.bisect_left(self.run_starts, resume)
+        del self.run_starts[keep:]
+        del self.run_ids[keep:]
+        self._parse(new_lines[resume - 1:], resume, state)
+        return resume
+
+    @classmethod
+    def from_file(cls, file_path, debug=False):
+        with open(file_path, 'r') as f:
+            return cls(f, debug)
+
+    def conditions_at(self, line_number):
+        if line_number < 1 or line_number > self.total_lines:
+            return ()
+        run = bisect.bisect_right(self.run_starts, line_number) - 1
+        return self.conditions[self.run_ids[run]]
+
+    def describe(self, line_number):
+        return describe_conditions(line_number, self.conditions_at(line_number))
+
+    def runs(self):
+        # (first line, last line, conditions) for every run
+        ends = self.run_starts[1:] + [self.total_lines + 1]
+        for start, end, condition_id in zip(self.run_starts, ends, self.run_ids):
+            yield start, end - 1, self.conditions[condition_id]
+
 def test_all_lines(file_path, debug=False):
-    with open(file_path, 'r') as f:
-        total_lines = len(f.readlines())
-    for line_number in range(1, total_lines + 1):
-        result = find_if_statements(line_number, file_path, debug)
+    condition_map = ConditionMap.from_file(file_path, debug)
+    for line_number in range(1, condition_map.total_lines + 1):
+        result = condition_map.describe(line_number)
         print(f"Line {line_number}: {result}")
 
+def query_file(file_path, line_numbers=None):
+    # Worker for the batch mode: build the map and answer every query for one file
+    condition_map = ConditionMap.from_file(file_path)
+    if line_numbers is None:
+        line_numbers = range(1, condition_map.total_lines + 1)
+    return file_path, {str(n): list(condition_map.conditions_at(n)) for n in line_numbers}
+
+def batch_query(file_paths, line_numbers=None, jobs=None):
+    # Parse many templates in parallel; returns {file: {line: [conditions]}}
+    results = {}
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [executor.submit(query_file, file_path, line_numbers) for file_path in file_paths]
+        for future in futures:
+            file_path, answers = future.result()
+            results[file_path] = answers
+    return results
+
+class QueryServer:
+    # Keeps a checkpointed ConditionMap per file and answers JSON-RPC 2.0
+    # requests (one JSON object per line) on stdin/stdout or a Unix socket.
+    # Files opened from disk are re-stat'ed on every query and reparsed
+    # incrementally when they change; files opened with "text" follow the
+    # editor buffer through "update" calls instead.
+    #
+    # Methods (params):
+    #   open     {file, text?}                   -> {lines, runs}
+    #   update   {file, text? | edits?}          -> {lines, reparsed_from}
+    #            edits: [{start, end, text}] replace lines start..end (1-based,
+    #            end = start - 1 inserts) with the lines of text
+    #   query    {file, line? | lines?, describe?} -> {conditions} or {results}
+    #   runs     {file}                          -> [[first, last, conditions]]
+    #   close    {file}
+    #   stats    {}                              -> per-file lines/runs/checkpoints
+    #   shutdown {}
+    # Every result carries elapsed_us, the time spent handling the request.
+
+    def __init__(self, checkpoint_every=256):
+        self.checkpoint_every = checkpoint_every
+        self.files = {}  # path -> [ConditionMap, (mtime_ns, size) or None when buffer-backed]
+        self.running = True
+
+    @staticmethod
+    def _read(path):
+        st = os.stat(path)
+        with open(path, 'r') as f:
+            return f.readlines(), (st.st_mtime_ns, st.st_size)
+
+    @staticmethod
+    def _split(text):
+        # Split and translate newlines as reading the file does; str.splitlines
+        # also breaks on form feeds, vertical tabs and Unicode separators
+        return io.StringIO(text, newline=None).readlines()
+
+    def _entry(self, params):
+        path = os.path.abspath(params['file'])
+        entry = self.files.get(path)
+        if entry is None:
+            self.open({'file': path})
+            entry = self.files[path]
+        elif entry[1] is not None:
+            st = os.stat(path)
+            if (st.st_mtime_ns, st.st_size) != entry[1]:
+                lines, entry[1] = self._read(path)
+                entry[0].update(lines)
+        return entry[0]
+
+    def open(self, params):
+        path = os.path.abspath(params['file'])
+        if 'text' in params:
+            lines, key = self._split(params['text']), None
+        else:
+            lines, key = self._read(path)
+        condition_map = ConditionMap(lines, checkpoint_every=self.checkpoint_every)
+        self.files[path] = [condition_map, key]
+        return {'lines': condition_map.total_lines, 'runs': len(condition_map.run_starts)}
+
+    def update(self, params):
+        path = os.path.abspath(params['file'])
+        if path not in self.files:
+            return self.open(params)
+        entry = self.files[path]
+        condition_map = entry[0]
+        if 'edits' in params:
+            lines = list(condition_map.lines)
+            # Apply from the bottom up so earlier line numbers stay valid
+            for edit in sorted(params['edits'], key=lambda e: e['start'], reverse=True):
+                lines[edit['start'] - 1:edit['end']] = self._split(edit['text'])
+            entry[1] = None
+        elif 'text' in params:
+            lines = self._split(params['text'])
+            entry[1] = None
+        else:
+            lines, entry[1] = self._read(path)
+        resumed = condition_map.update(lines)
+        return {'lines': condition_map.total_lines, 'reparsed_from': resumed}
+
+    def query(self, params):
+        condition_map = self._entry(params)
+        describe = params.get('describe', False)
+        answer = condition_map.describe if describe else (lambda n: list(condition_map.conditions_at(n)))
+        if 'lines' in params:
+            return {'results': {str(n): answer(n) for n in params['lines']}}
+        return {'conditions': answer(params['line'])}
+
+    def runs(self, params):
+        return [[first, last, list(conditions)] for first, last, conditions in self._entry(params).runs()]
+
+    def close(self, params):
+        self.files.pop(os.path.abspath(params['file']), None)
+        return {}
+
+    def stats(self, params):
+        return {path: {'lines': m.total_lines, 'runs': len(m.run_starts), 'checkpoints': len(m.checkpoints),
+                       'conditions': len(m.conditions), 'buffer': key is None}
+                for path, (m, key) in self.files.items()}
+
+    def shutdown(self, params):
+        self.running = False
+        return {}
+
+    METHODS = ('open', 'update', 'query', 'runs', 'close', 'stats', 'shutdown')
+
+    def handle(self, request):
+        """Handle one decoded JSON-RPC request; returns the response dict (None for notifications)."""
+        start = time.perf_counter()
+        request_id = request.get('id') if isinstance(request, dict) else None
+        try:
+            method = request.get('method') if isinstance(request, dict) else None
+            if method not in self.METHODS:
+                error = {'code': -32601, 'message': f"Method not found: {method}"}
+            else:
+                result = getattr(self, method)(request.get('params') or {})
+                if isinstance(result, dict):
+                    result['elapsed_us'] = (time.perf_counter() - start) * 1e6
+                else:
+                    result = {'runs': result, 'elapsed_us': (time.perf_counter() - start) * 1e6}
+                if 'id' not in request:
+                    return None
+                return {'jsonrpc': '2.0', 'id': request_id, 'result': result}
+        except KeyError as e:
+            error = {'code': -32602, 'message': f"Missing parameter: {e}"}
+        except (OSError, ValueError, TypeError, IndexError) as e:
+            error = {'code': -32000, 'message': str(e)}
+        return {'jsonrpc': '2.0', 'id': request_id, 'error': error}
+
+    def handle_line(self, line):
+        # One line of input -> one line of output ('' when nothing is to be sent)
+        try:
+            request = json.loads(line)
+        except ValueError as e:
+            return json.dumps({'jsonrpc': '2.0', 'id': None, 'error': {'code': -32700, 'message': str(e)}})
+        if isinstance(request, list):
+            responses = [r for r in map(self.handle, request) if r is not None]
+            return json.dumps(responses) if responses else ''
+        response = self.handle(request)
+        return json.dumps(response) if response is not None else ''
+
+def serve_stdio(server, infile=sys.stdin, outfile=sys.stdout):
+    for line in infile:
+        if not line.strip():
+            continue
+        response = server.handle_line(line)
+        if response:
+            outfile.write(response + '\n')
+            outfile.flush()
+        if not server.running:
+            break
+
+def serve_socket(server, socket_path):
+    import socketserver
+    import threading
+    lock = threading.Lock()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for raw in self.rfile:
+                line = raw.decode('utf-8')
+                if not line.strip():
+                    continue
+                with lock:
+                    response = server.handle_line(line)
+                if response:
+                    self.wfile.write((response + '\n').encode('utf-8'))
+                    self.wfile.flush()
+                if not server.running:
+                    threading.Thread(target=socket_server.shutdown).start()
+                    break
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.ThreadingUnixStreamServer(socket_path, Handler) as socket_server:
+        socket_server.daemon_threads = True
+        try:
+            socket_server.serve_forever()
+        finally:
+            os.remove(socket_path)
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Process a file to find conditional statements.")
-    parser.add_argument("file_path", help="Path to the file to be processed")
+    parser.add_argument("file_path", nargs="?", help="Path to the file to be processed")
     parser.add_argument("line_number", nargs="?", type=int, help="Specific line number to process")
     parser.add_argument("-debug", action="store_true", help="Enable debug messages")
+    parser.add_argument("--batch", nargs="+", default=[], metavar="FILE", help="Template files to query in batch mode (JSON output)")
+    parser.add_argument("--lines", nargs="+", type=int, metavar="N", help="Line numbers to query in batch mode")
+    parser.add_argument("--all", action="store_true", help="Query every line in batch mode")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes for batch mode")
+    parser.add_argument("--serve", action="store_true", help="Answer JSON-RPC queries on stdin/stdout until shutdown")
+    parser.add_argument("--socket", metavar="PATH", help="Answer JSON-RPC queries on a Unix socket instead of stdin")
+    parser.add_argument("--checkpoint-every", type=int, default=256, metavar="N",
+                        help="Lines between saved parser states in server mode")
+    instrument.add_arguments(parser)
 
     args = parser.parse_args()
 
-    if args.line_number:
-        print(find_if_statements(args.line_number, args.file_path, args.debug))
-    else:
-        test_all_lines(args.file_path, args.debug)
\ No newline at end of file
+    with instrument.session(args):
+        if args.serve or args.socket:
+            server = QueryServer(args.checkpoint_every)
+            if args.file_path:
+                server.open({'file': args.file_path})
+            if args.socket:
+                serve_socket(server, args.socket)
+            else:
+                serve_stdio(server)
+        elif args.batch or args.lines or args.all:
+            file_paths = ([args.file_path] if args.file_path else []) + args.batch
+            if not file_paths:
+                parser.error("batch mode needs at least one file")
+            if not args.all and not args.lines:
+                parser.error("batch mode needs --lines or --all")
+            line_numbers = None if args.all else args.lines
+            json.dump(batch_query(file_paths, line_numbers, args.jobs), sys.stdout, indent=4)
+            print()
+        elif not args.file_path:
+            parser.error("the following arguments are required: file_path")
+        elif args.line_number:
+            print(find_if_statements(args.line_number, args.file_path, args.debug))
+        else:
+            test_all_lines(args.file_path, args.debug)
\ No newline at end of file
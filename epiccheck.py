@@ -0,0 +1,175 @@
+import os
+import re
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import instrument
+
+# Python version of epiccheck. The supported/unsupported/exception tables are
+# read from the Perl script itself so there is only one copy of them. Every
+# "0"/"1"/"." pattern becomes an integer (mask, value) pair, and instruction
+# words are classified a batch at a time with NumPy instead of matching each
+# word's binary string against every regex. The output matches epiccheck.
+
+TABLES_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'epiccheck')
+TABLE_NAMES = ('supported_list', 'unsupported_list', 'unsupported_exc_list')
+
+ADDRESS_PATTERN = re.compile(r'[0-9a-f]+:')
+INSTRUCTION_PATTERN = re.compile(r'[0-9a-f]{8}')
+
+BATCH_SIZE = 1 << 16
+
+_HEX_LUT = np.zeros(256, dtype=np.uint32)
+for _i, _c in enumerate(b'0123456789abcdef'):
+    _HEX_LUT[_c] = _i
+
+def read_pattern_tables(script=TABLES_SCRIPT):
+    """Return {table name: [pattern]} from the @..._list arrays of a Perl script."""
+    with open(script, 'r') as f:
+        text = f.read()
+    tables = {}
+    for name in TABLE_NAMES:
+        body = re.search(rf'^@{name}\s*=\s*\((.*?)^\);', text, re.MULTILINE | re.DOTALL).group(1)
+        # Commented-out entries start with '#' before the quoted pattern
+        tables[name] = re.findall(r'^\s*"([01.]{32})"', body, re.MULTILINE)
+    return tables
+
+def compile_patterns(patterns):
+    # "0"/"1" positions become mask bits with the matching value bit; "." is don't-care
+    masks = np.array([int(p.replace('0', '1').replace('.', '0'), 2) for p in patterns], dtype=np.uint32)
+    values = np.array([int(p.replace('.', '0'), 2) for p in patterns], dtype=np.uint32)
+    return masks, values
+
+def matches_any(words, compiled):
+    masks, values = compiled
+    if not len(masks):
+        return np.zeros(len(words), dtype=bool)
+    return ((words[:, None] & masks[None, :]) == values[None, :]).any(axis=1)
+
+def classify(words, tables):
+    """Boolean array: True where the instruction word is supported.
+
+    Mirrors the Perl loops: a word is supported when it matches the supported
+    list and either matches nothing in the unsupported list or matches the
+    exception list.
+    """
+    supported = matches_any(words, tables['supported_list'])
+    unsupported = matches_any(words, tables['unsupported_list'])
+    exception = matches_any(words, tables['unsupported_exc_list'])
+    return supported & (~unsupported | exception)
+
+def hex_to_words(hex_words):
+    digits = _HEX_LUT[np.frombuffer(''.join(hex_words).encode('ascii'), dtype=np.uint8)].reshape(-1, 8)
+    shifts = np.arange(28, -1, -4, dtype=np.uint32)
+    return np.bitwise_or.reduce(digits << shifts, axis=1)
+
+def iter_instructions(listing_file):
+    # Yield (line number, instruction hex, third token) like the Perl loop:
+    # up to 4 8-digit hex words right after a "<hex address>:" token
+    with open(listing_file, 'r', errors='replace') as fh:
+        for line_number, line in enumerate(fh, 1):
+            tokens = line.split()
+            if not tokens or not ADDRESS_PATTERN.fullmatch(tokens[0]):
+                continue
+            op_code = tokens[2] if len(tokens) > 2 else None
+            for token in tokens[1:5]:
+                if not INSTRUCTION_PATTERN.fullmatch(token):
+                    break
+                yield line_number, token, op_code
+
+def verbosity_level(verbosity):
+    # Perl numeric conversion: leading number, anything else is 0
+    match = re.match(r'\s*[-+]?\d+(\.\d*)?', str(verbosity))
+    return float(match.group()) if match else 0.0
+
+def check_listing(listing_file, verbosity=2, tables=None, out=None):
+    """Check one listing and write epiccheck's report to out (default stdout)."""
+    out = out or sys.stdout
+    tables = tables or {name: compile_patterns(p) for name, p in read_pattern_tables().items()}
+    verbose = verbosity_level(verbosity) > 1
+
+    instructions = 0
+    unsupported_cnt = 0
+    counts = {}  # op code -> count, in first-seen order
+
+    batch = []
+    def flush():
+        nonlocal unsupported_cnt
+        supported = classify(hex_to_words([hex_word for _, hex_word, _ in batch]), tables)
+        for (line_number, hex_word, op_code), ok in zip(batch, supported.tolist()):
+            if ok:
+                continue
+            if verbose:
+                out.write(f"{listing_file}:{line_number}: unsupported instruction: {hex_word}\n")
+            counts[op_code] = counts.get(op_code, 0) + 1
+            unsupported_cnt += 1
+        batch.clear()
+
+    for item in iter_instructions(listing_file):
+        batch.append(item)
+        instructions += 1
+        if len(batch) >= BATCH_SIZE:
+            flush()
+    if batch:
+        flush()
+
+    for op_code, count in counts.items():
+        # Perl keeps lines without a third token in the hidden counter slot 0
+        if op_code is not None:
+            out.write(f"{op_code}\t{count}\n")
+    out.write(f"Unsupported Instructions: {unsupported_cnt}\n")
+    out.write(f"Instructions: {instructions}\n ")
+    instrument.count('instructions', instructions)
+    instrument.count('unsupported_instructions', unsupported_cnt)
+    return unsupported_cnt, instructions
+
+def _check_to_string(args):
+    import io
+    listing_file, verbosity, tables = args
+    out = io.StringIO()
+    check_listing(listing_file, verbosity, tables, out)
+    return out.getvalue()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Report instructions in listing files that the processor does not support.')
+    parser.add_argument('args', nargs='*', metavar='LISTING [VERBOSITY]',
+                        help='Listing file(s), optionally followed by an integer verbosity '
+                             '(1 for a summary, 2 (default) for every unsupported line)')
+    parser.add_argument('-v', '--verbosity', type=int, default=None,
+                        help='Verbosity, instead of giving it after the listings')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Check several listings in parallel')
+    parser.add_argument('--tables', default=TABLES_SCRIPT, help='Perl script to read the pattern tables from')
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args):
+        if not args.args:
+            print("Usage: epiccheck.py <listing_file>.lst [verbosity] (verbosity:use 1 for summary of unsupported instr "
+                  "or 2 (default) for complete list with line numbers)")
+            return
+
+        listings, verbosity = args.args, 2
+        # A trailing integer that is not a file is the verbosity, as in the Perl tool
+        if len(listings) > 1 and re.fullmatch(r'[-+]?\d+', listings[-1]) and not os.path.exists(listings[-1]):
+            listings, verbosity = listings[:-1], listings[-1]
+        if args.verbosity is not None:
+            verbosity = args.verbosity
+        missing = [listing for listing in listings if not os.path.isfile(listing)]
+        if missing:
+            parser.error('listing file(s) not found: ' + ', '.join(missing))
+
+        tables = {name: compile_patterns(p) for name, p in read_pattern_tables(args.tables).items()}
+        if len(listings) == 1:
+            check_listing(listings[0], verbosity, tables)
+            return
+        # Reports are collected per listing and printed in command-line order
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            for report in executor.map(_check_to_string, [(listing, verbosity, tables) for listing in listings]):
+                sys.stdout.write(report)
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,382 @@
 import re
 import json
+import glob
+import functools
+import time
 import argparse
 import os
+import vlex
+import vexpr
+import hashcache
+import instrument
 
-def extract_vports(file_path):
-    # Read the file and extract the module content using regex pattern matching
-    with open(file_path, 'r') as file:
-        content = file.read()
-
-    # Regex to match the ports
-    port_pattern = re.compile(r'^\s*(input|output)\s+(wire|reg|logic)?\s*(\[\s*([\w\+\-\*\/\(\)]+)\s*:\s*([\w\+\-\*\/\(\)]+)\s*\])?\s*(\w+(\s*\[\s*[\w\+\-\*\/\(\)]+\s*:\s*[\w\+\-\*\/\(\)]+\s*\])*)', re.IGNORECASE | re.MULTILINE)
-    ports = port_pattern.findall(content)
-
-    # Create a list of dictionaries with port details
-    port_list = []
-    for match in ports:
-        direction = match[0]
-        port_type = match[1]
-        msb = match[3]
-        lsb = match[4]
-        name = match[5]
-
-        # Compute width
-        width = '1'
-        if msb and lsb:
-            width = f"{msb}-{lsb}+1"
-
-        port_list.append({
-            'name': name,
-            'msb': msb if msb else '0',
-            'lsb': lsb if lsb else '0',
-            'width': width,
-            'direction': direction,
-            'type': port_type.strip() if port_type else 'unknown'
-        })
+# Port declarations are parsed per module, from the <direction|net type>
+# declarations in its body and the names in its header, so ANSI and
+# non-ANSI ports, inout ports, several names per declaration and interface
+# ports all come out the same way. portcheck and vindex build on the same
+# parser, so every tool sees the same port list.
+
+DIRECTIONS = ('input', 'output', 'inout')
+NET_KEYWORDS = ('wire', 'reg', 'logic', 'bit', 'tri', 'var', 'signed', 'unsigned')
+_NOT_A_NAME = r'(?!(?:%s)\b)' % '|'.join(DIRECTIONS + NET_KEYWORDS)
+
+# Keyword patterns start with the literal words, which re finds far faster
+# than a leading \b or lookbehind; _search_word rejects matches that are
+# really the tail of a longer identifier.
+
+# <direction|net type> [more type words] [user type] [msb:lsb] [more packed dims] name [unpacked], name ...
+DECLARATION_PATTERN = re.compile(
+    r'(input|output|inout|wire|reg|logic|bit|tri|var)\b'
+    r'((?:\s+(?:%s)\b)*)' % '|'.join(NET_KEYWORDS) +
+    r'(?:\s*(' + _NOT_A_NAME + r'\w+(?:::\w+)?)\b(?=\s*(?:\[[^\]]*\]\s*)*' + _NOT_A_NAME + r'[A-Za-z_]))?'
+    r'\s*(?:\[([^\[\]:]+):([^\[\]]+)\])?\s*((?:\[[^\]]*\]\s*)*)'
+    r'(' + _NOT_A_NAME + r'\w+(?:\s*\[[^\]]*\])*'
+    # More names, but not the type of the next ANSI port ("foo_t x", "axi_if.slave s")
+    r'(?:\s*,\s*' + _NOT_A_NAME + r'\w+\b(?!\s*[\w.])(?:\s*\[[^\]]*\])*)*)')
+MODULE_PATTERN = re.compile(r'^\s*(?:module|macromodule)\s+(\w+)', re.MULTILINE)
+ENDMODULE_PATTERN = re.compile(r'endmodule\b')
+SUBROUTINE_PATTERN = re.compile(r'(function|task)\b')
+PROTOTYPE_PATTERN = re.compile(r'\b(?:import|extern|pure)\b')
+NAME_PATTERN = re.compile(r'\s*(\w+)\s*(\[)?')
+HEADER_ITEM_PATTERN = re.compile(r'\s*(?:(\w+)(?:\.\w+)?\s+)?(\w+)\s*(?:\[[^\]]*\]\s*)*$')
+BRACKETS = re.compile(r'[()\[\]{},]')
+
+# The fields of every port in the output, in order
+PORT_FIELDS = ('name', 'msb', 'lsb', 'width', 'direction', 'type')
+
+# Bumped when the per-port fields change, so batch caches from older runs are not reused
+PORTS_FORMAT = 3
+
+def _in_word(code, pos):
+    return pos > 0 and (code[pos - 1].isalnum() or code[pos - 1] in '_$.`')
+
+def _search_word(pattern, code, pos=0):
+    while True:
+        match = pattern.search(code, pos)
+        if match is None or not _in_word(code, match.start()):
+            return match
+        pos = match.end()
+
+def _blank(text):
+    return re.sub(r'[^\n]', ' ', text)
+
+def blank_subroutines(code):
+    """Blank function and task bodies in code, keeping offsets.
+
+    They declare their own input/output arguments, which are not module ports.
+    """
+    pieces, pos = [], 0
+    while True:
+        match = _search_word(SUBROUTINE_PATTERN, code, pos)
+        if not match:
+            pieces.append(code[pos:])
+            return ''.join(pieces)
+        start = match.start()
+        if PROTOTYPE_PATTERN.search(code, code.rfind(';', 0, start) + 1, start):
+            # DPI imports and extern/pure prototypes end at the ';'
+            end = code.find(';', match.end())
+            end = len(code) if end < 0 else end + 1
+        else:
+            end_match = _search_word(re.compile(r'end%s\b' % match.group(1)), code, match.end())
+            end = end_match.end() if end_match else len(code)
+        pieces.append(code[pos:start])
+        pieces.append(_blank(code[start:end]))
+        pos = end
+
+def matching_close(text, pos):
+    """Index of the bracket closing the one at pos (len(text) if it is never closed)."""
+    depth = 0
+    for match in BRACKETS.finditer(text, pos):
+        char = match.group()
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+            if depth == 0:
+                return match.start()
+    return len(text)
+
+def split_commas(text):
+    """Split text at the commas that are not nested in brackets."""
+    parts, depth, start = [], 0, 0
+    for match in BRACKETS.finditer(text):
+        char = match.group()
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+        elif depth == 0:
+            parts.append(text[start:match.start()])
+            start = match.end()
+    parts.append(text[start:])
+    return parts
+
+def module_spans(code):
+    """Yield (match, end) for every module in code, match being its MODULE_PATTERN match.
+
+    A module runs from its header to the next endmodule, or to the end of code.
+    """
+    for match in MODULE_PATTERN.finditer(code):
+        end = _search_word(ENDMODULE_PATTERN, code, match.end())
+        yield match, end.end() if end else len(code)
+
+def parse_declarations(code):
+    """Return (ports, signals) declared in one module's comment-free code.
+
+    ports is {name: port} in declaration order, each port a dict with the
+    PORT_FIELDS plus 'unpacked'; signals maps every declared name (ports
+    included) to (msb, lsb, packed) where msb/lsb are None for a one-bit or
+    user-typed declaration and packed is False when the width is not known
+    from a single [msb:lsb] range.
+    """
+    ports, signals = {}, {}
+    for match in DECLARATION_PATTERN.finditer(code):
+        if _in_word(code, match.start()):
+            continue
+        keyword, extra_words, user_type, msb, lsb, more_dims, names = match.groups()
+        if msb:
+            msb, lsb = msb.strip(), lsb.strip()
+        # A plain [msb:lsb] range or a one-bit scalar; user types and
+        # multi-dimensional packed arrays have no width we can check
+        known = not user_type and not more_dims.strip()
+        for name in split_commas(names):
+            name_match = NAME_PATTERN.match(name)
+            name, unpacked = name_match.group(1), name_match.group(2) is not None
+            signals[name] = (msb, lsb, known and not unpacked)
+            if keyword in DIRECTIONS:
+                type_words = extra_words.split()
+                ports[name] = {
+                    'name': name,
+                    'msb': msb or '0',
+                    'lsb': lsb or '0',
+                    'width': f"{msb}-{lsb}+1" if msb else '1',
+                    'direction': keyword,
+                    'type': user_type or (type_words[0] if type_words else 'unknown'),
+                    'unpacked': unpacked or not known,
+                }
+    return ports, signals
+
+def header_ports(code, name_end):
+    """(name, interface) for the items of the module port list that starts after name_end.
+
+    Only items without a direction or net type of their own are returned:
+    non-ANSI names and interface ports such as "axi_if.slave bus".
+    """
+    pos = name_end
+    while pos < len(code) and code[pos].isspace():
+        pos += 1
+    if code.startswith('#', pos):
+        pos = code.find('(', pos)
+        pos = matching_close(code, pos) + 1
+        while pos < len(code) and code[pos].isspace():
+            pos += 1
+    if not code.startswith('(', pos):
+        return []
+    items = []
+    for item in split_commas(code[pos + 1:matching_close(code, pos)]):
+        match = HEADER_ITEM_PATTERN.match(item)
+        if match and match.group(1) not in DIRECTIONS + NET_KEYWORDS:
+            items.append((match.group(2), match.group(1)))
+    return items
+
+def parse_module(span, name_end=None):
+    """Return (ports, signals) of one module, span being its code with subroutines blanked.
+
+    Like parse_declarations, plus the header names no declaration covered
+    (interface ports), which get direction 'unknown'. name_end is the offset
+    of the end of the module name in span; None parses span as a module body.
+    """
+    ports, signals = parse_declarations(span)
+    if name_end is not None:
+        for name, interface in header_ports(span, name_end):
+            if name not in ports:
+                ports[name] = {'name': name, 'msb': '0', 'lsb': '0', 'width': '1', 'direction': 'unknown',
+                               'type': interface or 'unknown', 'unpacked': True}
+    return ports, signals
+
+def iter_module_ports(code):
+    """Yield (module, port) for the ports in comment-free code, in file order.
+
+    port has the PORT_FIELDS only. Code without a module header (an
+    included fragment) is parsed as one body, with module None.
+    """
+    code = blank_subroutines(code)
+    spans = [(match.group(1), code[match.start():end], match.end(1) - match.start())
+             for match, end in module_spans(code)] or [(None, code, None)]
+    for module, span, name_end in spans:
+        ports, _ = parse_module(span, name_end)
+        for port in ports.values():
+            yield module, {field: port[field] for field in PORT_FIELDS}
+
+def parse_ports(content):
+    ports = [port for _, port in iter_module_ports(content)]
+    instrument.count('regex_evals')
+    instrument.count('regex_matches', len(ports))
+    return ports
+
+def resolve_port_widths(ports, resolver):
+    # Add the numeric msb/lsb/width next to the symbolic strings (None when
+    # an expression cannot be resolved)
+    for port in ports:
+        msb = resolver.value(port['msb'])
+        lsb = resolver.value(port['lsb'])
+        port['msb_value'] = msb
+        port['lsb_value'] = lsb
+        port['width_value'] = abs(msb - lsb) + 1 if msb is not None and lsb is not None else None
+    return ports
+
+def width_resolver(code, defines=None, overrides=None):
+    # Parameters are collected file-wide, like the ports. Command-line defines
+    # come first and `define lines in the file override them.
+    file_defines = dict(defines or {})
+    file_defines.update(vexpr.parse_defines(code))
+    return vexpr.WidthResolver(vexpr.parse_parameters(code), file_defines, overrides)
+
+def module_info(code, defines=None, overrides=None, ports=None):
+    """Ports with resolved widths plus the parameters and `defines they were resolved against."""
+    resolver = width_resolver(code, defines, overrides)
+    return resolved_info(resolver, parse_ports(code) if ports is None else ports)
+
+def resolved_info(resolver, ports):
+    ports = resolve_port_widths(ports, resolver)
+    values = resolver.parameter_values()
+    return {
+        'parameters': {name: {'kind': resolver.kinds.get(name, 'parameter'), 'expr': expr, 'value': values[name]}
+                       for name, expr in resolver.expressions.items()},
+        'defines': resolver.defines,
+        'ports': ports,
+    }
+
+def extract_vports(file_path, index_path=None, defines=None, overrides=None, with_params=False):
+    if index_path:
+        # Serve the ports, parameters and `defines from the design index,
+        # reading and reparsing the file only if it changed
+        from vindex import DesignIndex
+        with DesignIndex(index_path, defines) as index:
+            index.update_file(file_path)
+            port_list = index.file_ports(file_path)
+            file_defines = dict(defines or {})
+            file_defines.update(index.file_defines(file_path))
+            resolver = vexpr.WidthResolver(index.file_parameters(file_path), file_defines, overrides)
+        info = resolved_info(resolver, port_list)
+    else:
+        # Extract the ports from the shared lexer's view of the file, without
+        # comments or `ifdef'd-out code
+        info = module_info(vlex.load(file_path, defines).code, defines, overrides)
 
     # Convert the list to JSON format
-    return json.dumps(port_list, indent=4)
+    return json.dumps(info if with_params else info['ports'], indent=4)
+
+def expand_inputs(inputs, filelist=None, extensions=('.v', '.sv')):
+    # Directories are walked, glob patterns expanded and plain paths kept as is
+    seen = set()
+    sources = []
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = (os.path.join(root, file)
+                          for root, dirs, files in os.walk(item, followlinks=True)
+                          for file in sorted(files) if file.endswith(extensions))
+        elif glob.has_magic(item):
+            candidates = sorted(glob.glob(item, recursive=True))
+        else:
+            candidates = [item]
+        for path in candidates:
+            if path not in seen:
+                seen.add(path)
+                sources.append(path)
+
+    if filelist:
+        from filter_filelist import FilelistReader
+        for entry in FilelistReader(expand_incdirs=False).iter_entries(filelist):
+            if entry[0] not in '+-' and entry not in seen:
+                seen.add(entry)
+                sources.append(entry)
+    return sources
+
+def _batch_info(code, defines, overrides=None, with_params=False):
+    # Worker parse for hashcache.run
+    info = module_info(code, defines, overrides)
+    return info if with_params else info['ports']
+
+def extract_vports_batch(sources, output_file, cache_file=None, jobs=None, output_format='jsonl', defines=None,
+                         overrides=None, with_params=False):
+    cache = hashcache.load_cache(cache_file) if cache_file else {}
+
+    start = time.perf_counter()
+    # The overrides and output shape change the results, so they are part of the cache key
+    parse = functools.partial(_batch_info, overrides=overrides, with_params=with_params)
+    key = (PORTS_FORMAT, sorted((overrides or {}).items()), with_params)
+    results, total_bytes, parsed = hashcache.run(parse, sources, cache, jobs, defines, key)
+    elapsed = time.perf_counter() - start
+    instrument.add_phase('extract', elapsed)
+
+    with open(output_file, 'w') as file:
+        if output_format == 'jsonl':
+            for file_path, sha1, info in results:
+                record = {'file': file_path, 'sha1': sha1}
+                record.update(info if with_params else {'ports': info})
+                file.write(json.dumps(record) + '\n')
+        else:
+            json.dump({file_path: info for file_path, sha1, info in results}, file, indent=4)
+
+    if cache_file:
+        hashcache.save_cache(cache_file, cache, {sha1 for _, sha1, _ in results})
+
+    files_per_sec = len(sources) / elapsed if elapsed else 0.0
+    mb_per_sec = total_bytes / (1 << 20) / elapsed if elapsed else 0.0
+    print(f"JSON output written to {output_file}")
+    print(f"{len(sources)} files ({parsed} parsed, {len(sources) - parsed} cached), "
+          f"{total_bytes / (1 << 20):.1f} MB in {elapsed:.3f}s: "
+          f"{files_per_sec:.1f} files/sec, {mb_per_sec:.1f} MB/sec")
+    return {'files': len(sources), 'parsed': parsed, 'bytes': total_bytes, 'seconds': elapsed,
+            'files_per_sec': files_per_sec, 'mb_per_sec': mb_per_sec}
 
 def main():
     parser = argparse.ArgumentParser(description='Extract port information from a Verilog module and output it in JSON format.')
-    parser.add_argument('file_path', type=str, help='Path to the Verilog module file')
+    parser.add_argument('file_path', type=str, nargs='?', help='Path to the Verilog module file')
     parser.add_argument('-o', '--output_dir', type=str, help='Output directory for the JSON file')
+    parser.add_argument('--index', type=str, help='Design index database to read ports from (see vindex.py)')
+    parser.add_argument('--batch', nargs='+', metavar='INPUT', help='Files, directories or glob patterns to process in batch mode')
+    parser.add_argument('-f', '--filelist', type=str, help='Filelist of sources to process in batch mode')
+    parser.add_argument('--output', type=str, default='vports.jsonl', help='Combined output file for batch mode')
+    parser.add_argument('--format', choices=('jsonl', 'json'), default='jsonl', help='Batch output format: JSON Lines or one JSON object indexed by file')
+    parser.add_argument('--cache', type=str, help='Content-hash cache file reused between batch runs')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes for batch mode')
+    parser.add_argument('-P', '--param', action='append', default=[], metavar='NAME=VALUE',
+                        help='Parameter override used when resolving port widths')
+    parser.add_argument('--with-params', action='store_true',
+                        help='Output {parameters, defines, ports} instead of the port list')
+    vlex.add_define_argument(parser)
+    instrument.add_arguments(parser)
     args = parser.parse_args()
+    with instrument.session(args):
+        defines = vlex.parse_define_args(args.define)
+        overrides = dict(param.partition('=')[::2] for param in args.param)
 
-    json_output = extract_vports(args.file_path)
+        if args.batch or args.filelist:
+            if args.index:
+                parser.error('--index cannot be used in batch mode; use --cache to reuse results between runs')
+            sources = expand_inputs(([args.file_path] if args.file_path else []) + (args.batch or []), args.filelist)
+            extract_vports_batch(sources, args.output, args.cache, args.jobs, args.format, defines,
+                                 overrides, args.with_params)
+            return
+        if not args.file_path:
+            parser.error('the following arguments are required: file_path')
 
-    # Determine the output directory
-    output_dir = args.output_dir if args.output_dir else os.path.dirname(args.file_path)
+        json_output = extract_vports(args.file_path, args.index, defines, overrides, args.with_params)
 
-    # Create the output file name by replacing the extension with .json
-    base_name = os.path.splitext(os.path.basename(args.file_path))[0]
-    output_file = os.path.join(output_dir, base_name + '.json')
+        # Determine the output directory
+        output_dir = args.output_dir if args.output_dir else os.path.dirname(args.file_path)
 
-    # Write the JSON output to the file
-    with open(output_file, 'w') as file:
-        file.write(json_output)
+        # Create the output file name by replacing the extension with .json
+        base_name = os.path.splitext(os.path.basename(args.file_path))[0]
+        output_file = os.path.join(output_dir, base_name + '.json')
 
-    print(f"JSON output written to {output_file}")
+        # Write the JSON output to the file
+        with open(output_file, 'w') as file:
+            file.write(json_output)
+
+        print(f"JSON output written to {output_file}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
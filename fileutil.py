@@ -0,0 +1,43 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Atomic file replacement shared by the scripts that rewrite sources, JSON
+# outputs and caches: the new contents go to a temporary file in the target's
+# directory, which is renamed over the target only once it is complete, so a
+# reader never sees a half-written file and an interrupted run leaves the old
+# one in place.
+
+def _default_mode():
+    # What open() would give a new file: 0o666 less the process umask
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+@contextmanager
+def atomic_open(file_path, encoding=None, newline=None, prefix='.tmp_'):
+    """Open a temporary file for writing that replaces file_path when the block succeeds.
+
+    The replacement keeps file_path's permissions, or gets the usual ones for
+    a new file.
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=prefix, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding=encoding, newline=newline) as f:
+            yield f
+        try:
+            mode = os.stat(file_path).st_mode & 0o7777
+        except FileNotFoundError:
+            mode = _default_mode()
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+def atomic_write(file_path, text, encoding=None, newline=None, prefix='.tmp_'):
+    """Replace file_path with text in one rename."""
+    with atomic_open(file_path, encoding, newline, prefix) as f:
+        f.write(text)
@@ -1,4 +1,7 @@
+import os
+import re
 import argparse
+import instrument
 
 def filter_files(sublist_path, superlist_path, output_path):
     # Read the sublist file and extract file names
@@ -10,6 +13,8 @@ def filter_files(sublist_path, superlist_path, output_path):
     with open(superlist_path, 'r') as f:
         super_list = f.read().strip().splitlines()
 
+    instrument.count('lines_read', len(sub_list) + len(super_list))
+
     # Filter the super list based on sublist file names
     filtered_super_list = [
         path for path in super_list if path.split('/')[-1] in sub_file_names
@@ -21,12 +26,183 @@ def filter_files(sublist_path, superlist_path, output_path):
     
     print(f"Filtered super list written to: {output_path}")
 
+INCLUDE_PATTERN = re.compile(r'^-([fF])\s+(\S+)')
+INCDIR_PATTERN = re.compile(r'^\+incdir\+(.+)$')
+
+class FilelistReader:
+    # Streams filelist entries, expanding nested -f/-F includes and +incdir+
+    # directories. The top-level filelist is streamed line by line; each
+    # included filelist is parsed once into its unexpanded entries and cached
+    # by real path, so a shared include costs one read however often it is
+    # referenced and memory stays bounded by the size of the include files.
+    # Relative entries in a -F filelist are resolved against its directory.
+
+    def __init__(self, expand_includes=True, expand_incdirs=True):
+        self.expand_includes = expand_includes
+        self.expand_incdirs = expand_incdirs
+        self.include_cache = {}
+        self.incdir_cache = {}
+
+    def _incdir_files(self, directory):
+        if directory not in self.incdir_cache:
+            try:
+                names = sorted(os.listdir(directory))
+            except OSError:
+                names = []
+            self.incdir_cache[directory] = [
+                os.path.join(directory, name) for name in names
+                if os.path.isfile(os.path.join(directory, name))
+            ]
+        return self.incdir_cache[directory]
+
+    @staticmethod
+    def _parse(filelist_path):
+        # Yield each non-empty line as a plain entry string, or as
+        # (kind, value, entry) for directives: kind is 'f' or 'F' with the
+        # include path, or '+incdir+' with the directories
+        with open(filelist_path, 'r') as f:
+            for line in f:
+                entry = line.strip()
+                if not entry:
+                    continue
+                if entry[0] == '-':
+                    include = INCLUDE_PATTERN.match(entry)
+                    if include:
+                        yield include.group(1), include.group(2), entry
+                        continue
+                elif entry[0] == '+':
+                    incdir = INCDIR_PATTERN.match(entry)
+                    if incdir:
+                        yield '+incdir+', [d for d in incdir.group(1).split('+') if d], entry
+                        continue
+                yield entry
+
+    def _include_entries(self, include_path):
+        key = os.path.realpath(include_path)
+        if key not in self.include_cache:
+            self.include_cache[key] = list(self._parse(include_path))
+        return self.include_cache[key]
+
+    @staticmethod
+    def _resolve_include(flag, include, parent_path):
+        path = os.path.expandvars(include)
+        if flag == 'F' and not os.path.isabs(path):
+            # -F paths are relative to the including filelist
+            path = os.path.join(os.path.dirname(parent_path), path)
+        return path
+
+    @staticmethod
+    def _relative_to(base_dir, path):
+        if base_dir is None or os.path.isabs(os.path.expandvars(path)):
+            return path
+        return os.path.join(base_dir, path)
+
+    def iter_entries(self, filelist_path, _stack=(), _base_dir=None):
+        key = os.path.realpath(filelist_path)
+        if key in _stack:
+            raise ValueError(f"Recursive filelist include: {filelist_path}")
+
+        items = self._include_entries(filelist_path) if _stack else self._parse(filelist_path)
+        for item in items:
+            if isinstance(item, str):
+                if _base_dir is not None and item[0] not in '+-':
+                    item = self._relative_to(_base_dir, item)
+                yield item
+                continue
+
+            kind, value, entry = item
+            if kind in ('f', 'F') and self.expand_includes:
+                include_path = self._resolve_include(kind, value, filelist_path)
+                base_dir = os.path.dirname(include_path) if kind == 'F' else None
+                yield from self.iter_entries(include_path, _stack + (key,), base_dir)
+                continue
+
+            if kind == '+incdir+' and self.expand_incdirs:
+                for directory in value:
+                    directory = self._relative_to(_base_dir, os.path.expandvars(directory))
+                    yield from self._incdir_files(directory)
+                continue
+
+            yield entry
+
+def filter_files_streaming(sublist_paths, superlist_path, output_paths, expand_includes=True, expand_incdirs=True):
+    # Filter the superlist once against several sublists, writing each match
+    # as it is read. Returns {sublist: {basename: [paths]}} for basenames that
+    # matched more than one distinct superlist path.
+    reader = FilelistReader(expand_includes, expand_incdirs)
+
+    # Basename -> indices of the sublists that want it
+    wanted = {}
+    for index, sublist_path in enumerate(sublist_paths):
+        for entry in reader.iter_entries(sublist_path):
+            wanted.setdefault(entry.split('/')[-1], set()).add(index)
+
+    outputs = [open(path, 'w', buffering=1 << 20) for path in output_paths]
+    written = [0] * len(outputs)
+    first_match = [{} for _ in sublist_paths]
+    collisions = [{} for _ in sublist_paths]
+    try:
+        for path in reader.iter_entries(superlist_path):
+            name = path.rpartition('/')[2]
+            indices = wanted.get(name)
+            if not indices:
+                continue
+            for index in indices:
+                out = outputs[index]
+                out.write(f"\n{path}" if written[index] else path)
+                written[index] += 1
+
+                first = first_match[index].setdefault(name, path)
+                if first != path:
+                    seen = collisions[index].setdefault(name, [first])
+                    if path not in seen:
+                        seen.append(path)
+    finally:
+        for out in outputs:
+            out.close()
+
+    instrument.count('entries_written', sum(written))
+    for output_path, count in zip(output_paths, written):
+        print(f"Filtered super list written to: {output_path} ({count} entries)")
+
+    report = {}
+    for sublist_path, sublist_collisions in zip(sublist_paths, collisions):
+        if sublist_collisions:
+            report[sublist_path] = sublist_collisions
+            for name, paths in sublist_collisions.items():
+                print(f"Warning: {sublist_path}: {name} matches {len(paths)} superlist paths:")
+                for path in paths:
+                    print(f"    {path}")
+    return report
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Filter files from a super list based on a sub list.")
     parser.add_argument('sublist', help="Path to the file containing the sub list of files.")
     parser.add_argument('superlist', help="Path to the file containing the super list of files.")
     parser.add_argument('output', help="Path to the output file for the filtered super list.")
+    parser.add_argument('--stream', action='store_true',
+                        help="Stream the superlist, expanding -f/-F includes and +incdir+ directories.")
+    parser.add_argument('--extra', nargs=2, action='append', default=[], metavar=('SUBLIST', 'OUTPUT'),
+                        help="Additional sublist and its output file, filtered in the same pass (implies --stream).")
+    parser.add_argument('--no-includes', action='store_true', help="Do not expand -f/-F includes in streaming mode.")
+    parser.add_argument('--no-incdirs', action='store_true', help="Do not expand +incdir+ directories in streaming mode.")
+    instrument.add_arguments(parser)
     args = parser.parse_args()
 
-    # Call the filtering function with the provided arguments
-    filter_files(args.sublist, args.superlist, args.output)
+    with instrument.session(args):
+        try:
+            if args.stream or args.extra:
+                filter_files_streaming(
+                    [args.sublist] + [sublist for sublist, _ in args.extra],
+                    args.superlist,
+                    [args.output] + [output for _, output in args.extra],
+                    expand_includes=not args.no_includes,
+                    expand_incdirs=not args.no_incdirs,
+                )
+            else:
+                # Call the filtering function with the provided arguments
+                filter_files(args.sublist, args.superlist, args.output)
+        except FileNotFoundError as error:
+            parser.error(f"{error.strerror}: {error.filename}")
+        except ValueError as error:
+            parser.error(str(error))
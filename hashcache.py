@@ -0,0 +1,83 @@
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor
+
+import vlex
+import fileutil
+import instrument
+
+# Parallel per-file parsing with a content-hash cache, shared by the batch
+# tools. Each worker reads a file once through the lexer and hashes its bytes
+# together with the defines and the caller's format key (both change what a
+# parse returns); the file is parsed only when that hash is not in the cache
+# already. The cache itself is a JSON object {sha1: result} kept by the
+# caller between runs.
+
+def load_cache(cache_file):
+    """Return the {sha1: result} cache stored in cache_file.
+
+    A missing, truncated or otherwise unreadable cache is empty, so every
+    file is parsed again and the cache rewritten.
+    """
+    try:
+        with open(cache_file, 'r') as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+def save_cache(cache_file, cache, live):
+    """Write the entries of cache whose hash is in live to cache_file.
+
+    Dropping the rest keeps the cache from growing forever.
+    """
+    with fileutil.atomic_open(cache_file, prefix='.hashcache_') as file:
+        json.dump({sha1: result for sha1, result in cache.items() if sha1 in live}, file)
+
+_parse = None
+_cached_hashes = frozenset()
+_defines = None
+_key = None
+
+def _init_worker(parse, cached_hashes, defines, key):
+    global _parse, _cached_hashes, _defines, _key
+    _parse = parse
+    _cached_hashes = cached_hashes
+    _defines = defines
+    _key = key
+    # Every file is read once, so the lexer's cache would only hold memory
+    vlex.disable_cache()
+
+def _run_file(file_path):
+    source = vlex.load(file_path, _defines, cache=False)
+    data = source.raw.encode('latin-1')
+    sha1 = hashlib.sha1(data + repr((_defines, _key)).encode()).hexdigest()
+    if sha1 in _cached_hashes:
+        return file_path, sha1, len(data), None
+    return file_path, sha1, len(data), _parse(source.code, _defines)
+
+def run(parse, sources, cache, jobs=None, defines=None, key=None):
+    """Return ([(file_path, sha1, result)], total_bytes, parsed) for sources, in order.
+
+    parse(code, defines) is called in a worker process on the comment-free
+    code of every file whose hash is not in cache, so it must be a
+    module-level function returning JSON-serializable data. New results are
+    added to cache. key identifies the format of the results.
+    """
+    results = []
+    total_bytes, parsed = 0, 0
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(parse, frozenset(cache), defines, key)) as executor:
+        for file_path, sha1, size, result in executor.map(_run_file, sources, chunksize=16):
+            total_bytes += size
+            if result is None:
+                result = cache[sha1]
+            else:
+                cache[sha1] = result
+                parsed += 1
+            results.append((file_path, sha1, result))
+    # The workers' own counters stay in their processes, so tally here
+    instrument.count('files_read', len(sources))
+    instrument.count('bytes_read', total_bytes)
+    instrument.count('files_parsed', parsed)
+    return results, total_bytes, parsed
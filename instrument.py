@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import time
+import resource
+import threading
+from contextlib import contextmanager
+
+# Shared run statistics for the command-line scripts: named phase timers,
+# counters (files walked, bytes read, regex evaluations and matches,
+# subprocesses spawned, ...) and optional cProfile/tracemalloc capture.
+# Nothing is recorded until a session is started with --stats-json or
+# --profile, and the helpers return straight away when none is active.
+# Counts are made in the process that calls them, so work done inside
+# process-pool workers is only counted where the parent tallies the results.
+
+_stats = None
+_lock = threading.Lock()
+
+class Stats:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = {}
+        self.counters = {}
+
+def active():
+    return _stats is not None
+
+def count(name, n=1):
+    """Add n to a counter."""
+    if _stats is None:
+        return
+    with _lock:
+        _stats.counters[name] = _stats.counters.get(name, 0) + n
+
+def add_phase(name, seconds, calls=1):
+    """Record time measured elsewhere against a phase."""
+    if _stats is None:
+        return
+    with _lock:
+        phase = _stats.phases.setdefault(name, {'seconds': 0.0, 'calls': 0})
+        phase['seconds'] += seconds
+        phase['calls'] += calls
+
+@contextmanager
+def phase(name):
+    """Time the body of a with block as the phase name."""
+    if _stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_phase(name, time.perf_counter() - start)
+
+def add_arguments(parser):
+    parser.add_argument('--stats-json', metavar='FILE',
+                        help="Write phase timings and counters as JSON to FILE ('-' for stderr)")
+    parser.add_argument('--profile', action='store_true',
+                        help='Also capture a cProfile summary and tracemalloc peak/top allocations into the stats')
+
+def _peak_rss_mb():
+    # ru_maxrss is in KiB on Linux and bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / (1 << 20)
+
+def _profile_summary(profiler, limit=25):
+    import pstats
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (file, line, function), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({'function': f"{file}:{line}({function})", 'calls': calls,
+                     'tottime_s': total, 'cumtime_s': cumulative})
+    rows.sort(key=lambda row: row['cumtime_s'], reverse=True)
+    return rows[:limit]
+
+def _memory_summary(tracemalloc, limit=10):
+    current, peak = tracemalloc.get_traced_memory()
+    top = tracemalloc.take_snapshot().statistics('lineno')[:limit]
+    return {
+        'current_mb': current / (1 << 20),
+        'peak_mb': peak / (1 << 20),
+        'top': [{'location': str(stat.traceback), 'size_kb': stat.size / 1024, 'count': stat.count} for stat in top],
+    }
+
+@contextmanager
+def session(args, tool=None):
+    """Collect stats for the duration of a main() when --stats-json or --profile was given.
+
+    On exit (including sys.exit) the stats are written as one JSON object to
+    the --stats-json file, or to stderr when only --profile was given.
+    """
+    global _stats
+    stats_json = getattr(args, 'stats_json', None)
+    profile = getattr(args, 'profile', False)
+    if not stats_json and not profile:
+        yield
+        return
+
+    _stats = Stats()
+    profiler = None
+    tracemalloc = None
+    if profile:
+        import cProfile
+        import tracemalloc
+        tracemalloc.start()
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        stats, _stats = _stats, None
+        report = {
+            'tool': tool or os.path.basename(sys.argv[0]),
+            'argv': sys.argv[1:],
+            'pid': os.getpid(),
+            'wall_s': time.perf_counter() - stats.start,
+            'cpu_s': time.process_time(),
+            'peak_rss_mb': _peak_rss_mb(),
+            'phases': stats.phases,
+            'counters': stats.counters,
+        }
+        if profiler is not None:
+            report['profile'] = _profile_summary(profiler)
+            report['memory'] = _memory_summary(tracemalloc)
+            tracemalloc.stop()
+
+        if stats_json and stats_json != '-':
+            with open(stats_json, 'w') as f:
+                json.dump(report, f, indent=4)
+        else:
+            json.dump(report, sys.stderr, indent=4)
+            sys.stderr.write('\n')
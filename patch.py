@@ -1,28 +1,44 @@
 import os
 import re
+import mmap
+import time
 import argparse
 import subprocess
+import vlex
+import fileutil
+import instrument
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 
-def apply_patch_to_files(module_names, change_file, search_dir, exclude_dirs):
-    # Compile regex patterns for each module name
-    patterns = [re.compile(rf'.*{module_name}\s*#?\s*\(') for module_name in module_names]
+def apply_patch_to_files(module_names, change_file, search_dir, exclude_dirs, index_path=None, defines=None):
+    if index_path:
+        # Look the instantiating files up in the design index instead of rescanning
+        from vindex import DesignIndex
+        with DesignIndex(index_path, defines) as index:
+            index.update(search_dir, exclude_dirs, extensions=(".v",))
+            files_to_patch = set(index.files_instantiating(module_names, under=search_dir, extensions=(".v",)))
+    else:
+        # Compile regex patterns for each module name
+        patterns = [re.compile(rf'.*{module_name}\s*#?\s*\(') for module_name in module_names]
 
-    # List to store files that contain any of the specified module instances
-    files_to_patch = set()
+        # List to store files that contain any of the specified module instances
+        files_to_patch = set()
 
-    # Walk through the directory to find `.v` files, following links by default
-    for root, dirs, files in os.walk(search_dir, followlinks=True):
-        # Exclude specified directories
-        dirs[:] = [d for d in dirs if os.path.join(root, d) not in exclude_dirs]
+        # Walk through the directory to find `.v` files, following links by default
+        for root, dirs, files in os.walk(search_dir, followlinks=True):
+            # Exclude specified directories
+            dirs[:] = [d for d in dirs if os.path.join(root, d) not in exclude_dirs]
 
-        for file in files:
-            if file.endswith(".v"):
-                file_path = os.path.join(root, file)
+            for file in files:
+                if file.endswith(".v"):
+                    file_path = os.path.join(root, file)
+                    instrument.count('files_walked')
                 
-                # Check if any of the specified module instances are in the file
-                with open(file_path, 'r') as f:
-                    content = f.read()
+                    # Check if any of the specified module instances are in the file,
+                    # ignoring comments and `ifdef'd-out code
+                    content = vlex.load(file_path, defines).code
+                    instrument.count('regex_evals', len(patterns))
                     if any(pattern.search(content) for pattern in patterns):
+                        instrument.count('regex_matches')
                         files_to_patch.add(file_path)
 
     # Apply patch to each identified file
@@ -40,6 +56,7 @@ def apply_patch_to_files(module_names, change_file, search_dir, exclude_dirs):
         # Apply the patch to the file
         print(f"Applying patch to {file}...")
         try:
+            instrument.count('subprocesses')
             result = subprocess.run(
                 ["patch", "-p0", file],
                 input=open(change_file, 'rb').read(),
@@ -49,6 +66,221 @@ def apply_patch_to_files(module_names, change_file, search_dir, exclude_dirs):
         except subprocess.CalledProcessError as e:
             print(f"Failed to apply patch to {file}: {e}")
 
+def build_module_pattern(module_names):
+    # One alternation of all module names, compiled once and matched on raw bytes
+    # so it can run directly over an mmap without decoding the file
+    alternation = '|'.join(f'(?:{module_name})' for module_name in module_names)
+    return re.compile(rf'(?:{alternation})\s*#?\s*\('.encode())
+
+def walk_verilog_files(search_dir, exclude_dirs):
+    # Same traversal rules as apply_patch_to_files, yielded lazily
+    for root, dirs, files in os.walk(search_dir, followlinks=True):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) not in exclude_dirs]
+        for file in files:
+            if file.endswith(".v"):
+                instrument.count('files_walked')
+                yield os.path.join(root, file)
+
+def file_has_instance(file_path, pattern, defines=None):
+    # Memory-map the file so the regex scans the page cache instead of a copy
+    with open(file_path, 'rb') as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                instrument.count('bytes_read', len(mm))
+                instrument.count('regex_evals')
+                if pattern.search(mm) is None:
+                    return False
+                # Only files with a raw hit are lexed, from the same mapping, to
+                # drop matches in comments or `ifdef'd-out code
+                code = vlex.from_text(mm[:].decode('latin-1'), file_path, defines).code
+        except ValueError:
+            # Empty files cannot be mapped
+            return False
+    instrument.count('regex_evals')
+    if pattern.search(code.encode('latin-1')) is None:
+        return False
+    instrument.count('regex_matches')
+    return True
+
+def _scan_file(args):
+    file_path, pattern, defines = args
+    return file_path, file_has_instance(file_path, pattern, defines)
+
+def _split_lines(text):
+    # Split on '\n' only, leaving a CRLF line's '\r' on the line:
+    # str.splitlines would also break on form feeds, a lone '\r' and
+    # latin-1-decoded bytes such as 0x85
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return lines
+
+def _key(line):
+    # Lines are compared without their '\r', so a LF diff applies to a CRLF file
+    return line[:-1] if line.endswith('\r') else line
+
+def parse_change_file(change_file):
+    # Parse the unified diff hunks of the change file once. Each hunk is
+    # (old_start, old_lines, new_lines, new_ends_without_newline), where
+    # new_lines holds (index into old_lines for context lines or None, text).
+    with open(change_file, 'r', encoding='latin-1', newline='') as f:
+        diff_lines = _split_lines(f.read())
+
+    hunk_header = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+    hunks = []
+    i = 0
+    while i < len(diff_lines):
+        header = hunk_header.match(diff_lines[i])
+        if not header:
+            i += 1
+            continue
+        old_start = int(header.group(1))
+        old_count = int(header.group(2)) if header.group(2) is not None else 1
+        new_count = int(header.group(4)) if header.group(4) is not None else 1
+        old_lines, new_lines = [], []
+        no_newline = False
+        i += 1
+        while i < len(diff_lines) and (len(old_lines) < old_count or len(new_lines) < new_count):
+            line = diff_lines[i]
+            tag, text = line[:1], line[1:]
+            if tag == ' ' or _key(line) == '':
+                old_lines.append(text)
+                new_lines.append((len(old_lines) - 1, text))
+            elif tag == '-':
+                old_lines.append(text)
+            elif tag == '+':
+                new_lines.append((None, text))
+            elif tag != '\\':
+                break
+            i += 1
+            # "\ No newline at end of file" following the last new-side line
+            if i < len(diff_lines) and diff_lines[i].startswith('\\') and tag in ' +':
+                no_newline = True
+                i += 1
+        hunks.append((old_start, old_lines, new_lines, no_newline))
+    return hunks
+
+def _find_hunk(lines, old_lines, expected):
+    # Look for the hunk context at the expected line first, then spiral
+    # outwards like patch does (no fuzz)
+    keys = [_key(line) for line in old_lines]
+    limit = len(lines) - len(keys)
+    for offset in range(0, max(expected, limit - expected) + 1):
+        for start in (expected - offset, expected + offset):
+            if 0 <= start <= limit and all(_key(lines[start + k]) == key for k, key in enumerate(keys)):
+                return start
+    return None
+
+def apply_hunks(text, hunks):
+    # Apply the parsed hunks to text; returns the patched text or None if any
+    # hunk does not apply cleanly. Untouched and context lines keep their own
+    # line ending; added lines take the ending of the file where they land.
+    lines = _split_lines(text)
+    ends_with_newline = text.endswith('\n')
+    shift = 0
+    for old_start, old_lines, new_lines, no_newline in hunks:
+        if old_lines:
+            anchor = max(old_start - 1, 0)
+            start = _find_hunk(lines, old_lines, anchor + shift)
+        else:
+            # A pure insertion (old count 0, as diff -U0 writes) goes after
+            # line old_start. With no context to match it cannot be moved,
+            # so it applies at exactly that line or not at all.
+            anchor = old_start
+            start = anchor + shift if 0 <= anchor + shift <= len(lines) else None
+        if start is None:
+            return None
+        end = start + len(old_lines)
+        at_end = end == len(lines)
+        matched = lines[start:end]
+        near = matched[:1] or lines[start - 1:start] or lines[start:start + 1]
+        crlf = near[0].endswith('\r') if near else None
+        replacement = []
+        for n, (old_index, line) in enumerate(new_lines):
+            if old_index is not None:
+                line = matched[old_index]
+            elif crlf is not None and not (at_end and no_newline and n == len(new_lines) - 1):
+                line = _key(line) + ('\r' if crlf else '')
+            replacement.append(line)
+        lines[start:end] = replacement
+        shift = start - anchor + len(new_lines) - len(old_lines)
+        if at_end:
+            ends_with_newline = not no_newline
+    patched = '\n'.join(lines)
+    if lines and ends_with_newline:
+        patched += '\n'
+    return patched
+
+def patch_file(file_path, hunks, change_bytes):
+    # Try the in-process patch first and fall back to `patch` on failure
+    if hunks:
+        with open(file_path, 'r', encoding='latin-1', newline='') as f:
+            patched = apply_hunks(f.read(), hunks)
+        if patched is not None:
+            fileutil.atomic_write(file_path, patched, encoding='latin-1', newline='', prefix='.patch_')
+            return 'in-process'
+    instrument.count('subprocesses')
+    subprocess.run(["patch", "-p0", file_path], input=change_bytes, check=True)
+    return 'patch'
+
+def apply_patch_to_files_parallel(module_names, change_file, search_dir, exclude_dirs, jobs=None, use_processes=False, index_path=None, defines=None):
+    timings = {}
+    pattern = build_module_pattern(module_names)
+    executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+
+    if index_path:
+        # Walk only stats files to refresh the index; the scan is a query
+        from vindex import DesignIndex
+        with DesignIndex(index_path, defines) as index:
+            start = time.perf_counter()
+            scanned, reparsed, removed = index.update(search_dir, exclude_dirs, extensions=(".v",))
+            timings['walk'] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            files_to_patch = index.files_instantiating(module_names, under=search_dir, extensions=(".v",))
+            timings['scan'] = time.perf_counter() - start
+    else:
+        # Walk
+        start = time.perf_counter()
+        verilog_files = list(walk_verilog_files(search_dir, exclude_dirs))
+        scanned = len(verilog_files)
+        timings['walk'] = time.perf_counter() - start
+
+        # Scan
+        start = time.perf_counter()
+        with executor_class(max_workers=jobs) as executor:
+            results = executor.map(_scan_file, ((path, pattern, defines) for path in verilog_files), chunksize=64 if use_processes else 1)
+            files_to_patch = sorted(path for path, matched in results if matched)
+        timings['scan'] = time.perf_counter() - start
+
+    # Patch
+    start = time.perf_counter()
+    hunks = parse_change_file(change_file)
+    with open(change_file, 'rb') as f:
+        change_bytes = f.read()
+    patched, failed, fallbacks = 0, 0, 0
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = {file: executor.submit(patch_file, file, hunks, change_bytes) for file in files_to_patch}
+        for file, future in futures.items():
+            try:
+                method = future.result()
+                patched += 1
+                if method == 'patch':
+                    fallbacks += 1
+                print(f"Patch applied successfully to {file} ({method})")
+            except (subprocess.CalledProcessError, OSError) as e:
+                failed += 1
+                print(f"Failed to apply patch to {file}: {e}")
+    timings['patch'] = time.perf_counter() - start
+
+    print(f"Scanned {scanned} files, {len(files_to_patch)} matched, "
+          f"{patched} patched ({fallbacks} via patch), {failed} failed")
+    for phase, seconds in timings.items():
+        instrument.add_phase(phase, seconds)
+        print(f"  {phase:<6} {seconds:8.3f}s")
+    print(f"  {'total':<6} {sum(timings.values()):8.3f}s")
+    return timings
+
 if __name__ == "__main__":
     # Set up argument parser
     parser = argparse.ArgumentParser(description="Apply patch to Verilog files with specific module instances.")
@@ -58,11 +290,33 @@ if __name__ == "__main__":
     parser.add_argument(
         "--exclude_dirs", nargs="*", default=[], help="Directories to exclude from the search."
     )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="Scan and patch in parallel with this many workers (0 uses the CPU count)."
+    )
+    parser.add_argument(
+        "--processes", action="store_true", help="Use worker processes instead of threads for scanning."
+    )
+    parser.add_argument(
+        "--index", default=None,
+        help="Design index database (see vindex.py); only files indexed as instantiating the modules are patched."
+    )
+    vlex.add_define_argument(parser)
+    instrument.add_arguments(parser)
 
     # Parse arguments
     args = parser.parse_args()
+    defines = vlex.parse_define_args(args.define)
 
     # Apply patch to files with specified module instances
-    apply_patch_to_files(
-        args.module_names, args.change_file, args.search_dir, args.exclude_dirs
-    )
+    with instrument.session(args):
+        if args.jobs is not None:
+            apply_patch_to_files_parallel(
+                args.module_names, args.change_file, args.search_dir, args.exclude_dirs,
+                jobs=args.jobs or None, use_processes=args.processes, index_path=args.index,
+                defines=defines
+            )
+        else:
+            apply_patch_to_files(
+                args.module_names, args.change_file, args.search_dir, args.exclude_dirs, args.index, defines
+            )
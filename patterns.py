@@ -1,57 +1,123 @@
 import re
+import sys
+import json
+import argparse
+import vlex
+import instrument
+from concurrent.futures import ProcessPoolExecutor
 
-def extract_signals_from_sourcelist(verilog_file):
-    signals = []
-    inside_sourcelist = False
-    sourcelist_content = ""
+SOURCELIST_START = '.SourceList('
+DELIMITER_PATTERN = re.compile(r'[(){}]')
+# Regex pattern to extract signal names, making the bit-width optional
+SIGNAL_PATTERN = re.compile(r'{[^,]+,[^,]+,([a-zA-Z_][a-zA-Z0-9_]*(?:\[\d+:\d+\])?)}')
 
-    # Open the Verilog file for reading
-    with open(verilog_file, 'r') as file:
-        for line in file:
-            # Check if we are entering the SourceList port
-            if '.SourceList(' in line:
-                inside_sourcelist = True
-                sourcelist_content += line.strip()  # Start collecting the SourceList content
+def iter_sourcelists(verilog_file, defines=None):
+    # Yield (line number, content) for every .SourceList( connection in a
+    # single streaming pass over the lexed lines (no comments or `ifdef'd-out
+    # code). Parts are collected in a list and joined once, and the connection
+    # ends at the ')' that balances the opening one, not at the first ')'.
+    parts = None
+    depth = 0
+    start_line = 0
 
-            # If we are inside the SourceList, continue collecting lines
-            elif inside_sourcelist:
-                sourcelist_content += line.strip()
+    for line_number, line in enumerate(vlex.iter_lines(verilog_file, defines), 1):
+        line = line.strip()
+        pos = 0
+        while pos <= len(line):
+            if parts is None:
+                start = line.find(SOURCELIST_START, pos)
+                if start < 0:
+                    break
+                parts, depth, start_line = [], 1, line_number
+                pos = start + len(SOURCELIST_START)
 
-                # Check if this line contains the closing parenthesis ')'
-                if ')' in line:
-                    inside_sourcelist = False  # We have reached the end of the SourceList
+            for match in DELIMITER_PATTERN.finditer(line, pos):
+                char = match.group()
+                if char in '({':
+                    depth += 1
+                else:
+                    depth -= 1
+                if depth == 0:
+                    parts.append(line[pos:match.start()])
+                    yield start_line, ''.join(parts)
+                    parts = None
+                    pos = match.end()
+                    break
+            else:
+                parts.append(line[pos:])
+                break
 
-                    # Now we can extract signals from the complete SourceList content
-                    signals.extend(extract_signals_from_string(sourcelist_content))
-                    sourcelist_content = ""  # Reset for the next SourceList instance (if any)
+    if parts is not None:
+        # Unterminated connection at end of file
+        yield start_line, ''.join(parts)
 
+def extract_signals_from_sourcelist(verilog_file, defines=None):
+    signals = []
+    for _, sourcelist_content in iter_sourcelists(verilog_file, defines):
+        signals.extend(extract_signals_from_string(sourcelist_content))
     return signals
 
-def extract_signals_from_string(source_list):
-    # Regex pattern to extract signal names, making the bit-width optional
-    regex_pattern = r'{[^,]+,[^,]+,([a-zA-Z_][a-zA-Z0-9_]*(?:\[\d+:\d+\])?)}'
-
+def extract_signal_names(source_list):
     # Find all signals inside the SourceList string
-    signals = re.findall(regex_pattern, source_list)
+    signals = SIGNAL_PATTERN.findall(source_list)
 
     # Remove the bit-width suffix (if present) and strip trailing parts after the last underscore
-    signal_names = [strip_trailing_underscore_parts(signal.split('[')[0]) for signal in signals]
+    return [strip_trailing_underscore_parts(signal.split('[')[0]) for signal in signals]
 
+def extract_signals_from_string(source_list):
     # Append unique IDs to each signal name
-    return append_unique_ids(signal_names)
+    return append_unique_ids(extract_signal_names(source_list))
 
 def strip_trailing_underscore_parts(signal):
     # Remove everything after the last underscore in the signal name
     return signal.rsplit('_', 1)[0]
 
-def append_unique_ids(signal_names):
+def append_unique_ids(signal_names, start=0):
     # Create a list with unique incrementing IDs appended to each signal
-    return [f"{signal}_{i+1}" for i, signal in enumerate(signal_names)]
+    return [f"{signal}_{start + i + 1}" for i, signal in enumerate(signal_names)]
+
+def scan_file(verilog_file, defines=None):
+    # Worker: raw signal names per SourceList, IDs are assigned by the caller
+    return [(line_number, extract_signal_names(content)) for line_number, content in iter_sourcelists(verilog_file, defines)]
+
+def extract_sourcelists(verilog_files, jobs=None, global_ids=False, defines=None):
+    # {file: [{"line": n, "signals": [...]}]} for many files. Results come back
+    # in input order, so numbering never depends on worker scheduling: IDs
+    # restart for every SourceList (as extract_signals_from_string does), or run
+    # on across all files with global_ids.
+    verilog_files = list(dict.fromkeys(verilog_files))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=vlex.disable_cache) as executor:
+        scanned = list(executor.map(scan_file, verilog_files, [defines] * len(verilog_files), chunksize=8))
+
+    results = {}
+    next_id = 0
+    for verilog_file, sourcelists in zip(verilog_files, scanned):
+        entries = []
+        for line_number, names in sourcelists:
+            entries.append({'line': line_number, 'signals': append_unique_ids(names, next_id if global_ids else 0)})
+            if global_ids:
+                next_id += len(names)
+        results[verilog_file] = entries
+    return results
 
+def main():
+    parser = argparse.ArgumentParser(description='Extract signals from .SourceList( connections in Verilog files.')
+    parser.add_argument('verilog_files', nargs='+', help='Verilog files to scan')
+    parser.add_argument('-o', '--output', help='Output JSON file (default: stdout)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes')
+    parser.add_argument('--global-ids', action='store_true', help='Number signals continuously across all files')
+    vlex.add_define_argument(parser)
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
 
-# Example Usage
-verilog_file = 'path_to_verilog_file.v'
-extracted_signals = extract_signals_from_sourcelist(verilog_file)
+    with instrument.session(args):
+        results = extract_sourcelists(args.verilog_files, args.jobs, args.global_ids, vlex.parse_define_args(args.define))
+        if args.output:
+            with open(args.output, 'w') as file:
+                json.dump(results, file, indent=4)
+        else:
+            json.dump(results, sys.stdout, indent=4)
+            print()
 
-# Print the extracted signals with unique IDs
-print(extracted_signals)
+if __name__ == "__main__":
+    main()
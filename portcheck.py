@@ -0,0 +1,334 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from bisect import bisect_right
+
+import vlex
+import vexpr
+import hashcache
+import instrument
+from vindex import INSTANCE_PATTERN, KEYWORDS
+from extract_vports import (blank_subroutines, expand_inputs, matching_close, module_spans, parse_module,
+                            split_commas)
+
+# Instance port-connectivity checker. Every source is parsed once, in a
+# process pool, into the port and parameter tables of the modules it defines
+# and the named-port instantiations it contains (with the width of each
+# connected expression worked out in the parent module's scope). The parent
+# process then checks every instance of a known module against its port
+# table: ports left out, connections to ports that do not exist, ports
+# connected twice and connections whose width differs from the port's width
+# under the instance's #(...) parameter overrides. Instances of modules that
+# are not in the sources (library cells, primitives) are counted, not checked.
+
+NAMED_CONNECTION_PATTERN = re.compile(r'\s*\.\s*(\w+)\s*(?:\((.*)\))?\s*$', re.DOTALL)
+SIZED_LITERAL_PATTERN = re.compile(r"(\d+)\s*'[sS]?[bBoOdDhH]\s*[0-9a-fA-F_xXzZ?]+")
+SELECT_PATTERN = re.compile(r'(\w+)\s*(?:\[([^\[\]]+)\])?', re.DOTALL)
+REPLICATION_PATTERN = re.compile(r'([^{}]+?)\s*(\{.*\})', re.DOTALL)
+
+def _width(msb, lsb, resolver):
+    msb, lsb = resolver.value(msb), resolver.value(lsb)
+    if msb is None or lsb is None:
+        return None
+    return abs(msb - lsb) + 1
+
+def expression_width(text, signals, resolver):
+    """Bit width of a connected expression, or None when it cannot be worked out.
+
+    Handles declared names, bit/part selects ([i], [a:b], [a+:w], [a-:w]),
+    sized literals and {concatenations} / {N{replications}}; anything else
+    (operators, unsized literals, function calls) is left unchecked.
+    """
+    text = text.strip()
+    if not text:
+        return None
+    literal = SIZED_LITERAL_PATTERN.fullmatch(text)
+    if literal:
+        return int(literal.group(1))
+    if text[0] == '{':
+        if matching_close(text, 0) != len(text) - 1:
+            return None
+        inner = text[1:-1].strip()
+        replication = REPLICATION_PATTERN.fullmatch(inner)
+        if replication and matching_close(replication.group(2), 0) == len(replication.group(2)) - 1:
+            count = resolver.value(replication.group(1))
+            width = expression_width(replication.group(2), signals, resolver)
+            return count * width if count is not None and width is not None else None
+        total = 0
+        for part in split_commas(inner):
+            width = expression_width(part, signals, resolver)
+            if width is None:
+                return None
+            total += width
+        return total
+
+    select = SELECT_PATTERN.fullmatch(text)
+    if not select or select.group(1) not in signals:
+        return None
+    msb, lsb, packed = signals[select.group(1)]
+    if not packed:
+        return None
+    index = select.group(2)
+    if index is None:
+        return _width(msb, lsb, resolver) if msb else 1
+    for operator in ('+:', '-:'):
+        if operator in index:
+            return resolver.value(index.split(operator, 1)[1])
+    if ':' in index:
+        high, low = index.split(':', 1)
+        return _width(high, low, resolver)
+    return 1
+
+def _parse_overrides(text, resolver):
+    # #(.A(8), .B(W*2)) or #(8, 16): values are evaluated in the parent's
+    # scope, so a None value marks an override we could not resolve
+    overrides = []
+    for position, item in enumerate(split_commas(text)):
+        if not item.strip():
+            continue
+        named = NAMED_CONNECTION_PATTERN.match(item)
+        if named:
+            overrides.append((named.group(1), resolver.value(named.group(2) or '')))
+        else:
+            overrides.append((position, resolver.value(item)))
+    return overrides
+
+def parse_source(code, defines=None):
+    """Return (modules, instances) for one file's comment-free code.
+
+    modules is [(name, line, parameters, defines, ports)]; instances is a
+    list of dicts with the instance's location, parameter overrides and
+    either its named connections as {port: [(expression, width)]} or None
+    when the ports are connected by position.
+    """
+    code = blank_subroutines(code)
+    line_starts = [0] + [m.end() for m in re.finditer('\n', code)]
+    file_defines = dict(defines or {})
+    file_defines.update(vexpr.parse_defines(code))
+
+    modules, instances = [], []
+    for module_match, end in module_spans(code):
+        span = code[module_match.start():end]
+        base = module_match.start()
+        parent = module_match.group(1)
+
+        parameters = vexpr.parse_parameters(span)
+        resolver = vexpr.WidthResolver(parameters, file_defines)
+        ports, signals = parse_module(span, module_match.end(1) - base)
+        modules.append((parent, bisect_right(line_starts, module_match.start(1)), parameters, file_defines,
+                        list(ports.values())))
+
+        for match in INSTANCE_PATTERN.finditer(span):
+            module, instance = match.group(1), match.group(2)
+            if module in KEYWORDS or instance in KEYWORDS or module[0].isdigit():
+                continue
+            between = span[match.end(1):match.start(2)]
+            overrides = []
+            if '#' in between:
+                open_paren = between.index('(', between.index('#'))
+                overrides = _parse_overrides(between[open_paren + 1:matching_close(between, open_paren)], resolver)
+
+            open_paren = match.end() - 1
+            items = [item for item in split_commas(span[open_paren + 1:matching_close(span, open_paren)])
+                     if item.strip()]
+            connections, wildcard = {}, False
+            for item in items:
+                if item.strip() == '.*':
+                    wildcard = True
+                    continue
+                named = NAMED_CONNECTION_PATTERN.match(item)
+                if not named:
+                    connections = None
+                    break
+                port, expression = named.group(1), named.group(2)
+                if expression is None:
+                    # .name connects the signal of the same name
+                    expression = port
+                connections.setdefault(port, []).append(
+                    (' '.join(expression.split()), expression_width(expression, signals, resolver)))
+
+            instances.append({
+                'line': bisect_right(line_starts, base + match.start(1)),
+                'parent': parent,
+                'module': module,
+                'instance': instance,
+                'array': '[' in span[match.end(2):match.end()],
+                'overrides': overrides,
+                'connections': connections,
+                'wildcard': wildcard,
+            })
+    return modules, instances
+
+# Bumped when the parse results change shape, so caches from older runs are not reused
+CHECK_FORMAT = 2
+
+class PortTable:
+    """Port tables of every module, with width resolvers per override set."""
+
+    def __init__(self):
+        self.modules = {}
+        self.duplicates = set()
+        self._widths = {}
+
+    def add(self, path, name, line, parameters, defines, ports):
+        if name in self.modules:
+            # The first definition wins; later ones are only noted
+            self.duplicates.add(name)
+            return
+        # Parameters may come back from a JSON cache as plain lists
+        parameters = [vexpr.Parameter(*parameter) for parameter in parameters]
+        resolver = vexpr.WidthResolver(parameters, defines)
+        ordered = [p.name for p in parameters if p.kind == 'parameter']
+        self.modules[name] = {'path': path, 'line': line, 'ports': {port['name']: port for port in ports},
+                              'resolver': resolver, 'parameter_order': ordered}
+
+    def port_widths(self, module, overrides):
+        """{port: width or None} for module under instance overrides, or None if an override is unresolved."""
+        cache_key = (module, tuple(map(tuple, overrides)))
+        if cache_key not in self._widths:
+            self._widths[cache_key] = self._port_widths(self.modules[module], overrides)
+        return self._widths[cache_key]
+
+    @staticmethod
+    def _port_widths(table, overrides):
+        named = {}
+        for key, value in overrides:
+            if value is None:
+                return None
+            if isinstance(key, int):
+                if key >= len(table['parameter_order']):
+                    continue
+                key = table['parameter_order'][key]
+            named[key] = value
+        resolver = table['resolver'].for_overrides(named)
+        return {name: None if port['unpacked'] else _width(port['msb'], port['lsb'], resolver)
+                for name, port in table['ports'].items()}
+
+def check_instance(table, path, instance, ignore=()):
+    """Return the issues found for one instance of a module in table, leaving out the kinds in ignore."""
+    module = table.modules[instance['module']]
+    where = {'path': path, 'line': instance['line'], 'parent': instance['parent'],
+             'instance': instance['instance'], 'module': instance['module']}
+    issues = []
+    connections = instance['connections']
+    for port, connected in connections.items():
+        if port not in module['ports']:
+            if 'extra' not in ignore:
+                issues.append(dict(where, kind='extra', port=port, connection=connected[0][0]))
+        elif len(connected) > 1 and 'duplicate' not in ignore:
+            issues.append(dict(where, kind='duplicate', port=port, connection=[c[0] for c in connected]))
+    if not instance['wildcard'] and 'missing' not in ignore:
+        for port in module['ports']:
+            if port not in connections:
+                issues.append(dict(where, kind='missing', port=port))
+
+    # Instance arrays spread wider connections across their elements
+    widths = None if instance['array'] or 'width' in ignore else table.port_widths(instance['module'], instance['overrides'])
+    if widths is not None:
+        for port, connected in connections.items():
+            port_width = widths.get(port)
+            expression, width = connected[0]
+            if port_width is not None and width is not None and width != port_width:
+                issues.append(dict(where, kind='width', port=port, port_width=port_width,
+                                   connection=expression, connection_width=width))
+    return issues
+
+def check_connectivity(sources, jobs=None, defines=None, cache_file=None, ignore=()):
+    """Parse sources in parallel and check every named-port instance of a module they define.
+
+    With cache_file, parse results are kept by content hash between runs so
+    only changed files are parsed again.
+    """
+    start = time.perf_counter()
+    cache = {}
+    if cache_file and os.path.exists(cache_file):
+        with instrument.phase('load_cache'):
+            cache = hashcache.load_cache(cache_file)
+
+    table = PortTable()
+    with instrument.phase('parse'):
+        results, _, reparsed = hashcache.run(parse_source, sources, cache, jobs, defines, CHECK_FORMAT)
+    parsed = []
+    for file_path, sha1, (modules, instances) in results:
+        for name, line, parameters, file_defines, ports in modules:
+            table.add(file_path, name, line, parameters, file_defines, ports)
+        parsed.append((file_path, instances))
+
+    hashes = {sha1 for _, sha1, _ in results}
+    if cache_file and (reparsed or len(cache) != len(hashes)):
+        with instrument.phase('write_cache'):
+            hashcache.save_cache(cache_file, cache, hashes)
+
+    issues = []
+    stats = {'files': len(sources), 'parsed': reparsed, 'modules': len(table.modules), 'instances': 0, 'checked': 0,
+             'positional': 0, 'unknown_module': 0}
+    unknown = set()
+    with instrument.phase('check'):
+        for file_path, instances in parsed:
+            for instance in instances:
+                stats['instances'] += 1
+                if instance['module'] not in table.modules:
+                    stats['unknown_module'] += 1
+                    unknown.add(instance['module'])
+                elif instance['connections'] is None:
+                    stats['positional'] += 1
+                else:
+                    stats['checked'] += 1
+                    issues.extend(check_instance(table, file_path, instance, ignore))
+    stats['seconds'] = time.perf_counter() - start
+    stats['issues'] = len(issues)
+    stats['duplicate_modules'] = sorted(table.duplicates)
+    stats['unknown_modules'] = sorted(unknown)
+    instrument.count('instances', stats['instances'])
+    instrument.count('instances_checked', stats['checked'])
+    return issues, stats
+
+def format_issue(issue):
+    where = f"{issue['path']}:{issue['line']}: {issue['parent']}.{issue['instance']} ({issue['module']})"
+    if issue['kind'] == 'missing':
+        return f"{where}: port '{issue['port']}' is not connected"
+    if issue['kind'] == 'extra':
+        return f"{where}: no port named '{issue['port']}' (connected to {issue['connection']})"
+    if issue['kind'] == 'duplicate':
+        return f"{where}: port '{issue['port']}' is connected {len(issue['connection'])} times"
+    return (f"{where}: port '{issue['port']}' is {issue['port_width']} bits but "
+            f"{issue['connection']} is {issue['connection_width']} bits")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check that every named-port instance connects all ports of its module, '
+                    'with no unknown ports and matching widths.')
+    parser.add_argument('inputs', nargs='*', metavar='INPUT', help='Files, directories or glob patterns to check')
+    parser.add_argument('-f', '--filelist', type=str, help='Filelist of sources to check')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes')
+    parser.add_argument('--cache', type=str, help='Content-hash cache file reused between runs')
+    parser.add_argument('--ignore', nargs='+', default=[], choices=('missing', 'extra', 'duplicate', 'width'),
+                        help='Kinds of issue not to report')
+    parser.add_argument('--json', type=str, metavar='FILE', help='Also write the issues and summary as JSON to FILE')
+    vlex.add_define_argument(parser)
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args):
+        if not args.inputs and not args.filelist:
+            parser.error('no sources given')
+        sources = expand_inputs(args.inputs, args.filelist)
+        issues, stats = check_connectivity(sources, args.jobs, vlex.parse_define_args(args.define), args.cache,
+                                           set(args.ignore))
+
+        for issue in issues:
+            print(format_issue(issue))
+        print(f"{stats['checked']} of {stats['instances']} instances checked against {stats['modules']} modules "
+              f"in {stats['files']} files ({stats['parsed']} parsed; {stats['positional']} positional, {stats['unknown_module']} of "
+              f"unknown modules) in {stats['seconds']:.3f}s: {len(issues)} issues")
+        if args.json:
+            with open(args.json, 'w') as file:
+                json.dump({'summary': stats, 'issues': issues}, file, indent=4)
+        if issues:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
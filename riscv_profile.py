@@ -0,0 +1,238 @@
+import re
+import sys
+import json
+import argparse
+
+import numpy as np
+
+import instrument
+
+# Instruction-mix profiler for objdump listings, using the same rules as
+# riscv_parser (MEM_RD/MEM_WR/MAC_OP/CTRL, 2/4-byte counts, code size,
+# mnemonic counts). Instead of converting every word to a binary string, the
+# opcode/funct3/funct7 bit-fields are decoded as integers over NumPy arrays a
+# chunk at a time, and totals are also broken down per section and per function.
+
+CATEGORIES = ('MEM_RD', 'MEM_WR', 'MAC_OP', 'CTRL')
+ADDRESS_PATTERN = re.compile(r'[0-9a-f]+:')
+SECTION_PATTERN = re.compile(r'^Disassembly of section (\S+):')
+FUNCTION_PATTERN = re.compile(r'^[0-9a-fA-F]+ <(.+)>:')
+HEX_WORD_PATTERN = re.compile(r'[0-9a-fA-F]{4}|[0-9a-fA-F]{8}')
+
+CHUNK_SIZE = 1 << 16
+
+_HEX2BIN = {c: format(int(c, 16), '04b') for c in '0123456789abcdef'}
+
+def classify_words(words, lengths):
+    """Category index (0-3, or -1 for none) for each word, riscv_parser's rules.
+
+    words holds the instruction value, lengths its width in bits (16 or 32).
+    """
+    result = np.full(len(words), -1, dtype=np.int8)
+    wide = lengths == 32
+    opcode = words & 0x7f
+    funct7 = words >> 25
+    quadrant = words & 0x3
+    funct3 = (words >> 13) & 0x7
+    top8 = (words >> 8) & 0xff
+
+    c_quadrant = ~wide & ((quadrant == 0) | (quadrant == 2))
+    mem_rd = (wide & (opcode == 0b0000011)) | (c_quadrant & ((funct3 == 0b010) | (funct3 == 0b011)))
+    mem_wr = (wide & (opcode == 0b0100011)) | (c_quadrant & ((funct3 == 0b110) | (funct3 == 0b101)))
+    mac_op = wide & (opcode == 0b0110011) & (funct7 == 0b0000001)
+    ctrl = (wide & ((opcode == 0b1100011) | (opcode == 0b1100111) | (opcode == 0b1101111))) \
+        | (~wide & (quadrant == 1) & np.isin(funct3, (0b001, 0b101, 0b110, 0b111))) \
+        | (~wide & (quadrant == 2) & (top8 == 0b10000000))
+
+    # First match wins, as in the Perl if/elsif chain
+    for index, mask in reversed(list(enumerate((mem_rd, mem_wr, mac_op, ctrl)))):
+        result[mask] = index
+    return result
+
+def classify_string(hex_word):
+    # Fallback for words that are not 4 or 8 hex digits: emulate the Perl
+    # substring comparisons on the binary string exactly
+    inst_bin = ''.join(_HEX2BIN.get(c.lower(), '') for c in hex_word)
+    if len(inst_bin) == 32:
+        sub1, sub2, sub3 = inst_bin[-7:], inst_bin[:7], None
+    else:
+        sub1, sub2, sub3 = inst_bin[-2:], inst_bin[:3], inst_bin[:8]
+    if sub1 == '0000011' or (sub1 in ('10', '00') and sub2 in ('010', '011')):
+        return 0, len(inst_bin)
+    if sub1 == '0100011' or (sub1 in ('10', '00') and sub2 in ('110', '101')):
+        return 1, len(inst_bin)
+    if sub1 == '0110011' and sub2 == '0000001':
+        return 2, len(inst_bin)
+    if sub1 in ('1100011', '1100111', '1101111') \
+            or (sub1 == '01' and sub2 in ('001', '101', '110', '111')) \
+            or (sub1 == '10' and sub3 == '10000000'):
+        return 3, len(inst_bin)
+    return -1, len(inst_bin)
+
+def _new_totals():
+    return {'instructions': 0, 'code_size': 0, 'num_2_byte': 0, 'num_4_byte': 0,
+            'categories': dict.fromkeys(CATEGORIES, 0)}
+
+class Profile:
+    def __init__(self):
+        self.totals = _new_totals()
+        self.mnemonics = {}
+        self.sections = {}
+        self.functions = {}
+
+    def add(self, group, key, instructions, code_size, num_2, num_4, categories):
+        totals = group.setdefault(key, _new_totals()) if group is not None else self.totals
+        totals['instructions'] += instructions
+        totals['code_size'] += code_size
+        totals['num_2_byte'] += num_2
+        totals['num_4_byte'] += num_4
+        for name, count in zip(CATEGORIES, categories):
+            totals['categories'][name] += count
+
+    def to_dict(self):
+        def clean(totals):
+            size = totals['code_size']
+            return dict(totals, code_size=int(size) if float(size).is_integer() else size)
+        return {
+            **clean(self.totals),
+            'mnemonics': dict(sorted(self.mnemonics.items())),
+            'sections': {k: clean(v) for k, v in self.sections.items()},
+            'functions': {k: clean(v) for k, v in self.functions.items()},
+        }
+
+def _flush(profile, chunk, section_names, function_names):
+    hex_words, sections, functions, fallback = chunk
+    n = len(hex_words)
+    if not n:
+        return
+    lengths = np.array([len(h) * 4 for h in hex_words], dtype=np.uint32)
+    fast = np.array([i not in fallback for i in range(n)]) if fallback else np.ones(n, dtype=bool)
+    words = np.zeros(n, dtype=np.uint32)
+    fast_index = np.nonzero(fast)[0]
+    if len(fast_index):
+        words[fast_index] = np.array([int(hex_words[i], 16) for i in fast_index], dtype=np.uint32)
+    category = classify_words(words, lengths)
+    for i in fallback:
+        category[i], lengths[i] = classify_string(hex_words[i])
+
+    code_size = np.array([len(h) for h in hex_words], dtype=np.float64) / 2
+    section_ids = np.array(sections, dtype=np.int64)
+    function_ids = np.array(functions, dtype=np.int64)
+    one_hot = [(category == c) for c in range(len(CATEGORIES))]
+    is_2 = lengths == 16
+    is_4 = lengths == 32
+
+    for group, ids, names in ((profile.sections, section_ids, section_names),
+                              (profile.functions, function_ids, function_names),
+                              (None, np.zeros(n, dtype=np.int64), ['total'])):
+        size = len(names)
+        counts = np.bincount(ids, minlength=size)
+        sizes = np.bincount(ids, weights=code_size, minlength=size)
+        n2 = np.bincount(ids, weights=is_2, minlength=size)
+        n4 = np.bincount(ids, weights=is_4, minlength=size)
+        cats = [np.bincount(ids, weights=mask, minlength=size) for mask in one_hot]
+        for key in np.nonzero(counts)[0]:
+            profile.add(group, names[key], int(counts[key]), float(sizes[key]), int(n2[key]), int(n4[key]),
+                        [int(c[key]) for c in cats])
+
+    chunk[0].clear(); chunk[1].clear(); chunk[2].clear(); chunk[3].clear()
+
+def profile_listing(listing_file, chunk_size=CHUNK_SIZE):
+    """Stream an objdump listing and return a Profile."""
+    profile = Profile()
+    section_names, section_ids = [], {}
+    function_names, function_ids = [], {}
+
+    def intern(name, names, ids):
+        if name not in ids:
+            ids[name] = len(names)
+            names.append(name)
+        return ids[name]
+
+    section = intern('', section_names, section_ids)
+    function = intern('', function_names, function_ids)
+    chunk = ([], [], [], set())
+
+    with open(listing_file, 'r', errors='replace') as fh:
+        for line in fh:
+            tokens = line.split()
+            if not tokens:
+                continue
+            if not ADDRESS_PATTERN.fullmatch(tokens[0]):
+                header = SECTION_PATTERN.match(line)
+                if header:
+                    section = intern(header.group(1), section_names, section_ids)
+                    continue
+                label = FUNCTION_PATTERN.match(line)
+                if label:
+                    function = intern(label.group(1), function_names, function_ids)
+                continue
+
+            hex_word = tokens[1] if len(tokens) > 1 else ''
+            mnemonic = tokens[2] if len(tokens) > 2 else ''
+            profile.mnemonics[mnemonic] = profile.mnemonics.get(mnemonic, 0) + 1
+            if not HEX_WORD_PATTERN.fullmatch(hex_word):
+                chunk[3].add(len(chunk[0]))
+            chunk[0].append(hex_word)
+            chunk[1].append(section)
+            chunk[2].append(function)
+            if len(chunk[0]) >= chunk_size:
+                _flush(profile, chunk, section_names, function_names)
+    _flush(profile, chunk, section_names, function_names)
+    instrument.count('files_read')
+    instrument.count('instructions', profile.totals['instructions'])
+    return profile
+
+def _delta(new, old):
+    if isinstance(new, dict) or isinstance(old, dict):
+        new, old = new or {}, old or {}
+        return {k: _delta(new.get(k), old.get(k)) for k in list(old) + [k for k in new if k not in old]}
+    return (new or 0) - (old or 0)
+
+def compare_profiles(new, old):
+    """Per-key differences new - old for two to_dict() profiles."""
+    return _delta(new, old)
+
+def print_summary(profile, out=sys.stdout):
+    # Same totals riscv_parser prints
+    totals = profile.to_dict()
+    for mnemonic, count in totals['mnemonics'].items():
+        out.write(f"{mnemonic:<50} | {count:<30}\n")
+    out.write(f"Total Instructions {totals['instructions']}\n")
+    out.write(f"Total Memory Read {totals['categories']['MEM_RD']}\n")
+    out.write(f"Total Memory Write {totals['categories']['MEM_WR']}\n")
+    out.write(f"Total MAC Operations {totals['categories']['MAC_OP']}\n")
+    out.write(f"Total CTRL Operations {totals['categories']['CTRL']}\n")
+    out.write(f"Total 2 Byte Instructions {totals['num_2_byte']}\n")
+    out.write(f"Total 4 Byte Instructions {totals['num_4_byte']}\n")
+    out.write(f"Code Size {totals['code_size']}\n")
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile the instruction mix of a RISC-V objdump listing.')
+    parser.add_argument('listing', help='Listing file')
+    parser.add_argument('--compare', metavar='BASE_LISTING', help='Also profile BASE_LISTING and report the differences')
+    parser.add_argument('-o', '--output', help='Output JSON file (default: stdout)')
+    parser.add_argument('--summary', action='store_true', help="Print riscv_parser's text summary instead of JSON")
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args):
+        profile = profile_listing(args.listing)
+        if args.summary:
+            print_summary(profile)
+            return
+
+        result = profile.to_dict()
+        if args.compare:
+            base = profile_listing(args.compare).to_dict()
+            result = {'base': base, 'new': result, 'delta': compare_profiles(result, base)}
+
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(result, f, indent=4)
+        else:
+            json.dump(result, sys.stdout, indent=4)
+            print()
+
+if __name__ == "__main__":
+    main()
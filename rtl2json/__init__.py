@@ -0,0 +1,2 @@
+# Debug-bus tools built on the shared modules at the repository root. Run them
+# from there as modules, e.g. python -m rtl2json.rtl2json dbg.v
@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+import instrument
+
+# Decode captured debug-bus samples into per-field columns using the field
+# maps written by rtl2json.py. Samples are held as rows of little-endian
+# uint64 words (word 0 = bits 63:0) and processed a chunk at a time, so memory
+# stays bounded no matter how long the trace is.
+
+WORD_BITS = 64
+
+def load_layout(json_file):
+    with open(json_file, 'r') as file:
+        data = json.load(file)
+    # Only LHS buses carry a list of ranged fields; skip bare field entries
+    return {bus: fields for bus, fields in data.items() if isinstance(fields, list)}
+
+class BusDecoder:
+    # Shift/mask table for one bus, compiled once from its field list
+
+    def __init__(self, bus, fields):
+        ranged = [f for f in fields if 'msb' in f and 'lsb' in f]
+        if not ranged:
+            raise ValueError(f"Bus {bus} has no fields with a bit range")
+        self.bus = bus
+        self.names = []
+        self.width = max(f['msb'] for f in ranged) + 1
+        self.words = (self.width + WORD_BITS - 1) // WORD_BITS
+        self.table = []  # (word_lo, word_hi, shift, mask)
+        counts = {}
+        for f in ranged:
+            msb, lsb = f['msb'], f['lsb']
+            if msb - lsb + 1 > WORD_BITS:
+                raise ValueError(f"{bus}.{f['field']} is wider than {WORD_BITS} bits")
+            # Fields may repeat in rtl2json output; keep every column distinct
+            name = f['field']
+            counts[name] = counts.get(name, 0) + 1
+            if counts[name] > 1:
+                name = f"{name}_{counts[name] - 1}"
+            self.names.append(name)
+            self.table.append((lsb // WORD_BITS, msb // WORD_BITS, lsb % WORD_BITS,
+                               np.uint64((1 << (msb - lsb + 1)) - 1)))
+
+    def decode(self, words):
+        # words: (n, self.words) uint64 -> {field: (n,) uint64}
+        columns = {}
+        for name, (lo, hi, shift, mask) in zip(self.names, self.table):
+            value = words[:, lo] >> np.uint64(shift)
+            if hi != lo:
+                value |= words[:, hi] << np.uint64(WORD_BITS - shift)
+            columns[name] = value & mask
+        return columns
+
+# Vectorized text -> word conversion ------------------------------------------------
+
+_HEX_LUT = np.zeros(256, dtype=np.uint8)
+for _i, _c in enumerate(b'0123456789abcdef'):
+    _HEX_LUT[_c] = _i
+for _i, _c in enumerate(b'ABCDEF'):
+    _HEX_LUT[_c] = 10 + _i
+
+_BIT_LUT = np.zeros(256, dtype=np.uint8)
+_BIT_LUT[ord('1')] = 1  # x/z decode as 0
+
+def _pack_words(digits, digit_bits, nwords):
+    # digits: flat MSB-first digit values, nwords * 64 / digit_bits per sample -> (n, nwords) uint64
+    per_word = WORD_BITS // digit_bits
+    digits = digits.reshape(-1, nwords, per_word).astype(np.uint64)
+    shifts = np.arange(per_word - 1, -1, -1, dtype=np.uint64) * np.uint64(digit_bits)
+    words = np.bitwise_or.reduce(digits << shifts, axis=2)
+    return words[:, ::-1]
+
+def hex_to_words(values, nwords):
+    width = nwords * WORD_BITS // 4
+    padded = ''.join(v[-width:].rjust(width, '0') for v in values).encode('ascii')
+    digits = _HEX_LUT[np.frombuffer(padded, dtype=np.uint8)]
+    return _pack_words(digits, 4, nwords)
+
+def bin_to_words(values, nwords):
+    width = nwords * WORD_BITS
+    padded = ''.join(v[-width:].rjust(width, '0') for v in values).encode('ascii')
+    digits = _BIT_LUT[np.frombuffer(padded, dtype=np.uint8)]
+    return _pack_words(digits, 1, nwords)
+
+# Streaming readers yielding (times, words) chunks -----------------------------
+
+def read_hex_dump(file, nwords, chunk_size):
+    # One sample per line; the last token is the hex value and an optional
+    # first token is taken as the timestamp
+    times, values = [], []
+    sample = 0
+    for line in file:
+        tokens = line.split()
+        if not tokens or tokens[0].startswith(('#', '//')):
+            continue
+        value = tokens[-1]
+        if value[:2] in ('0x', '0X'):
+            value = value[2:]
+        values.append(value.replace('_', ''))
+        times.append(int(tokens[0]) if len(tokens) > 1 and tokens[0].isdigit() else sample)
+        sample += 1
+        if len(values) >= chunk_size:
+            yield np.array(times, dtype=np.uint64), hex_to_words(values, nwords)
+            times, values = [], []
+    if values:
+        yield np.array(times, dtype=np.uint64), hex_to_words(values, nwords)
+
+def find_vcd_id(file, signal):
+    # Scan the VCD header for the identifier code of signal
+    scope, found = [], None
+    for line in file:
+        tokens = line.split()
+        if not tokens:
+            continue
+        if tokens[0] == '$scope':
+            scope.append(tokens[2])
+        elif tokens[0] == '$upscope':
+            scope.pop()
+        elif tokens[0] == '$var':
+            name = tokens[4]
+            if found is None and (name == signal or '.'.join(scope + [name]) == signal):
+                found = tokens[3]
+        elif tokens[0] == '$enddefinitions':
+            break
+    if found is None:
+        raise ValueError(f"Signal {signal} not found in VCD header")
+    return found
+
+def read_vcd(file, signal, nwords, chunk_size):
+    # Every value change of signal is one sample
+    code = find_vcd_id(file, signal)
+    now = 0
+    times, values = [], []
+    for line in file:
+        if not line:
+            continue
+        head = line[0]
+        if head == '#':
+            now = int(line[1:])
+        elif head in 'bB':
+            value, _, ident = line[1:].partition(' ')
+            if ident.strip() == code:
+                values.append(value)
+                times.append(now)
+        elif head in '01xXzZ' and line[1:].strip() == code:
+            values.append(head)
+            times.append(now)
+        else:
+            continue
+        if len(values) >= chunk_size:
+            yield np.array(times, dtype=np.uint64), bin_to_words(values, nwords)
+            times, values = [], []
+    if values:
+        yield np.array(times, dtype=np.uint64), bin_to_words(values, nwords)
+
+# Columnar writers -----------------------------------------------------------
+
+class CsvWriter:
+    def __init__(self, path, names, radix):
+        self.file = open(path, 'w', buffering=1 << 20)
+        self.fmt = ['%d'] + ['%x' if radix == 'hex' else '%d'] * len(names)
+        self.file.write(','.join(['time'] + names) + '\n')
+
+    def write(self, times, columns):
+        np.savetxt(self.file, np.column_stack([times] + list(columns.values())), fmt=self.fmt, delimiter=',')
+
+    def close(self):
+        self.file.close()
+
+class NpyWriter:
+    # Appends raw column data to temporary files and adds the .npy header at
+    # the end, once the number of samples is known
+    def __init__(self, directory, names):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.names = ['time'] + names
+        self.files = {name: open(os.path.join(directory, f'{name}.raw'), 'wb') for name in self.names}
+        self.count = 0
+
+    def write(self, times, columns):
+        self.files['time'].write(times.tobytes())
+        for name, values in columns.items():
+            self.files[name].write(values.tobytes())
+        self.count += len(times)
+
+    def close(self):
+        for name, file in self.files.items():
+            file.close()
+            raw_path = file.name
+            with open(raw_path, 'rb') as src, open(os.path.join(self.directory, f'{name}.npy'), 'wb') as dst:
+                np.lib.format.write_array_header_1_0(
+                    dst, {'descr': np.lib.format.dtype_to_descr(np.dtype(np.uint64)),
+                          'fortran_order': False, 'shape': (self.count,)})
+                while block := src.read(1 << 24):
+                    dst.write(block)
+            os.remove(raw_path)
+
+def decode_trace(layout_file, bus, trace_file, output, trace_format='hex', signal=None,
+                 output_format='csv', radix='hex', chunk_size=1 << 16):
+    decoder = BusDecoder(bus, load_layout(layout_file)[bus])
+    if output_format == 'csv':
+        writer = CsvWriter(output, decoder.names, radix)
+    else:
+        writer = NpyWriter(output, decoder.names)
+
+    start = time.perf_counter()
+    samples = 0
+    with open(trace_file, 'r') as file:
+        if trace_format == 'vcd':
+            chunks = read_vcd(file, signal or bus, decoder.words, chunk_size)
+        else:
+            chunks = read_hex_dump(file, decoder.words, chunk_size)
+        try:
+            for times, words in chunks:
+                writer.write(times, decoder.decode(words))
+                samples += len(times)
+        finally:
+            writer.close()
+    elapsed = time.perf_counter() - start
+    instrument.add_phase('decode', elapsed)
+    instrument.count('samples', samples)
+
+    rate = samples / elapsed if elapsed else 0.0
+    print(f"Decoded {samples} samples of {bus} ({len(decoder.names)} fields) in {elapsed:.3f}s: {rate:.0f} samples/sec",
+          file=sys.stderr)
+    return samples, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description='Decode debug-bus trace samples into fields using rtl2json output.')
+    parser.add_argument('layout', type=str, help='JSON field map written by rtl2json.py')
+    parser.add_argument('bus', type=str, help='Bus (LHS name) in the field map to decode')
+    parser.add_argument('trace', type=str, help='Trace file: hex dump (one sample per line) or VCD')
+    parser.add_argument('-o', '--output', type=str, required=True, help='Output CSV file, or directory for --npy')
+    parser.add_argument('--vcd', action='store_true', help='Trace is a VCD file')
+    parser.add_argument('--signal', type=str, help='VCD signal carrying the bus (default: the bus name)')
+    parser.add_argument('--npy', action='store_true', help='Write one .npy column per field instead of CSV')
+    parser.add_argument('--radix', choices=('hex', 'dec'), default='hex', help='CSV value radix')
+    parser.add_argument('--chunk', type=int, default=1 << 16, help='Samples decoded per chunk')
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args):
+        decode_trace(args.layout, args.bus, args.trace, args.output,
+                     trace_format='vcd' if args.vcd else 'hex', signal=args.signal,
+                     output_format='npy' if args.npy else 'csv', radix=args.radix, chunk_size=args.chunk)
+
+if __name__ == "__main__":
+    main()
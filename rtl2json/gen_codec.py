@@ -0,0 +1,255 @@
+import re
+import sys
+import json
+import time
+import random
+import keyword
+import builtins
+import argparse
+import importlib.util
+
+import instrument
+
+# Generates a Python module with one pack/unpack class per bus in an
+# rtl2json.py field map. Shifts and masks are baked into the generated code
+# as literals, so decoding a transaction is a handful of integer operations
+# instead of dict lookups and binary-string slicing.
+
+def load_layout(json_file):
+    with open(json_file, 'r') as file:
+        data = json.load(file)
+    return {bus: fields for bus, fields in data.items() if isinstance(fields, list)}
+
+def class_name(bus):
+    parts = re.split(r'[^A-Za-z0-9]+', bus)
+    name = ''.join(part[:1].upper() + part[1:] for part in parts if part)
+    return name if name and not name[0].isdigit() else f"Bus{name}"
+
+def class_names(buses):
+    # {bus: class name}, with keywords (a bus named "none" gives None),
+    # builtins, the BUSES registry and repeated names made unique
+    names, used = {}, set()
+    for bus in buses:
+        name = class_name(bus)
+        if keyword.iskeyword(name) or hasattr(builtins, name) or name == 'BUSES':
+            name = f"{name}_"
+        base, n = name, 1
+        while name in used:
+            name = f"{base}_{n}"
+            n += 1
+        used.add(name)
+        names[bus] = name
+    return names
+
+# Names the generated classes already use for class attributes, methods and
+# method parameters; fields with these names get a suffix
+RESERVED_NAMES = {
+    'BUS', 'WIDTH', 'FIELDS', 'RTL_FIELDS', 'from_int', 'from_bytes', 'to_int', 'to_bytes',
+    'decode_many', 'self', 'cls', 'value', 'values', 'data', 'byteorder', 'other',
+}
+
+def field_table(fields):
+    # [(attribute name, lsb, mask, rtl field name)] for the ranged fields, with
+    # repeated, reserved or non-identifier names made unique
+    table, used = [], set()
+    for f in fields:
+        if 'msb' not in f or 'lsb' not in f:
+            continue
+        msb, lsb = max(f['msb'], f['lsb']), min(f['msb'], f['lsb'])
+        name = re.sub(r'\W', '_', f['field']) or 'field'
+        if name[0].isdigit():
+            name = f"f_{name}"
+        if keyword.iskeyword(name) or name in RESERVED_NAMES or name.startswith('__'):
+            name = f"{name}_"
+        base, n = name, 1
+        while name in used:
+            name = f"{base}_{n}"
+            n += 1
+        used.add(name)
+        table.append((name, lsb, (1 << (msb - lsb + 1)) - 1, f['field']))
+    return table
+
+def generate_class(bus, fields, cls=None):
+    table = field_table(fields)
+    names = [name for name, _, _, _ in table]
+    width = max((lsb + mask.bit_length() for _, lsb, mask, _ in table), default=0)
+    nbytes = (width + 7) // 8
+    cls = cls or class_name(bus)
+
+    lines = [
+        f"class {cls}:",
+        f"    BUS = {bus!r}",
+        f"    WIDTH = {width}",
+        f"    FIELDS = {tuple(names)!r}",
+        f"    RTL_FIELDS = {tuple(rtl for _, _, _, rtl in table)!r}",
+        f"    __slots__ = FIELDS",
+        "",
+        f"    def __init__(self, {', '.join(f'{n}=0' for n in names)}):",
+    ]
+    lines += [f"        self.{n} = {n}" for n in names] or ["        pass"]
+    lines += [
+        "",
+        "    @classmethod",
+        "    def from_int(cls, value):",
+        "        self = cls.__new__(cls)",
+    ]
+    for name, lsb, mask, _ in table:
+        shifted = f"(value >> {lsb})" if lsb else "value"
+        lines.append(f"        self.{name} = {shifted} & {mask:#x}")
+    lines += [
+        "        return self",
+        "",
+        "    @classmethod",
+        "    def from_bytes(cls, data, byteorder='little'):",
+        "        return cls.from_int(int.from_bytes(data, byteorder))",
+        "",
+        "    def to_int(self):",
+    ]
+    terms = [f"((self.{name} & {mask:#x}) << {lsb})" if lsb else f"(self.{name} & {mask:#x})"
+             for name, lsb, mask, _ in table]
+    lines.append(f"        return {' | '.join(terms) or '0'}")
+    lines += [
+        "",
+        "    def to_bytes(self, byteorder='little'):",
+        f"        return self.to_int().to_bytes({nbytes}, byteorder)",
+        "",
+        "    @staticmethod",
+        "    def decode_many(values):",
+        "        # {field: column} for a sequence of integers; a NumPy integer array",
+        "        # is decoded with vectorized shifts and masks",
+        "        if hasattr(values, 'dtype'):",
+    ]
+    if width <= 64:
+        lines += ["            values = values.astype('uint64')"]
+        lines += [f"            return {{"]
+        lines += [f"                {name!r}: (values >> {lsb}) & {mask:#x}," for name, lsb, mask, _ in table]
+        lines += ["            }"]
+    else:
+        lines += ["            values = values.tolist()"]
+    lines += ["        return {"]
+    lines += [f"            {name!r}: [(v >> {lsb}) & {mask:#x} for v in values]," for name, lsb, mask, _ in table]
+    lines += [
+        "        }",
+        "",
+        "    def __eq__(self, other):",
+        "        return type(other) is type(self) and self.to_int() == other.to_int()",
+        "",
+        "    def __repr__(self):",
+        f"        return f\"{cls}({', '.join(f'{n}={{self.{n}:#x}}' for n in names)})\"",
+    ]
+    return '\n'.join(lines)
+
+def generate_module(layout, source='rtl2json'):
+    names = class_names([bus for bus, fields in layout.items() if field_table(fields)])
+    classes = [generate_class(bus, layout[bus], cls) for bus, cls in names.items()]
+    header = f"# Generated by gen_codec.py from {source}; do not edit.\n"
+    registry = "BUSES = {\n" + ''.join(f"    {bus!r}: {cls},\n" for bus, cls in names.items()) + "}\n"
+    return header + "\n\n" + "\n\n\n".join(classes) + "\n\n\n" + registry
+
+def load_generated(path):
+    spec = importlib.util.spec_from_file_location('rtl_codec', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def reference_decode(value, fields, width):
+    # What a scoreboard does today: slice the binary string using the msb/lsb
+    # that parse_rtl took from the `// [msb:lsb]` comment (bit 0 is the last character)
+    bits = format(value, f'0{width}b')
+    return {f['field']: int(bits[width - 1 - f['msb']:width - f['lsb']], 2) for f in fields}
+
+def verify(module, layout, samples=1000, seed=0):
+    """Round-trip random values through every class and compare with reference_decode."""
+    rng = random.Random(seed)
+    failures = []
+    for bus, fields in layout.items():
+        ranged = [f for f in fields if 'msb' in f and 'lsb' in f and f['msb'] >= f['lsb']]
+        if not ranged or len(ranged) != len(field_table(fields)):
+            continue
+        cls = module.BUSES[bus]
+        covered = 0
+        for f in ranged:
+            covered |= ((1 << (f['msb'] - f['lsb'] + 1)) - 1) << f['lsb']
+        names = [name for name, _, _, _ in field_table(fields)]
+        for _ in range(samples):
+            value = rng.getrandbits(cls.WIDTH)
+            decoded = cls.from_int(value)
+            expected = reference_decode(value, ranged, cls.WIDTH)
+            got = {f['field']: getattr(decoded, name) for f, name in zip(ranged, names)}
+            if got != expected or decoded.to_int() != value & covered \
+                    or cls.from_bytes(decoded.to_bytes()).to_int() != value & covered:
+                failures.append((bus, value))
+                break
+    return failures
+
+def benchmark(module, layout, count=100000, seed=0):
+    """Per-transaction decode cost of the generated classes vs. string slicing."""
+    rng = random.Random(seed)
+    results = {}
+    for bus, fields in layout.items():
+        if bus not in module.BUSES:
+            continue
+        cls = module.BUSES[bus]
+        ranged = [f for f in fields if 'msb' in f and 'lsb' in f and f['msb'] >= f['lsb']]
+        values = [rng.getrandbits(cls.WIDTH) for _ in range(count)]
+
+        start = time.perf_counter()
+        for value in values:
+            reference_decode(value, ranged, cls.WIDTH)
+        baseline = (time.perf_counter() - start) / count
+
+        start = time.perf_counter()
+        for value in values:
+            cls.from_int(value)
+        generated = (time.perf_counter() - start) / count
+
+        start = time.perf_counter()
+        cls.decode_many(values)
+        batch = (time.perf_counter() - start) / count
+
+        results[bus] = {'string_slicing_ns': baseline * 1e9, 'from_int_ns': generated * 1e9, 'decode_many_ns': batch * 1e9}
+
+        if cls.WIDTH <= 64:
+            try:
+                import numpy as np
+            except ImportError:
+                continue
+            array = np.array(values, dtype=np.uint64)
+            start = time.perf_counter()
+            cls.decode_many(array)
+            results[bus]['decode_many_numpy_ns'] = (time.perf_counter() - start) / count * 1e9
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate pack/unpack classes from an rtl2json field map.')
+    parser.add_argument('layout', type=str, help='JSON file written by rtl2json.py')
+    parser.add_argument('-o', '--output', type=str, required=True, help='Generated Python module')
+    parser.add_argument('--verify', action='store_true', help='Round-trip check the generated classes')
+    parser.add_argument('--bench', type=int, default=0, metavar='N', help='Microbenchmark N transactions per bus')
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args):
+        layout = load_layout(args.layout)
+        with open(args.output, 'w') as file:
+            file.write(generate_module(layout, args.layout))
+        print(f"Codec module written to {args.output}")
+
+        if args.verify or args.bench:
+            module = load_generated(args.output)
+        if args.verify:
+            failures = verify(module, layout)
+            for bus, value in failures:
+                print(f"Round-trip mismatch for {bus} at value {value:#x}")
+            print(f"Verified {len(module.BUSES)} bus classes: {len(failures)} failure(s)")
+            if failures:
+                sys.exit(1)
+        if args.bench:
+            for bus, result in benchmark(module, layout, args.bench).items():
+                print(f"{bus}: string slicing {result['string_slicing_ns']:.0f} ns, "
+                      f"from_int {result['from_int_ns']:.0f} ns, decode_many {result['decode_many_ns']:.0f} ns"
+                      + (f", decode_many (NumPy) {result['decode_many_numpy_ns']:.1f} ns" if 'decode_many_numpy_ns' in result else "")
+                      + " per transaction")
+
+if __name__ == "__main__":
+    main()
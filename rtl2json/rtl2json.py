@@ -1,6 +1,14 @@
+import os
 import json
 import re
+import time
+import hashlib
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import vlex
+import fileutil
+import instrument
 
 def parse_rtl(line, current_lhs, debug=False):
     if debug:
@@ -40,13 +48,16 @@ def parse_rtl(line, current_lhs, debug=False):
     
     return lhs, parsed_rhs
 
-def rtl2json(rtl_file, debug=False):
-    with open(rtl_file, 'r') as file:
-        lines = file.readlines()
+def iter_rtl_lines(rtl_file, defines=None):
+    """Stream the lines of rtl_file, with `ifdef'd-out code removed when defines are given."""
+    # Comments are kept: the debug bus markers and bit ranges live in them
+    return vlex.iter_lines(rtl_file, defines, comments=True)
 
+def parse_debug_bus(lines, debug=False):
     data = {}
     in_debug_bus = False
     current_lhs = None
+    parsed = 0
     for line in lines:
         line = line.strip()
         if not line:
@@ -67,6 +78,7 @@ def rtl2json(rtl_file, debug=False):
             if line.startswith("always @* begin") or line.startswith("always_comb begin") or line.startswith("//") or line == "};":
                 continue
             current_lhs, parsed_rhs = parse_rtl(line, current_lhs, debug)
+            parsed += 1
             if current_lhs:
                 if current_lhs not in data:
                     data[current_lhs] = []
@@ -74,18 +86,169 @@ def rtl2json(rtl_file, debug=False):
             else:
                 data.update({item['field']: item for item in parsed_rhs})
 
-    json_file = rtl_file.replace('.v', '.json')
-    with open(json_file, 'w') as file:
+    # One range regex per parsed debug-bus line
+    instrument.count('regex_evals', parsed)
+    if instrument.active():
+        instrument.count('regex_matches', sum(1 for fields in data.values() if isinstance(fields, list)
+                                              for f in fields if 'msb' in f))
+    return data
+
+def json_path(rtl_file, output_dir=None, base_dir=None):
+    # Swap the extension only, so .sv files and directories containing '.v' work
+    stem = os.path.splitext(rtl_file)[0]
+    if output_dir is None:
+        return stem + '.json'
+    if base_dir is None:
+        return os.path.join(output_dir, os.path.basename(stem) + '.json')
+    return os.path.join(output_dir, os.path.relpath(stem, base_dir) + '.json')
+
+def write_json(json_file, data):
+    # Replaced in one rename, so a reader never sees a half-written JSON file
+    os.makedirs(os.path.dirname(json_file) or '.', exist_ok=True)
+    with fileutil.atomic_open(json_file, prefix='.rtl2json_') as file:
         json.dump(data, file, indent=4)
+
+def rtl2json(rtl_file, debug=False, defines=None, json_file=None):
+    data = parse_debug_bus(iter_rtl_lines(rtl_file, defines), debug)
+
+    json_file = json_file or json_path(rtl_file)
+    write_json(json_file, data)
     if debug:
         print(f"JSON output written to {json_file}")
+    return data
+
+MANIFEST_NAME = '.rtl2json_manifest.json'
+
+_defines = None
+_want_data = False
+
+def _init_worker(defines, want_data):
+    global _defines, _want_data
+    _defines = defines
+    _want_data = want_data
+
+def _hashed_lines(rtl_file, sha1):
+    # Stream the file once, hashing the bytes while handing out decoded lines
+    # (without line endings, as vlex.read_lines does)
+    with open(rtl_file, 'rb') as file:
+        for raw in file:
+            sha1.update(raw)
+            line = raw.decode('latin-1').rstrip('\n')
+            yield line[:-1] if line.endswith('\r') else line
+
+def _source_hash(rtl_file):
+    sha1 = hashlib.sha1(repr(_defines).encode())
+    with open(rtl_file, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            sha1.update(chunk)
+    return sha1
+
+def _convert_file(task):
+    # Worker: skip the file when its JSON is newer than the source and the
+    # content hash matches the manifest, otherwise convert it
+    rtl_file, json_file, old_sha1 = task
+    if old_sha1 is not None and os.path.exists(json_file) \
+            and os.stat(json_file).st_mtime_ns >= os.stat(rtl_file).st_mtime_ns:
+        sha1 = _source_hash(rtl_file)
+        if sha1.hexdigest() == old_sha1:
+            return rtl_file, old_sha1, os.path.getsize(rtl_file), False, None
+
+    sha1 = hashlib.sha1(repr(_defines).encode())
+    size = os.path.getsize(rtl_file)
+    # One read: the lines are hashed on their way into the lexer
+    data = parse_debug_bus(vlex.lex_lines(_hashed_lines(rtl_file, sha1), _defines, comments=True))
+    write_json(json_file, data)
+    return rtl_file, sha1.hexdigest(), size, True, data if _want_data else None
+
+def rtl2json_batch(sources, output_dir, jobs=None, defines=None, index_file=None, force=False):
+    """Convert many RTL files into output_dir, reusing up-to-date outputs.
+
+    Output paths mirror the sources relative to their common directory. A
+    manifest of content hashes in output_dir decides which files are current.
+    Raises ValueError when two sources would write the same JSON file (a.v
+    and a.sv in one directory).
+    """
+    manifest_file = os.path.join(output_dir, MANIFEST_NAME)
+    manifest = {}
+    if not force and os.path.exists(manifest_file):
+        # A truncated or unreadable manifest only means every file is converted again
+        try:
+            with open(manifest_file, 'r') as file:
+                manifest = json.load(file)
+        except (OSError, ValueError):
+            pass
+        if not isinstance(manifest, dict):
+            manifest = {}
+
+    base_dir = os.path.commonpath([os.path.dirname(os.path.abspath(f)) for f in sources]) if sources else None
+    outputs = {f: json_path(os.path.abspath(f), output_dir, base_dir) for f in sources}
+    writers = {}
+    for rtl_file, json_file in outputs.items():
+        writers.setdefault(json_file, set()).add(os.path.abspath(rtl_file))
+    clashes = {json_file: sorted(files) for json_file, files in writers.items() if len(files) > 1}
+    if clashes:
+        raise ValueError('several sources map to the same output: ' + '; '.join(
+            f"{', '.join(files)} -> {json_file}" for json_file, files in sorted(clashes.items())))
+    tasks = [(f, outputs[f], manifest.get(os.path.abspath(f))) for f in sources]
+
+    start = time.perf_counter()
+    total_bytes, converted = 0, 0
+    index = {}
+    new_manifest = {}
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(defines, bool(index_file))) as executor:
+        for rtl_file, sha1, size, was_converted, data in executor.map(_convert_file, tasks, chunksize=8):
+            total_bytes += size
+            converted += was_converted
+            new_manifest[os.path.abspath(rtl_file)] = sha1
+            if index_file:
+                if data is None:
+                    with open(outputs[rtl_file], 'r') as file:
+                        data = json.load(file)
+                index[rtl_file] = data
+    elapsed = time.perf_counter() - start
+    # The workers' own counters stay in their processes, so tally here
+    instrument.add_phase('convert', elapsed)
+    instrument.count('files_read', len(sources))
+    instrument.count('bytes_read', total_bytes)
+    instrument.count('files_converted', converted)
+
+    write_json(manifest_file, new_manifest)
+    if index_file:
+        write_json(index_file, index)
+        print(f"Merged index written to {index_file}")
+
+    print(f"{len(sources)} files ({converted} converted, {len(sources) - converted} up to date) "
+          f"into {output_dir} in {elapsed:.3f}s")
+    return {'files': len(sources), 'converted': converted, 'bytes': total_bytes, 'seconds': elapsed}
 
 def main():
     parser = argparse.ArgumentParser(description='Convert RTL to JSON.')
-    parser.add_argument('rtl_file', type=str, help='Input RTL file')
+    parser.add_argument('rtl_file', type=str, nargs='?', help='Input RTL file')
     parser.add_argument('-debug', action='store_true', help='Enable debug output')
+    parser.add_argument('--batch', nargs='+', metavar='INPUT', help='Files, directories or glob patterns to convert in batch mode')
+    parser.add_argument('-f', '--filelist', type=str, help='Filelist of sources to convert in batch mode')
+    parser.add_argument('-o', '--output-dir', type=str, help='Output directory for batch mode')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes for batch mode')
+    parser.add_argument('--index', type=str, metavar='FILE', help='Also write one merged JSON index of every bus, keyed by source file')
+    parser.add_argument('--force', action='store_true', help='Convert every file even if its JSON is up to date')
+    vlex.add_define_argument(parser)
+    instrument.add_arguments(parser)
     args = parser.parse_args()
-    rtl2json(args.rtl_file, args.debug)
+    with instrument.session(args):
+        defines = vlex.parse_define_args(args.define)
+        if args.batch or args.filelist:
+            if not args.output_dir:
+                parser.error('batch mode requires -o/--output-dir')
+            from extract_vports import expand_inputs
+            sources = expand_inputs(([args.rtl_file] if args.rtl_file else []) + (args.batch or []), args.filelist)
+            try:
+                rtl2json_batch(sources, args.output_dir, args.jobs, defines, args.index, args.force)
+            except ValueError as error:
+                parser.error(str(error))
+            return
+        if not args.rtl_file:
+            parser.error('the following arguments are required: rtl_file')
+        rtl2json(args.rtl_file, args.debug, defines)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
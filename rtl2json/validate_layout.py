@@ -0,0 +1,174 @@
+import os
+import re
+import sys
+import json
+import glob
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import vlex
+import instrument
+
+# Checks the {field, msb, lsb} lists written by rtl2json.py. Each bus is
+# sorted once by lsb and swept in order, so overlaps, holes and out-of-range
+# bits are all found in O(n log n) instead of comparing every pair of fields.
+
+DECLARATION_PATTERN = re.compile(
+    r'\b(?:input|output|inout|wire|reg|logic|bit)\b[^;\[]*\[\s*(\d+)\s*:\s*(\d+)\s*\]\s*(\w+(?:\s*,\s*\w+)*)')
+
+def load_layout(json_file):
+    with open(json_file, 'r') as file:
+        data = json.load(file)
+    return {bus: fields for bus, fields in data.items() if isinstance(fields, list)}
+
+def declared_widths(rtl_files, defines=None):
+    # Bus name -> declared width from `[msb:lsb] name` declarations
+    widths = {}
+    for rtl_file in rtl_files:
+        for match in DECLARATION_PATTERN.finditer(vlex.load(rtl_file, defines).code):
+            width = abs(int(match.group(1)) - int(match.group(2))) + 1
+            for name in match.group(3).split(','):
+                widths[name.strip()] = width
+    return widths
+
+def check_bus(bus, fields, width=None):
+    """Return a list of issue dicts for one bus."""
+    issues = []
+    ranged = []
+    names = {}
+    for f in fields:
+        if 'msb' not in f or 'lsb' not in f:
+            continue
+        name, msb, lsb = f['field'], f['msb'], f['lsb']
+        names.setdefault(name, []).append((msb, lsb))
+        if msb < lsb:
+            issues.append({'bus': bus, 'type': 'reversed', 'field': name, 'msb': msb, 'lsb': lsb})
+            msb, lsb = lsb, msb
+        if lsb < 0 or (width is not None and msb >= width):
+            issues.append({'bus': bus, 'type': 'out_of_range', 'field': name, 'msb': msb, 'lsb': lsb, 'width': width})
+        ranged.append((lsb, msb, name))
+
+    for name, ranges in names.items():
+        if len(ranges) > 1:
+            issues.append({'bus': bus, 'type': 'duplicate', 'field': name, 'ranges': ranges})
+
+    if not ranged:
+        return issues
+
+    # Sweep the sorted intervals keeping the field that reaches highest so far
+    ranged.sort()
+    reach_msb, reach_name = -1, None
+    for lsb, msb, name in ranged:
+        if lsb <= reach_msb:
+            issues.append({'bus': bus, 'type': 'overlap', 'field': name, 'other': reach_name,
+                           'msb': min(msb, reach_msb), 'lsb': lsb})
+        elif lsb > reach_msb + 1:
+            issues.append({'bus': bus, 'type': 'hole', 'msb': lsb - 1, 'lsb': reach_msb + 1})
+        if msb > reach_msb:
+            reach_msb, reach_name = msb, name
+
+    if width is not None:
+        # Uncovered top bits are reported once, as a hole
+        if reach_msb < width - 1:
+            issues.append({'bus': bus, 'type': 'hole', 'msb': width - 1, 'lsb': reach_msb + 1})
+        elif reach_msb + 1 > width:
+            issues.append({'bus': bus, 'type': 'width_mismatch', 'declared': width, 'covered': reach_msb + 1})
+    return issues
+
+def validate_layout(json_file, widths=None):
+    widths = widths or {}
+    issues = []
+    for bus, fields in load_layout(json_file).items():
+        issues.extend(check_bus(bus, fields, widths.get(bus)))
+    return issues
+
+def _validate_file(args):
+    json_file, rtl_files, defines = args
+    # Look for the RTL the JSON was generated from next to it
+    if rtl_files is None:
+        base = os.path.splitext(json_file)[0]
+        rtl_files = [base + ext for ext in ('.v', '.sv') if os.path.exists(base + ext)]
+    return json_file, validate_layout(json_file, declared_widths(rtl_files, defines))
+
+def validate_directory(directory, jobs=None, rtl_files=None, defines=None):
+    json_files = sorted(glob.glob(os.path.join(directory, '**', '*.json'), recursive=True))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return dict(executor.map(_validate_file, [(f, rtl_files, defines) for f in json_files], chunksize=4))
+
+def diff_layouts(old_file, new_file):
+    """Compare two layouts; returns a list of change dicts."""
+    old, new = load_layout(old_file), load_layout(new_file)
+    changes = []
+    for bus in sorted(old.keys() - new.keys()):
+        changes.append({'bus': bus, 'type': 'bus_removed'})
+    for bus in sorted(new.keys() - old.keys()):
+        changes.append({'bus': bus, 'type': 'bus_added'})
+    for bus in sorted(old.keys() & new.keys()):
+        old_fields = {f['field']: (f.get('msb'), f.get('lsb')) for f in old[bus]}
+        new_fields = {f['field']: (f.get('msb'), f.get('lsb')) for f in new[bus]}
+        for name in sorted(old_fields.keys() - new_fields.keys()):
+            changes.append({'bus': bus, 'type': 'field_removed', 'field': name, 'range': old_fields[name]})
+        for name in sorted(new_fields.keys() - old_fields.keys()):
+            changes.append({'bus': bus, 'type': 'field_added', 'field': name, 'range': new_fields[name]})
+        for name in sorted(old_fields.keys() & new_fields.keys()):
+            if old_fields[name] != new_fields[name]:
+                changes.append({'bus': bus, 'type': 'field_moved', 'field': name,
+                                'old': old_fields[name], 'new': new_fields[name]})
+    return changes
+
+def format_issue(issue):
+    kind = issue['type']
+    bus = issue['bus']
+    if kind == 'overlap':
+        return f"{bus}: {issue['field']} overlaps {issue['other']} at [{issue['msb']}:{issue['lsb']}]"
+    if kind == 'hole':
+        return f"{bus}: bits [{issue['msb']}:{issue['lsb']}] are not assigned"
+    if kind == 'out_of_range':
+        return f"{bus}: {issue['field']} [{issue['msb']}:{issue['lsb']}] is outside the {issue['width']}-bit bus"
+    if kind == 'duplicate':
+        return f"{bus}: {issue['field']} appears {len(issue['ranges'])} times"
+    if kind == 'reversed':
+        return f"{bus}: {issue['field']} has msb {issue['msb']} < lsb {issue['lsb']}"
+    if kind == 'width_mismatch':
+        return f"{bus}: fields cover {issue['covered']} bits but the bus is declared {issue['declared']} bits"
+    if kind in ('bus_added', 'bus_removed'):
+        return f"{bus}: {kind.replace('_', ' ')}"
+    if kind == 'field_moved':
+        return f"{bus}: {issue['field']} moved from {list(issue['old'])} to {list(issue['new'])}"
+    return f"{bus}: {issue['field']} {kind.split('_')[1]} {list(issue['range'])}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate rtl2json bit layouts for overlaps, holes and width errors.')
+    parser.add_argument('layout', type=str, help='JSON file written by rtl2json.py, or a directory of them')
+    parser.add_argument('--rtl', nargs='+', help='RTL files to read declared bus widths from '
+                        '(default: the .v/.sv next to each JSON file)')
+    parser.add_argument('--diff', type=str, metavar='OLD_JSON', help='Report layout changes from OLD_JSON to layout')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes for a directory')
+    parser.add_argument('--json', action='store_true', help='Print issues as JSON')
+    vlex.add_define_argument(parser)
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+    with instrument.session(args):
+        defines = vlex.parse_define_args(args.define)
+
+        if args.diff:
+            results = {args.layout: diff_layouts(args.diff, args.layout)}
+        elif os.path.isdir(args.layout):
+            results = validate_directory(args.layout, args.jobs, args.rtl, defines)
+        else:
+            results = dict([_validate_file((args.layout, args.rtl, defines))])
+
+        if args.json:
+            json.dump(results, sys.stdout, indent=4)
+            print()
+        else:
+            for json_file, issues in results.items():
+                for issue in issues:
+                    print(f"{json_file}: {format_issue(issue)}")
+            count = sum(len(issues) for issues in results.values())
+            print(f"{len(results)} file(s) checked, {count} issue(s)")
+
+        sys.exit(1 if any(results.values()) else 0)
+
+if __name__ == "__main__":
+    main()
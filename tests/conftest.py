@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The scripts are run in place rather than installed, so put the repository
+# root on the import path
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,75 @@
+import json
+
+import vlex
+import vindex
+import portcheck
+import extract_vports
+
+SOURCE = """module dut #(parameter W = 8) (
+  input  wire [W-1:0] a, b,
+  output logic [ W - 1 : 0 ] y,
+  inout  wire pad,
+  axi_if.slave bus
+);
+  function automatic [3:0] f(input [3:0] x);
+    f = x;
+  endfunction
+endmodule
+"""
+
+def names(ports):
+    return [(port['name'], port['direction']) for port in ports]
+
+def test_parse_ports():
+    ports = extract_vports.parse_ports(vlex.from_text(SOURCE).code)
+    assert names(ports) == [('a', 'input'), ('b', 'input'), ('y', 'output'), ('pad', 'inout'), ('bus', 'unknown')]
+    assert ports[2] == {'name': 'y', 'msb': 'W - 1', 'lsb': '0', 'width': 'W - 1-0+1', 'direction': 'output',
+                        'type': 'logic'}
+    assert list(ports[0]) == list(extract_vports.PORT_FIELDS)
+
+def test_non_ansi_ports_and_fragments():
+    code = vlex.from_text("module m(a, q);\n  input [1:0] a;\n  output reg q;\nendmodule\n").code
+    assert names(extract_vports.parse_ports(code)) == [('a', 'input'), ('q', 'output')]
+    # Code without a module header is parsed as one body
+    assert names(extract_vports.parse_ports("input x;\ninout y;\n")) == [('x', 'input'), ('y', 'inout')]
+
+def test_tools_see_the_same_ports(tmp_path):
+    path = tmp_path / 'dut.v'
+    path.write_text(SOURCE)
+    code = vlex.from_text(SOURCE).code
+    expected = extract_vports.parse_ports(code)
+
+    modules, _ = portcheck.parse_source(code)
+    checked = [{field: port[field] for field in extract_vports.PORT_FIELDS} for port in modules[0][4]]
+    assert checked == expected
+
+    with vindex.DesignIndex(str(tmp_path / 'index.db')) as index:
+        index.update_file(str(path))
+        assert index.file_ports(str(path)) == expected
+        assert index.module_ports('dut') == expected
+
+def test_batch_reads_corrupt_cache_as_empty(tmp_path):
+    path = tmp_path / 'dut.v'
+    path.write_text(SOURCE)
+    cache_file = tmp_path / 'cache.json'
+    cache_file.write_text('{"truncated": [')
+    output = tmp_path / 'out.json'
+    stats = extract_vports.extract_vports_batch([str(path)], str(output), str(cache_file), jobs=1, output_format='json')
+    assert stats['parsed'] == 1
+    assert names(json.loads(output.read_text())[str(path)]) == names(extract_vports.parse_ports(SOURCE))
+    assert len(json.loads(cache_file.read_text())) == 1
+
+def test_batch_passes_overrides_and_parameters(tmp_path):
+    path = tmp_path / 'dut.v'
+    path.write_text(SOURCE)
+    output = tmp_path / 'out.jsonl'
+    cache_file = str(tmp_path / 'cache.json')
+    extract_vports.extract_vports_batch([str(path)], str(output), cache_file, jobs=1, overrides={'W': '16'},
+                                        with_params=True)
+    record = json.loads(output.read_text())
+    assert record['parameters']['W']['value'] == 16
+    assert record['ports'][0]['width_value'] == 16
+    # Other overrides are not served from the cache
+    stats = extract_vports.extract_vports_batch([str(path)], str(output), cache_file, jobs=1)
+    assert stats['parsed'] == 1
+    assert json.loads(output.read_text())['ports'][0]['width_value'] == 8
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+import fileutil
+
+def test_atomic_write_keeps_permissions(tmp_path):
+    path = tmp_path / 'script.sh'
+    path.write_text('old\n')
+    os.chmod(path, 0o750)
+    fileutil.atomic_write(str(path), 'new\r\n', newline='')
+    assert path.read_bytes() == b'new\r\n'
+    assert os.stat(path).st_mode & 0o7777 == 0o750
+
+def test_new_file_gets_default_permissions(tmp_path):
+    umask = os.umask(0o022)
+    try:
+        fileutil.atomic_write(str(tmp_path / 'out.json'), '{}')
+    finally:
+        os.umask(umask)
+    assert os.stat(tmp_path / 'out.json').st_mode & 0o7777 == 0o644
+
+def test_failed_write_leaves_the_old_file(tmp_path):
+    path = tmp_path / 'out.json'
+    path.write_text('old')
+    with pytest.raises(RuntimeError):
+        with fileutil.atomic_open(str(path)) as f:
+            f.write('partial')
+            raise RuntimeError
+    assert path.read_text() == 'old'
+    assert os.listdir(tmp_path) == ['out.json']
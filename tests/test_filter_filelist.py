@@ -0,0 +1,60 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+import filter_filelist
+
+SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'filter_filelist.py')
+
+def write(path, *lines):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(''.join(line + '\n' for line in lines))
+    return str(path)
+
+def test_includes_are_expanded_and_parsed_once(tmp_path, monkeypatch):
+    common = write(tmp_path / 'ip' / 'common.f', 'a.v', '', '+define+X', 'sub/b.v')
+    top = write(tmp_path / 'top.f', '-F ip/common.f', 'c.v', f'-f {common}', '-F ip/common.f')
+    parsed = []
+    parse = filter_filelist.FilelistReader._parse
+    monkeypatch.setattr(filter_filelist.FilelistReader, '_parse',
+                        staticmethod(lambda path: parsed.append(path) or parse(path)))
+
+    entries = list(filter_filelist.FilelistReader().iter_entries(top))
+    ip = str(tmp_path / 'ip')
+    # -F entries are relative to the included filelist, -f entries are not
+    assert entries == [f'{ip}/a.v', '+define+X', f'{ip}/sub/b.v', 'c.v',
+                       'a.v', '+define+X', 'sub/b.v', f'{ip}/a.v', '+define+X', f'{ip}/sub/b.v']
+    assert parsed == [top, f'{ip}/common.f']
+
+def test_incdir_lists_the_directory(tmp_path):
+    write(tmp_path / 'inc' / 'defs.vh', '')
+    top = write(tmp_path / 'top.f', f'+incdir+{tmp_path}/inc', 'c.v')
+    assert list(filter_filelist.FilelistReader().iter_entries(top)) == [f'{tmp_path}/inc/defs.vh', 'c.v']
+    assert list(filter_filelist.FilelistReader(expand_incdirs=False).iter_entries(top)) == [f'+incdir+{tmp_path}/inc', 'c.v']
+
+def test_recursive_include_is_an_error(tmp_path):
+    top = write(tmp_path / 'top.f', '-F other.f')
+    write(tmp_path / 'other.f', '-F top.f')
+    with pytest.raises(ValueError, match='Recursive filelist include'):
+        list(filter_filelist.FilelistReader().iter_entries(top))
+
+@pytest.mark.parametrize('include, message', [('-F other.f', 'Recursive filelist include'),
+                                              ('-F missing.f', 'No such file or directory')])
+def test_cli_reports_bad_includes(tmp_path, include, message):
+    sublist = write(tmp_path / 'sub.f', 'a.v')
+    superlist = write(tmp_path / 'super.f', include)
+    write(tmp_path / 'other.f', '-F super.f')
+    result = subprocess.run([sys.executable, SCRIPT, '--stream', sublist, superlist,
+                             str(tmp_path / 'out.f')], capture_output=True, text=True)
+    assert result.returncode == 2
+    assert message in result.stderr and 'Traceback' not in result.stderr
+
+def test_streaming_filter_reports_collisions(tmp_path, capsys):
+    sublist = write(tmp_path / 'sub.f', 'x/a.v')
+    superlist = write(tmp_path / 'super.f', 'p/a.v', 'p/b.v', 'q/a.v')
+    output = str(tmp_path / 'out.f')
+    report = filter_filelist.filter_files_streaming([sublist], superlist, [output])
+    assert open(output).read() == 'p/a.v\nq/a.v'
+    assert report == {sublist: {'a.v': ['p/a.v', 'q/a.v']}}
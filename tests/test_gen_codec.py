@@ -0,0 +1,55 @@
+import keyword
+
+from rtl2json import gen_codec
+
+LAYOUT = {
+    'dbg': [
+        {'field': 'in', 'msb': 3, 'lsb': 0},
+        {'field': 'class', 'msb': 7, 'lsb': 4},
+        {'field': 'WIDTH', 'msb': 11, 'lsb': 8},
+        {'field': 'to_int', 'msb': 15, 'lsb': 12},
+        {'field': 'self', 'msb': 19, 'lsb': 16},
+        {'field': 'value', 'msb': 23, 'lsb': 20},
+        {'field': '__init__', 'msb': 27, 'lsb': 24},
+        {'field': 'valid', 'msb': 28, 'lsb': 28},
+    ],
+}
+
+def generated(tmp_path, layout=LAYOUT):
+    path = tmp_path / 'codec.py'
+    path.write_text(gen_codec.generate_module(layout))
+    return gen_codec.load_generated(str(path))
+
+def test_reserved_field_names_get_a_suffix():
+    names = [name for name, _, _, _ in gen_codec.field_table(LAYOUT['dbg'])]
+    assert names == ['in_', 'class_', 'WIDTH_', 'to_int_', 'self_', 'value_', '__init___', 'valid']
+    assert not any(keyword.iskeyword(name) or name in gen_codec.RESERVED_NAMES for name in names)
+
+def test_generated_module_keeps_rtl_names(tmp_path):
+    cls = generated(tmp_path).BUSES['dbg']
+    assert cls.WIDTH == 29
+    assert cls.FIELDS == ('in_', 'class_', 'WIDTH_', 'to_int_', 'self_', 'value_', '__init___', 'valid')
+    assert cls.RTL_FIELDS == tuple(f['field'] for f in LAYOUT['dbg'])
+
+def test_generated_module_round_trips(tmp_path):
+    module = generated(tmp_path)
+    assert gen_codec.verify(module, LAYOUT, samples=200) == []
+    decoded = module.BUSES['dbg'].from_int(0x1_2345_678)
+    assert (decoded.in_, decoded.class_, decoded.__init___, decoded.valid) == (0x8, 0x7, 0x2, 1)
+    assert module.BUSES['dbg'](in_=1, valid=1).to_int() == (1 << 28) | 1
+
+def test_repeated_names_stay_unique():
+    fields = [{'field': 'a', 'msb': 0, 'lsb': 0}, {'field': 'a', 'msb': 1, 'lsb': 1}, {'field': 'a-b', 'msb': 2, 'lsb': 2}]
+    assert [name for name, _, _, _ in gen_codec.field_table(fields)] == ['a', 'a_1', 'a_b']
+
+def test_bus_class_names_stay_unique(tmp_path):
+    fields = [{'field': 'x', 'msb': 3, 'lsb': 0}]
+    buses = ['a_b', 'aB', 'sdp_req_0', 'sdp_req0', 'none', 'true', 'int', 'Exception', 'BUSES', '0x']
+    layout = {bus: fields for bus in buses}
+    assert gen_codec.class_names(buses) == {
+        'a_b': 'AB', 'aB': 'AB_1', 'sdp_req_0': 'SdpReq0', 'sdp_req0': 'SdpReq0_1', 'none': 'None_',
+        'true': 'True_', 'int': 'Int', 'Exception': 'Exception_', 'BUSES': 'BUSES_', '0x': 'Bus0x',
+    }
+    module = generated(tmp_path, layout)
+    assert [cls.BUS for cls in module.BUSES.values()] == buses
+    assert gen_codec.verify(module, layout, samples=20) == []
@@ -0,0 +1,52 @@
+import patch
+
+TEXT = ''.join(f"line{n}\n" for n in range(1, 6))
+
+def write_diff(tmp_path, body):
+    change_file = tmp_path / 'change.diff'
+    change_file.write_text('--- a.v\n+++ a.v\n' + body)
+    return patch.parse_change_file(str(change_file))
+
+def test_zero_context_insertion_goes_after_old_start(tmp_path):
+    # diff -U0 writes "-3,0": insert after line 3
+    hunks = write_diff(tmp_path, '@@ -3,0 +4,2 @@\n+new1\n+new2\n')
+    assert patch.apply_hunks(TEXT, hunks) == 'line1\nline2\nline3\nnew1\nnew2\nline4\nline5\n'
+
+def test_zero_context_insertion_at_top_of_file(tmp_path):
+    hunks = write_diff(tmp_path, '@@ -0,0 +1 @@\n+first\n')
+    assert patch.apply_hunks(TEXT, hunks) == 'first\n' + TEXT
+
+def test_zero_context_insertion_at_end_of_file(tmp_path):
+    hunks = write_diff(tmp_path, '@@ -5,0 +6 @@\n+last\n')
+    assert patch.apply_hunks(TEXT, hunks) == TEXT + 'last\n'
+
+def test_zero_context_hunks_track_earlier_shifts(tmp_path):
+    hunks = write_diff(tmp_path, '@@ -1 +0,0 @@\n-line1\n@@ -3,0 +3 @@\n+new\n')
+    assert patch.apply_hunks(TEXT, hunks) == 'line2\nline3\nnew\nline4\nline5\n'
+
+def test_zero_context_insertion_past_end_does_not_apply(tmp_path):
+    hunks = write_diff(tmp_path, '@@ -9,0 +10 @@\n+late\n')
+    assert patch.apply_hunks(TEXT, hunks) is None
+
+def test_context_hunk_is_found_at_an_offset(tmp_path):
+    hunks = write_diff(tmp_path, '@@ -1,2 +1,2 @@\n line3\n-line4\n+LINE4\n')
+    assert patch.apply_hunks(TEXT, hunks) == 'line1\nline2\nline3\nLINE4\nline5\n'
+
+def test_control_characters_and_mixed_endings_survive(tmp_path):
+    # A form feed, UTF-8 "Å" (C3 85, 0x85 being NEL in latin-1) and a mix of
+    # LF and CRLF lines must come back byte for byte
+    source = tmp_path / 'a.v'
+    source.write_bytes(b'// \xc3\x85ngstr\xc3\xb6m\n\x0c\r\nwire a;\r\nwire b;\nwire c;\r\n')
+    change_file = tmp_path / 'change.diff'
+    change_file.write_bytes(b'--- a.v\n+++ a.v\n@@ -3,2 +3,3 @@\n wire a;\n+wire \xc3\x85;\n wire b;\n')
+    hunks = patch.parse_change_file(str(change_file))
+    assert patch.patch_file(str(source), hunks, change_file.read_bytes()) == 'in-process'
+    assert source.read_bytes() == b'// \xc3\x85ngstr\xc3\xb6m\n\x0c\r\nwire a;\r\nwire \xc3\x85;\r\nwire b;\nwire c;\r\n'
+
+def test_crlf_diff_applies_to_lf_file(tmp_path):
+    hunks = write_diff(tmp_path, '@@ -2,1 +2,1 @@\r\n-line2\r\n+LINE2\r\n')
+    assert patch.apply_hunks(TEXT, hunks) == 'line1\nLINE2\nline3\nline4\nline5\n'
+
+def test_missing_newline_at_end_is_kept(tmp_path):
+    hunks = write_diff(tmp_path, '@@ -5 +5 @@\n-line5\n+LAST\n\\ No newline at end of file\n')
+    assert patch.apply_hunks(TEXT.replace('\n', '\r\n'), hunks) == TEXT.replace('\n', '\r\n')[:-7] + 'LAST'
@@ -0,0 +1,27 @@
+import json
+
+from rtl2json import rtl2json
+
+RTL = """module dbg;
+  // Begin of Debug Bus
+  assign dbg_bus = {
+    fifo_full,  // [3:3]
+    state       // [2:0]
+  };
+  // End of Debug Bus
+endmodule
+"""
+
+def test_batch_converts_again_after_corrupt_manifest(tmp_path):
+    source = tmp_path / 'dbg.v'
+    source.write_text(RTL)
+    output_dir = tmp_path / 'out'
+    assert rtl2json.rtl2json_batch([str(source)], str(output_dir), jobs=1)['converted'] == 1
+    assert rtl2json.rtl2json_batch([str(source)], str(output_dir), jobs=1)['converted'] == 0
+
+    manifest = output_dir / rtl2json.MANIFEST_NAME
+    manifest.write_text(manifest.read_text()[:5])
+    assert rtl2json.rtl2json_batch([str(source)], str(output_dir), jobs=1)['converted'] == 1
+    assert list(json.loads(manifest.read_text())) == [str(source)]
+    single = rtl2json.rtl2json(str(source), json_file=str(tmp_path / 'single.json'))
+    assert json.loads((output_dir / 'dbg.json').read_text()) == single
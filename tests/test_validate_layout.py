@@ -0,0 +1,15 @@
+from rtl2json import validate_layout
+
+FIELDS = [{'field': 'a', 'msb': 3, 'lsb': 0}, {'field': 'b', 'msb': 7, 'lsb': 4}]
+
+def kinds(issues):
+    return [issue['type'] for issue in issues]
+
+def test_exact_width_is_clean():
+    assert validate_layout.check_bus('bus', FIELDS, 8) == []
+
+def test_uncovered_top_bits_are_one_hole():
+    assert validate_layout.check_bus('bus', FIELDS, 12) == [{'bus': 'bus', 'type': 'hole', 'msb': 11, 'lsb': 8}]
+
+def test_fields_past_the_declared_width():
+    assert kinds(validate_layout.check_bus('bus', FIELDS, 6)) == ['out_of_range', 'width_mismatch']
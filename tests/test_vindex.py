@@ -0,0 +1,94 @@
+import os
+
+import pytest
+
+import vindex
+
+TOP = """module top(input clk);
+  mid u_mid(.clk(clk));
+  leaf #(.W(4)) u_leaf0 (.a(clk));
+endmodule
+"""
+MID = """module mid(input clk);
+  // leaf u_commented(.a(clk));
+  leaf u_leaf(.a(clk));
+endmodule
+"""
+LEAF = """module leaf #(parameter W = 8) (
+  input [W-1:0] a
+);
+endmodule
+"""
+
+def write(path, text, mtime_ns=None):
+    path.write_text(text)
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+    return str(path)
+
+def rows(index, path):
+    # Every parsed row that belongs to one file
+    return {table: sorted(index.conn.execute(f'SELECT * FROM {table} WHERE path = ?', (path,)).fetchall(), key=repr)
+            for table in vindex.PARSED_TABLES}
+
+def make_tree(tmp_path):
+    src = tmp_path / 'src'
+    src.mkdir()
+    paths = {name: write(src / f'{name}.v', text, 1_000_000_000)
+             for name, text in (('top', TOP), ('mid', MID), ('leaf', LEAF))}
+    return str(src), paths
+
+@pytest.fixture
+def design(tmp_path):
+    src, paths = make_tree(tmp_path)
+    with vindex.DesignIndex(str(tmp_path / 'index.db')) as index:
+        assert index.update(src) == (3, 3, 0)
+        yield index, tmp_path / 'src', paths
+
+def test_queries(design):
+    index, src, paths = design
+    assert index.module_definitions('leaf') == [(paths['leaf'], 1)]
+    assert index.find_instances('leaf') == [('u_leaf', 'mid', paths['mid'], 3), ('u_leaf0', 'top', paths['top'], 3)]
+    assert index.users('leaf') == ['mid', 'top']
+    assert index.hierarchy('top') == {'module': 'top', 'children': {
+        'u_leaf0': {'module': 'leaf', 'children': {}},
+        'u_mid': {'module': 'mid', 'children': {'u_leaf': {'module': 'leaf', 'children': {}}}},
+    }}
+    assert [(p['name'], p['msb'], p['direction']) for p in index.module_ports('leaf')] == [('a', 'W-1', 'input')]
+    assert [p.name for p in index.file_parameters(paths['leaf'])] == ['W']
+
+def test_refresh_reparses_only_the_changed_file(design):
+    index, src, paths = design
+    before = {name: rows(index, path) for name, path in paths.items()}
+
+    write(src / 'leaf.v', LEAF.replace('  input [W-1:0] a\n', '  input [W-1:0] a,\n  output b\n'), 2_000_000_000)
+    assert index.update(str(src)) == (3, 1, 0)
+
+    after = {name: rows(index, path) for name, path in paths.items()}
+    assert after['top'] == before['top'] and after['mid'] == before['mid']
+    assert after['leaf']['ports'] != before['leaf']['ports']
+    assert [p['name'] for p in index.module_ports('leaf')] == ['a', 'b']
+
+def test_touched_file_is_not_reparsed(design):
+    index, src, paths = design
+    os.utime(paths['mid'], ns=(3_000_000_000, 3_000_000_000))
+    assert index.update(str(src)) == (3, 0, 0)
+    assert index.conn.execute('SELECT mtime_ns FROM files WHERE path = ?', (paths['mid'],)).fetchone() == (3_000_000_000,)
+
+def test_removed_file_is_pruned(design):
+    index, src, paths = design
+    os.unlink(paths['mid'])
+    assert index.update(str(src)) == (2, 0, 1)
+    assert index.find_instances('leaf') == [('u_leaf0', 'top', paths['top'], 3)]
+    assert rows(index, paths['mid']) == {table: [] for table in vindex.PARSED_TABLES}
+
+def test_index_persists_and_is_rebuilt_for_other_defines(tmp_path):
+    src, paths = make_tree(tmp_path)
+    db = str(tmp_path / 'index.db')
+    with vindex.DesignIndex(db) as index:
+        assert index.update(src) == (3, 3, 0)
+    with vindex.DesignIndex(db) as index:
+        assert index.update(src) == (3, 0, 0)
+        assert index.users('leaf') == ['mid', 'top']
+    with vindex.DesignIndex(db, {'FOO': ''}) as index:
+        assert index.update(src) == (3, 3, 0)
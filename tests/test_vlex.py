@@ -0,0 +1,57 @@
+import pytest
+
+import vlex
+
+SOURCE = (
+    "module top; // header\r\n"
+    "`ifdef FOO\n"
+    "  wire a; /* spans\n"
+    "  lines */ wire b;\n"
+    "`else\n"
+    "  wire c;\n"
+    "`endif\n"
+    "endmodule /* last */"
+)
+
+@pytest.mark.parametrize('defines', [None, {}, {'FOO': ''}])
+@pytest.mark.parametrize('comments', [False, True])
+def test_iter_lines_matches_whole_file_view(tmp_path, defines, comments):
+    path = tmp_path / 'top.v'
+    path.write_bytes(SOURCE.encode('latin-1'))
+    expected = list(vlex.load(str(path), defines, cache=False).lines(comments))
+    assert list(vlex.lex_lines(vlex.read_lines(str(path)), defines, comments)) == expected
+    assert list(vlex.iter_lines(str(path), defines, comments)) == expected
+
+def test_ifdef_selects_branch(tmp_path):
+    path = tmp_path / 'top.v'
+    path.write_bytes(SOURCE.encode('latin-1'))
+    with_foo = '\n'.join(vlex.iter_lines(str(path), {'FOO': ''}))
+    without_foo = '\n'.join(vlex.iter_lines(str(path), {}))
+    assert 'wire a' in with_foo and 'wire c' not in with_foo
+    assert 'wire c' in without_foo and 'wire a' not in without_foo
+    assert 'spans' not in with_foo
+
+def test_statements_join_multi_line_code(tmp_path):
+    path = tmp_path / 'ports.v'
+    path.write_text("module m(\n  input [3:0] a, // data\n  output b\n);\n  assign b =\n    a[0];\nendmodule\n")
+    statements = list(vlex.iter_statements(str(path)))
+    assert statements == [
+        vlex.Statement(1, 'module m ( input [ 3 : 0 ] a , output b ) ;'),
+        vlex.Statement(5, 'assign b = a [ 0 ] ;'),
+        vlex.Statement(7, 'endmodule'),
+    ]
+    assert list(vlex.load(str(path)).statements()) == statements
+    assert vlex.Token('number', "4'hF", 1) in list(vlex.tokenize(["x = 4'hF;"]))
+
+def test_small_files_are_lexed_once_per_process(tmp_path, monkeypatch):
+    path = tmp_path / 'top.v'
+    path.write_bytes(SOURCE.encode('latin-1'))
+    reads = []
+    read_text = vlex.read_text
+    monkeypatch.setattr(vlex, 'read_text', lambda p: reads.append(p) or read_text(p))
+    lines = list(vlex.iter_lines(str(path), {'FOO': ''}))
+    source = vlex.load(str(path), {'FOO': ''})
+    assert vlex.load(str(path), {'FOO': ''}) is source
+    assert list(source.lines()) == lines
+    assert list(vlex.iter_lines(str(path), {'FOO': ''}, comments=True)) == list(source.lines(comments=True))
+    assert len(reads) == 1
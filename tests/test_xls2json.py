@@ -0,0 +1,40 @@
+import os
+import json
+
+import pandas as pd
+import pytest
+
+import xls2json
+
+def test_queue_field_comments_are_utf8(tmp_path):
+    path = tmp_path / 'q.sv'
+    path.write_text("assign rdQNewLatency = 0; // delay in µs\n", encoding='utf-8')
+    assert xls2json.extract_queue_fields(str(path)) == {'RD': [{'field': 'LATENCY', 'comment': 'delay in µs'}]}
+
+WORKBOOK = {'rd_q': ['Latency', 'Size'], 'wr_q': ['Addr']}
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / 'spec' / 'queues.xlsx'
+    path.parent.mkdir()
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for sheet, fields in WORKBOOK.items():
+            pd.DataFrame({'Field': fields, 'Comment': [f'{f} comment' for f in fields]}).to_excel(writer, sheet_name=sheet, index=False)
+    return str(path)
+
+def test_corrupt_cache_is_a_miss(workbook, tmp_path):
+    expected = xls2json._parse_workbook_fast(workbook)
+    cache_dir = str(tmp_path / 'cache')
+    assert xls2json.read_queue_fields_fast(workbook, cache_dir) == expected
+    cache_file = tmp_path / 'cache' / '.queues.xlsx.cache.json'
+    for corrupt in ('{"mtime_ns": 1, "si', '[]', '{}'):
+        cache_file.write_text(corrupt)
+        assert xls2json.read_queue_fields_fast(workbook, cache_dir) == expected
+        assert json.loads(cache_file.read_text())['data'] == expected
+
+def test_cache_write_failure_is_not_fatal(workbook, monkeypatch):
+    def read_only(*args, **kwargs):
+        raise PermissionError(13, 'Permission denied', args[0])
+    monkeypatch.setattr(xls2json.fileutil, 'atomic_open', read_only)
+    assert xls2json.read_queue_fields_fast(workbook) == xls2json._parse_workbook_fast(workbook)
+    assert os.listdir(os.path.dirname(workbook)) == ['queues.xlsx']
@@ -0,0 +1,370 @@
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# Constant-expression support for port widths. Expressions such as
+# "WIDTH-1", "`ADDR_W+2" or "$clog2(DEPTH)-1" are parsed once into a small
+# tuple AST (cached by text), and evaluated against a module's parameters and
+# `defines by a WidthResolver, which memoizes every value it works out. No
+# Python eval is involved; anything outside the supported operators, or any
+# name that cannot be resolved, evaluates to None.
+
+Parameter = namedtuple('Parameter', 'offset kind name expr')
+
+PARAMETER_PATTERN = re.compile(r'\b(parameter|localparam)\b')
+ASSIGNMENT_PATTERN = re.compile(
+    r'^\s*(?:(?:parameter|localparam)\s+)?'
+    r'(?:(?:integer|int|logic|bit|reg|signed|unsigned|longint|shortint|byte)\s+)*'
+    r'(?:\[[^\]]*\]\s*)*(\w+)\s*(?:\[[^\]]*\]\s*)*=\s*(.+?)\s*$', re.DOTALL)
+DEFINE_PATTERN = re.compile(r'^[ \t]*`define[ \t]+(\w+)(?![\w(])[ \t]*(.*?)[ \t]*$', re.MULTILINE)
+
+TOKEN_PATTERN = re.compile(r'''\s*(?:
+    (?P<number>(?:\d[\d_]*)?\s*'[sS]?[bBoOdDhH]\s*[0-9a-fA-F_xXzZ?]+|\d[\d_]*)
+  | (?P<name>`?[A-Za-z_][\w$]*|\$[A-Za-z_]\w*)
+  | (?P<op>\*\*|<<<|>>>|<<|>>|<=|>=|===|!==|==|!=|&&|\|\||~\^|\^~|~&|~\||[-+*/%()?:<>&|^~!,])
+)''', re.VERBOSE)
+
+BASES = {'b': 2, 'o': 8, 'd': 10, 'h': 16}
+# Largest shift or exponent evaluated, to keep bad input from building huge ints
+MAX_SHIFT = 4096
+
+# Binary operators by precedence, lowest first (Verilog order)
+BINARY_PRECEDENCE = {
+    '||': 1, '&&': 2, '|': 3, '^': 4, '~^': 4, '^~': 4, '&': 5,
+    '==': 6, '!=': 6, '===': 6, '!==': 6,
+    '<': 7, '<=': 7, '>': 7, '>=': 7,
+    '<<': 8, '>>': 8, '<<<': 8, '>>>': 8,
+    '+': 9, '-': 9, '*': 10, '/': 10, '%': 10, '**': 11,
+}
+
+class ExpressionError(ValueError):
+    pass
+
+class Unresolved(LookupError):
+    pass
+
+def _number(text):
+    text = text.replace('_', '').replace(' ', '')
+    if "'" not in text:
+        return int(text)
+    _, _, based = text.partition("'")
+    based = based.lstrip('sS')
+    digits = based[1:]
+    if re.search(r'[xXzZ?]', digits):
+        raise ExpressionError(f"x/z digits in {text}")
+    return int(digits, BASES[based[0].lower()])
+
+def _tokenize(text):
+    tokens, pos = [], 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = TOKEN_PATTERN.match(text, pos)
+        if not match or match.end() == pos:
+            raise ExpressionError(f"Unexpected text in expression: {text[pos:]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        tokens.append((kind, match.group(kind)))
+    return tokens
+
+class _Parser:
+    # Precedence climbing over the token list; builds tuples:
+    # ('num', v) ('name', n) ('unary', op, a) ('binary', op, a, b)
+    # ('cond', c, a, b) ('call', function, [args])
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, text = self.peek()
+        if kind is None or (value is not None and text != value):
+            raise ExpressionError(f"Expected {value or 'more input'}, found {text!r}")
+        self.pos += 1
+        return kind, text
+
+    def parse(self):
+        node = self.conditional()
+        if self.pos != len(self.tokens):
+            raise ExpressionError(f"Unexpected {self.peek()[1]!r}")
+        return node
+
+    def conditional(self):
+        node = self.binary(1)
+        if self.peek() == ('op', '?'):
+            self.take('?')
+            if_true = self.conditional()
+            self.take(':')
+            return ('cond', node, if_true, self.conditional())
+        return node
+
+    def binary(self, min_precedence):
+        node = self.unary()
+        while True:
+            kind, text = self.peek()
+            precedence = BINARY_PRECEDENCE.get(text) if kind == 'op' else None
+            if precedence is None or precedence < min_precedence:
+                return node
+            self.take()
+            # ** is right-associative, everything else left
+            node = ('binary', text, node, self.binary(precedence if text == '**' else precedence + 1))
+
+    def unary(self):
+        kind, text = self.peek()
+        if kind == 'op' and text in ('+', '-', '!', '~', '&', '|', '^', '~&', '~|', '~^', '^~'):
+            self.take()
+            return ('unary', text, self.unary())
+        return self.primary()
+
+    def primary(self):
+        kind, text = self.take()
+        if kind == 'number':
+            return ('num', _number(text))
+        if kind == 'name' and text[0] == '$':
+            self.take('(')
+            args = [self.conditional()]
+            while self.peek() == ('op', ','):
+                self.take(',')
+                args.append(self.conditional())
+            self.take(')')
+            return ('call', text, args)
+        if kind == 'name':
+            return ('name', text)
+        if text == '(':
+            node = self.conditional()
+            self.take(')')
+            return node
+        raise ExpressionError(f"Unexpected {text!r}")
+
+@lru_cache(maxsize=8192)
+def compile_expression(text):
+    """Parse text into an expression tree, or None if it is not a supported constant expression."""
+    try:
+        return _Parser(_tokenize(text)).parse()
+    except (ExpressionError, ValueError, KeyError):
+        return None
+
+def _clog2(value):
+    return max(value - 1, 0).bit_length()
+
+def _trunc_div(a, b):
+    # Verilog integer division and modulo truncate towards zero
+    quotient = abs(a) // abs(b)
+    return quotient if (a >= 0) == (b >= 0) else -quotient
+
+def _reduce(op, value):
+    # Unary reduction over the value's own bits (the operand width is unknown)
+    if value < 0:
+        raise Unresolved("reduction of a negative value")
+    bits = bin(value).count('1')
+    width = max(value.bit_length(), 1)
+    return {'&': int(bits == width), '|': int(bits > 0), '^': bits & 1,
+            '~&': int(bits != width), '~|': int(bits == 0), '~^': 1 - (bits & 1), '^~': 1 - (bits & 1)}[op]
+
+BINARY_OPERATORS = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': _trunc_div,
+    '%': lambda a, b: a - _trunc_div(a, b) * b,
+    '**': lambda a, b: a ** b if b >= 0 else 0,
+    '<<': lambda a, b: a << b,
+    '<<<': lambda a, b: a << b,
+    '>>': lambda a, b: a >> b,
+    '>>>': lambda a, b: a >> b,
+    '&': lambda a, b: a & b,
+    '|': lambda a, b: a | b,
+    '^': lambda a, b: a ^ b,
+    '~^': lambda a, b: ~(a ^ b),
+    '^~': lambda a, b: ~(a ^ b),
+    '<': lambda a, b: int(a < b),
+    '<=': lambda a, b: int(a <= b),
+    '>': lambda a, b: int(a > b),
+    '>=': lambda a, b: int(a >= b),
+    '==': lambda a, b: int(a == b),
+    '!=': lambda a, b: int(a != b),
+    '===': lambda a, b: int(a == b),
+    '!==': lambda a, b: int(a != b),
+}
+
+def evaluate(node, lookup):
+    """Evaluate an expression tree; lookup(name) returns an int or raises Unresolved."""
+    kind = node[0]
+    if kind == 'num':
+        return node[1]
+    if kind == 'name':
+        return lookup(node[1])
+    if kind == 'unary':
+        op, value = node[1], evaluate(node[2], lookup)
+        if op == '-':
+            return -value
+        if op == '+':
+            return value
+        if op == '!':
+            return int(not value)
+        if op == '~':
+            return ~value
+        return _reduce(op, value)
+    if kind == 'binary':
+        op = node[1]
+        left = evaluate(node[2], lookup)
+        # Short-circuit like Verilog so an unused branch may stay unresolved
+        if op == '&&':
+            return int(bool(left) and bool(evaluate(node[3], lookup)))
+        if op == '||':
+            return int(bool(left) or bool(evaluate(node[3], lookup)))
+        right = evaluate(node[3], lookup)
+        if op in ('/', '%') and right == 0:
+            raise Unresolved("division by zero")
+        if op in ('<<', '<<<', '**') and right > MAX_SHIFT:
+            raise Unresolved(f"{op} {right} is out of range")
+        return BINARY_OPERATORS[op](left, right)
+    if kind == 'cond':
+        return evaluate(node[2] if evaluate(node[1], lookup) else node[3], lookup)
+    if kind == 'call':
+        function, args = node[1], [evaluate(arg, lookup) for arg in node[2]]
+        if function == '$clog2' and len(args) == 1:
+            return _clog2(args[0])
+        raise Unresolved(f"unsupported function {function}")
+    raise Unresolved(f"unsupported expression {kind}")
+
+def _statement_end(code, pos):
+    # End of a parameter declaration list: ';' or the ')' closing a #( list
+    depth = 0
+    for index in range(pos, len(code)):
+        char = code[index]
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            if depth == 0:
+                return index
+            depth -= 1
+        elif char == ';' and depth == 0:
+            return index
+    return len(code)
+
+def _split_top_level(text):
+    parts, depth, start = [], 0, 0
+    for index, char in enumerate(text):
+        if char in '([{':
+            depth += 1
+        elif char in ')]}':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append((start, text[start:index]))
+            start = index + 1
+    parts.append((start, text[start:]))
+    return parts
+
+def parse_parameters(code):
+    """Return [Parameter(offset, kind, name, expr)] for parameter/localparam declarations in comment-free code.
+
+    Handles body declarations ("parameter A = 1, B = A*2;") and ANSI header
+    lists ("#(parameter A = 1, B = 2)"); a name without its own keyword takes
+    the kind of the one before it.
+    """
+    parameters = []
+    if 'parameter' not in code and 'localparam' not in code:
+        return parameters
+    pos = 0
+    while True:
+        match = PARAMETER_PATTERN.search(code, pos)
+        if not match:
+            return parameters
+        end = _statement_end(code, match.end())
+        kind = match.group(1)
+        for offset, part in _split_top_level(code[match.end():end]):
+            keyword = PARAMETER_PATTERN.match(part.strip())
+            if keyword:
+                kind = keyword.group(1)
+            assignment = ASSIGNMENT_PATTERN.match(part)
+            if assignment:
+                parameters.append(Parameter(match.end() + offset, kind, assignment.group(1),
+                                            ' '.join(assignment.group(2).split())))
+        pos = end
+
+def parse_defines(code):
+    """Return {name: text} for the object-like `define lines in code."""
+    return {name: value.rstrip('\\').strip() for name, value in DEFINE_PATTERN.findall(code)}
+
+class WidthResolver:
+    """Resolves expressions against one scope's parameters and `defines.
+
+    parameters is a list of Parameter (or (name, expr) pairs); overrides maps
+    parameter names to ints or expression text and replaces the declared
+    value of a parameter (never of a localparam), as an instance's #(...)
+    does. Resolvers for different override sets share the parsed expressions
+    and are cached by for_overrides().
+    """
+
+    def __init__(self, parameters=(), defines=None, overrides=None):
+        self.expressions = {}
+        self.kinds = {}
+        for parameter in parameters:
+            if isinstance(parameter, Parameter):
+                kind, name, expr = parameter.kind, parameter.name, parameter.expr
+            else:
+                kind, (name, expr) = 'parameter', parameter
+            self.expressions[name] = expr
+            self.kinds[name] = kind
+        self.defines = dict(defines or {})
+        self.overrides = dict(overrides or {})
+        for name, value in self.overrides.items():
+            if self.kinds.get(name) != 'localparam':
+                self.expressions[name] = str(value)
+        self.values = {}
+        self.results = {}
+        self._resolving = set()
+        self._variants = {}
+
+    def for_overrides(self, overrides):
+        """A resolver for the same scope with instance parameter overrides (memoized)."""
+        if not overrides:
+            return self
+        key = tuple(sorted((name, str(value)) for name, value in overrides.items()))
+        variant = self._variants.get(key)
+        if variant is None:
+            base = [Parameter(None, self.kinds[name], name, expr) for name, expr in self.expressions.items()]
+            variant = self._variants[key] = WidthResolver(base, self.defines, dict(self.overrides, **overrides))
+        return variant
+
+    def _lookup(self, name):
+        if name in self.values:
+            return self.values[name]
+        if name in self._resolving:
+            raise Unresolved(f"circular definition of {name}")
+        if name[0] == '`':
+            text = self.defines.get(name[1:])
+        else:
+            text = self.expressions.get(name)
+        if text is None:
+            raise Unresolved(name)
+        node = compile_expression(text)
+        if node is None:
+            raise Unresolved(name)
+        self._resolving.add(name)
+        try:
+            value = evaluate(node, self._lookup)
+        finally:
+            self._resolving.discard(name)
+        self.values[name] = value
+        return value
+
+    def value(self, text):
+        """Integer value of an expression, or None when it cannot be resolved."""
+        if text in self.results:
+            return self.results[text]
+        node = compile_expression(text)
+        result = None
+        if node is not None:
+            try:
+                result = evaluate(node, self._lookup)
+            except (Unresolved, ArithmeticError, ValueError):
+                result = None
+        self.results[text] = result
+        return result
+
+    def parameter_values(self):
+        return {name: self.value(name) for name in self.expressions}
@@ -0,0 +1,355 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import argparse
+
+import vlex
+import vexpr
+import instrument
+from extract_vports import PORTS_FORMAT, PORT_FIELDS, module_spans, iter_module_ports
+
+# Persistent design index of module definitions, instantiations and ports.
+# Every file is keyed by (path, mtime, size, sha1) so an update only reparses
+# the files whose contents actually changed since the last run. Parameters and
+# `defines are stored too, so port widths can be resolved from the index alone.
+
+# Bumped when the tables change, so indexes written by older versions are rebuilt
+INDEX_FORMAT = 2
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha1 TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS modules (
+    name TEXT NOT NULL,
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS instances (
+    module TEXT NOT NULL,
+    instance TEXT NOT NULL,
+    parent TEXT,
+    path TEXT NOT NULL,
+    line INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ports (
+    module TEXT,
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    direction TEXT NOT NULL,
+    type TEXT NOT NULL,
+    msb TEXT NOT NULL,
+    lsb TEXT NOT NULL,
+    width TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS parameters (
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    expr TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS defines (
+    path TEXT NOT NULL,
+    name TEXT NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS modules_name ON modules(name);
+CREATE INDEX IF NOT EXISTS modules_path ON modules(path);
+CREATE INDEX IF NOT EXISTS instances_module ON instances(module);
+CREATE INDEX IF NOT EXISTS instances_parent ON instances(parent);
+CREATE INDEX IF NOT EXISTS instances_path ON instances(path);
+CREATE INDEX IF NOT EXISTS ports_module ON ports(module);
+CREATE INDEX IF NOT EXISTS ports_path ON ports(path);
+CREATE INDEX IF NOT EXISTS parameters_path ON parameters(path);
+CREATE INDEX IF NOT EXISTS defines_path ON defines(path);
+'''
+
+VERILOG_EXTENSIONS = ('.v', '.sv')
+
+# <module> [#(...)] <instance> [array range] (
+INSTANCE_PATTERN = re.compile(
+    r'(?<![\w$.`])(\w+)(?:\s*#\s*\((?:[^()]|\((?:[^()]|\([^()]*\))*\))*\)\s*|\s+)(\w+)\s*(?:\[[^\]]*\]\s*)?\(')
+
+# Words that can precede an identifier and '(' without being an instantiation
+KEYWORDS = {
+    'module', 'macromodule', 'function', 'task', 'if', 'else', 'for', 'while',
+    'case', 'casex', 'casez', 'begin', 'end', 'assign', 'always', 'always_comb',
+    'always_ff', 'always_latch', 'initial', 'return', 'wire', 'reg', 'logic',
+    'input', 'output', 'inout', 'parameter', 'localparam', 'generate', 'posedge',
+    'negedge', 'or', 'and', 'not', 'new', 'import', 'export', 'package', 'class',
+    'interface', 'program', 'property', 'sequence', 'assert', 'cover', 'assume',
+    'default', 'typedef', 'int', 'integer', 'bit', 'byte', 'void', 'automatic',
+    'static', 'virtual', 'extern', 'forever', 'repeat', 'foreach', 'do', 'disable',
+    'wait', 'fork', 'join', 'signed', 'unsigned', 'genvar', 'struct', 'union', 'enum',
+}
+
+def parse_design(content, defines=None):
+    """Return (modules, instances, ports, parameters, defines) found in Verilog source text."""
+    # Comments and `ifdef'd-out code are blanked in place, so offsets and
+    # line numbers still match the file
+    code = vlex.from_text(content, defines=defines).code
+    line_starts = [0] + [m.end() for m in re.finditer('\n', code)]
+
+    def line_of(offset):
+        # Binary search the line start table
+        lo, hi = 0, len(line_starts) - 1
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if line_starts[mid] <= offset:
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo + 1
+
+    # Module spans: from each `module` header to the next `endmodule`
+    modules, spans = [], []
+    for match, end in module_spans(code):
+        modules.append((match.group(1), line_of(match.start(1))))
+        spans.append((match.start(), end, match.group(1)))
+
+    def module_at(offset):
+        for start, end, name in spans:
+            if start <= offset < end:
+                return name
+        return None
+
+    instances = []
+    for match in INSTANCE_PATTERN.finditer(code):
+        module, instance = match.group(1), match.group(2)
+        if module in KEYWORDS or instance in KEYWORDS or module[0].isdigit():
+            continue
+        parent = module_at(match.start())
+        # Instantiations only live inside a module body
+        if parent is None:
+            continue
+        instances.append((module, instance, parent, line_of(match.start(1))))
+
+    ports = [(module, position, port) for position, (module, port) in enumerate(iter_module_ports(code))]
+
+    return modules, instances, ports, vexpr.parse_parameters(code), vexpr.parse_defines(code)
+
+def walk_sources(search_dirs, exclude_dirs=(), extensions=VERILOG_EXTENSIONS):
+    exclude_dirs = set(exclude_dirs)
+    for search_dir in search_dirs:
+        for root, dirs, files in os.walk(search_dir, followlinks=True):
+            dirs[:] = [d for d in dirs if os.path.join(root, d) not in exclude_dirs]
+            for file in files:
+                if file.endswith(extensions):
+                    instrument.count('files_walked')
+                    yield os.path.join(root, file)
+
+PARSED_TABLES = ('modules', 'instances', 'ports', 'parameters', 'defines')
+
+class DesignIndex:
+    def __init__(self, db_path, defines=None):
+        self.db_path = db_path
+        self.defines = defines
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+        # Parse results depend on the defines and the table formats; start over when they change
+        key = json.dumps([PORTS_FORMAT, INDEX_FORMAT, None if defines is None else sorted(defines.items())])
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'defines'").fetchone()
+        if row is None or row[0] != key:
+            for table in ('files',) + PARSED_TABLES:
+                self.conn.execute(f'DELETE FROM {table}')
+            self.conn.execute("INSERT OR REPLACE INTO meta VALUES ('defines', ?)", (key,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    # ------------------------------------------------------------------ update
+
+    def _forget(self, path):
+        for table in PARSED_TABLES:
+            self.conn.execute(f'DELETE FROM {table} WHERE path = ?', (path,))
+
+    def update_file(self, file_path):
+        """Reparse file_path if its mtime/size/hash changed. Returns True if reparsed."""
+        path = os.path.abspath(file_path)
+        st = os.stat(path)
+        row = self.conn.execute('SELECT mtime_ns, size, sha1 FROM files WHERE path = ?', (path,)).fetchone()
+        if row and row[0] == st.st_mtime_ns and row[1] == st.st_size:
+            return False
+
+        with open(path, 'rb') as f:
+            data = f.read()
+        instrument.count('files_read')
+        instrument.count('bytes_read', len(data))
+        sha1 = hashlib.sha1(data).hexdigest()
+        if row and row[2] == sha1:
+            # Touched but unchanged: refresh the stat key only
+            self.conn.execute('UPDATE files SET mtime_ns = ?, size = ? WHERE path = ?', (st.st_mtime_ns, st.st_size, path))
+            return False
+
+        modules, instances, ports, parameters, defines = parse_design(data.decode('latin-1'), self.defines)
+        self._forget(path)
+        self.conn.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', (path, st.st_mtime_ns, st.st_size, sha1))
+        self.conn.executemany('INSERT INTO modules VALUES (?, ?, ?)', [(name, path, line) for name, line in modules])
+        self.conn.executemany('INSERT INTO instances VALUES (?, ?, ?, ?, ?)',
+                              [(module, instance, parent, path, line) for module, instance, parent, line in instances])
+        self.conn.executemany('INSERT INTO ports VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                              [(module, path, position, p['name'], p['direction'], p['type'], p['msb'], p['lsb'], p['width'])
+                               for module, position, p in ports])
+        self.conn.executemany('INSERT INTO parameters VALUES (?, ?, ?, ?, ?)',
+                              [(path, position, p.kind, p.name, p.expr) for position, p in enumerate(parameters)])
+        self.conn.executemany('INSERT INTO defines VALUES (?, ?, ?)',
+                              [(path, name, value) for name, value in defines.items()])
+        return True
+
+    def update(self, search_dirs, exclude_dirs=(), extensions=VERILOG_EXTENSIONS, prune=True):
+        """Bring the index up to date with the tree. Returns (seen, reparsed, removed)."""
+        if isinstance(search_dirs, str):
+            search_dirs = [search_dirs]
+        seen, reparsed = set(), 0
+        for file_path in walk_sources(search_dirs, exclude_dirs, extensions):
+            seen.add(os.path.abspath(file_path))
+            if self.update_file(file_path):
+                reparsed += 1
+
+        removed = 0
+        if prune:
+            # Drop files under the searched roots that no longer exist
+            roots = [os.path.join(os.path.abspath(d), '') for d in search_dirs]
+            for (path,) in self.conn.execute('SELECT path FROM files').fetchall():
+                if path not in seen and path.endswith(extensions) and any(path.startswith(root) for root in roots):
+                    self._forget(path)
+                    self.conn.execute('DELETE FROM files WHERE path = ?', (path,))
+                    removed += 1
+        self.conn.commit()
+        instrument.count('files_reparsed', reparsed)
+        return len(seen), reparsed, removed
+
+    # ----------------------------------------------------------------- queries
+
+    def module_definitions(self, module):
+        return self.conn.execute('SELECT path, line FROM modules WHERE name = ? ORDER BY path, line', (module,)).fetchall()
+
+    def find_instances(self, module):
+        """Return [(instance, parent, path, line)] for every instantiation of module."""
+        return self.conn.execute(
+            'SELECT instance, parent, path, line FROM instances WHERE module = ? ORDER BY path, line', (module,)).fetchall()
+
+    def files_instantiating(self, modules, under=None, extensions=None):
+        placeholders = ','.join('?' * len(modules))
+        rows = self.conn.execute(
+            f'SELECT DISTINCT path FROM instances WHERE module IN ({placeholders}) ORDER BY path', list(modules)).fetchall()
+        paths = [path for (path,) in rows]
+        if under:
+            root = os.path.join(os.path.abspath(under), '')
+            paths = [path for path in paths if path.startswith(root)]
+        if extensions:
+            paths = [path for path in paths if path.endswith(tuple(extensions))]
+        return paths
+
+    def module_ports(self, module):
+        rows = self.conn.execute(
+            'SELECT name, msb, lsb, width, direction, type FROM ports WHERE module = ? ORDER BY path, position', (module,)).fetchall()
+        return [dict(zip(PORT_FIELDS, row)) for row in rows]
+
+    def file_ports(self, file_path):
+        # Same list extract_vports would build for the file
+        rows = self.conn.execute(
+            'SELECT name, msb, lsb, width, direction, type FROM ports WHERE path = ? ORDER BY position',
+            (os.path.abspath(file_path),)).fetchall()
+        return [dict(zip(PORT_FIELDS, row)) for row in rows]
+
+    def file_parameters(self, file_path):
+        # Same list vexpr.parse_parameters would build for the file
+        rows = self.conn.execute(
+            'SELECT position, kind, name, expr FROM parameters WHERE path = ? ORDER BY position',
+            (os.path.abspath(file_path),)).fetchall()
+        return [vexpr.Parameter(*row) for row in rows]
+
+    def file_defines(self, file_path):
+        rows = self.conn.execute('SELECT name, value FROM defines WHERE path = ?', (os.path.abspath(file_path),)).fetchall()
+        return dict(rows)
+
+    def children(self, module):
+        return self.conn.execute(
+            'SELECT DISTINCT module, instance FROM instances WHERE parent = ? ORDER BY instance', (module,)).fetchall()
+
+    def hierarchy(self, top, max_depth=None):
+        """Transitive instance tree below top as nested {instance: {module, children}}."""
+        def expand(module, depth, path):
+            if module in path or (max_depth is not None and depth >= max_depth):
+                return {}
+            return {
+                instance: {'module': child, 'children': expand(child, depth + 1, path | {module})}
+                for child, instance in self.children(module)
+            }
+        return {'module': top, 'children': expand(top, 0, frozenset())}
+
+    def users(self, module):
+        """All modules that transitively instantiate module."""
+        found, frontier = set(), {module}
+        while frontier:
+            placeholders = ','.join('?' * len(frontier))
+            rows = self.conn.execute(
+                f'SELECT DISTINCT parent FROM instances WHERE module IN ({placeholders})', list(frontier)).fetchall()
+            frontier = {parent for (parent,) in rows if parent and parent not in found}
+            found |= frontier
+        return sorted(found)
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental index of Verilog modules, instances and ports.')
+    parser.add_argument('--db', default='design_index.db', help='Index database file (default: design_index.db)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    update_parser = subparsers.add_parser('update', help='Scan directories and reparse changed files')
+    update_parser.add_argument('search_dirs', nargs='+', help='Directories to index')
+    update_parser.add_argument('--exclude_dirs', nargs='*', default=[], help='Directories to exclude')
+
+    instances_parser = subparsers.add_parser('instances', help='List instantiations of a module')
+    instances_parser.add_argument('module')
+
+    ports_parser = subparsers.add_parser('ports', help='Print the ports of a module as JSON')
+    ports_parser.add_argument('module')
+
+    hierarchy_parser = subparsers.add_parser('hierarchy', help='Print the instance tree below a module as JSON')
+    hierarchy_parser.add_argument('module')
+    hierarchy_parser.add_argument('--depth', type=int, default=None, help='Maximum depth')
+
+    users_parser = subparsers.add_parser('users', help='List modules that transitively instantiate a module')
+    users_parser.add_argument('module')
+    vlex.add_define_argument(parser)
+    instrument.add_arguments(parser)
+
+    args = parser.parse_args()
+
+    with instrument.session(args):
+        with DesignIndex(args.db, vlex.parse_define_args(args.define)) as index:
+            if args.command == 'update':
+                seen, reparsed, removed = index.update(args.search_dirs, args.exclude_dirs)
+                print(f"Indexed {seen} files: {reparsed} reparsed, {removed} removed")
+            elif args.command == 'instances':
+                for instance, parent, path, line in index.find_instances(args.module):
+                    print(f"{path}:{line}: {parent}.{instance}")
+            elif args.command == 'ports':
+                print(json.dumps(index.module_ports(args.module), indent=4))
+            elif args.command == 'hierarchy':
+                print(json.dumps(index.hierarchy(args.module, args.depth), indent=4))
+            elif args.command == 'users':
+                for module in index.users(args.module):
+                    print(module)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+import os
+import re
+import mmap
+import instrument
+from collections import OrderedDict, namedtuple
+
+# Shared Verilog source reader used by the extraction scripts. A file is read
+# once (through mmap), then exposed as:
+#   raw     - the file text
+#   active  - raw with `ifdef'd-out lines blanked (only when defines are given)
+#   code    - active with comments blanked as well
+# Blanking keeps every newline (and every offset in `code`), so line numbers
+# and regex offsets still point into the original file. Tokens and joined
+# statements are produced lazily from the code lines. load() keeps a small
+# per-process LRU cache so several tools run in one process lex each file
+# only once; iter_lines() serves cached and small files from that cache and
+# streams large ones a line at a time. Pool workers call disable_cache().
+# Text is decoded byte for byte (latin-1) so offsets match the file; decode()
+# turns text headed for output back into UTF-8.
+
+Token = namedtuple('Token', 'kind value line')
+Statement = namedtuple('Statement', 'line text')
+
+COMMENT_PATTERN = re.compile(r'"(?:\\.|[^"\\\n])*"|//[^\n]*|/\*.*?\*/', re.DOTALL)
+# The same on one line, where a /* may be left open
+LINE_COMMENT_PATTERN = re.compile(r'"(?:\\.|[^"\\\n])*"|//[^\n]*|/\*.*?\*/|(?P<open>/\*[^\n]*)')
+DIRECTIVE_PATTERN = re.compile(r'^\s*`(ifdef|ifndef|elsif|else|endif|define|undef)\b\s*(\w*)')
+TOKEN_PATTERN = re.compile(r'''
+    (?P<space>\s+)
+  | (?P<number>(?:\d[\d_]*)?'[sS]?[bBoOdDhH][0-9a-fA-FxXzZ?_]+|\d[\d_]*(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_][\w$]*|\\\S+)
+  | (?P<system>\$[\w$]+)
+  | (?P<directive>`\w+)
+  | (?P<string>"(?:\\.|[^"\\\n])*")
+  | (?P<op><<<|>>>|===|!==|<<=|>>=|\*\*|<=|>=|==|!=|&&|\|\||<<|>>|->|::|\+:|-:|[-+*/%<>=!~&|^?:;,.#@(){}\[\]'])
+  | (?P<other>.)
+''', re.VERBOSE | re.DOTALL)
+
+# Keywords that sit on their own and end the statement before them
+BLOCK_KEYWORDS = {
+    'begin', 'end', 'endmodule', 'endcase', 'endfunction', 'endtask', 'endgenerate',
+    'generate', 'fork', 'join', 'join_any', 'join_none', 'endinterface', 'endpackage',
+    'endclass', 'endprogram', 'endproperty', 'endsequence',
+}
+
+def _spaces(text):
+    # Keep line breaks (and therefore line numbers); everything else becomes a space
+    return re.sub(r'[^\r\n]', ' ', text)
+
+def _blank(match):
+    text = match.group(0)
+    if text[0] == '"':
+        return text
+    return _spaces(text)
+
+def strip_comments(text):
+    """Blank out // and /* */ comments, leaving string literals alone."""
+    return COMMENT_PATTERN.sub(_blank, text)
+
+class _Conditions:
+    # `ifdef/`ifndef/`elsif/`else/`endif state, fed one comment-free line at a
+    # time. `define and `undef in active regions update a copy of defines.
+    def __init__(self, defines):
+        self.defines = dict(defines)
+        # Stack of (parent active, this branch active, a branch already taken)
+        self.stack = []
+        self.active = True
+
+    def keep(self, line):
+        """Advance past line and return whether it is active code (directive lines are not)."""
+        directive = DIRECTIVE_PATTERN.match(line)
+        if not directive:
+            return self.active
+
+        keyword, name = directive.groups()
+        stack = self.stack
+        if keyword in ('ifdef', 'ifndef'):
+            taken = (name in self.defines) == (keyword == 'ifdef')
+            stack.append((self.active, self.active and taken, taken))
+            self.active = self.active and taken
+        elif keyword == 'elsif' and stack:
+            parent, _, done = stack.pop()
+            taken = not done and name in self.defines
+            stack.append((parent, parent and taken, done or taken))
+            self.active = parent and taken
+        elif keyword == 'else' and stack:
+            parent, _, done = stack.pop()
+            stack.append((parent, parent and not done, True))
+            self.active = parent and not done
+        elif keyword == 'endif' and stack:
+            self.active = stack.pop()[0]
+        elif keyword == 'define' and self.active:
+            self.defines[name] = line[directive.end():].strip()
+            return True  # keep `define lines so the other tools can still see them
+        elif keyword == 'undef' and self.active:
+            self.defines.pop(name, None)
+        return False
+
+def inactive_lines(code, defines):
+    """Return the set of 0-based line numbers excluded by `ifdef/`ifndef blocks.
+
+    `define and `undef in active regions update a copy of defines as the file
+    is read. Directive lines themselves are reported as inactive.
+    """
+    conditions = _Conditions(defines)
+    return {number for number, line in enumerate(code.split('\n')) if not conditions.keep(line)}
+
+def _blank_lines(text, lines):
+    if not lines:
+        return text
+    return '\n'.join('' if n in lines else line for n, line in enumerate(text.split('\n')))
+
+class SourceFile:
+    def __init__(self, path, text, defines=None):
+        self.path = path
+        self.raw = text
+        self.defines = defines
+        self._stripped = None
+        self._inactive = None
+        self._active = None
+        self._code = None
+
+    def _stripped_raw(self):
+        if self._stripped is None:
+            self._stripped = strip_comments(self.raw)
+        return self._stripped
+
+    def _inactive_lines(self):
+        if self._inactive is None:
+            self._inactive = inactive_lines(self._stripped_raw(), self.defines)
+        return self._inactive
+
+    @property
+    def active(self):
+        # Raw text (comments included) with inactive conditional code removed
+        if self._active is None:
+            if self.defines is None:
+                self._active = self.raw
+            else:
+                self._active = _blank_lines(self.raw, self._inactive_lines())
+        return self._active
+
+    @property
+    def code(self):
+        # Comments and inactive conditional code removed
+        if self._code is None:
+            if self.defines is None:
+                self._code = self._stripped_raw()
+            else:
+                self._code = _blank_lines(self._stripped_raw(), self._inactive_lines())
+        return self._code
+
+    def lines(self, comments=False):
+        """Lazily yield the lines of code (or of the active text when comments are wanted)."""
+        text = self.active if comments else self.code
+        start, end = 0, len(text)
+        while start < end:
+            stop = text.find('\n', start)
+            if stop < 0:
+                stop = end
+            line = text[start:stop]
+            yield line[:-1] if line.endswith('\r') else line
+            start = stop + 1
+        if start == end and self.raw and not self.raw.endswith('\n'):
+            # A last line without a newline that was blanked to nothing
+            yield ''
+
+    def tokens(self):
+        """Lazily yield Token(kind, value, line) from the comment-free code."""
+        return tokenize(self.lines())
+
+    def statements(self):
+        """Lazily yield Statement(line, text), joining multi-line statements."""
+        return join_statements(self.tokens())
+
+def tokenize(lines, first_line=1):
+    """Lazily yield Token(kind, value, line) from comment-free code lines."""
+    for number, line in enumerate(lines, first_line):
+        for match in TOKEN_PATTERN.finditer(line):
+            kind = match.lastgroup
+            if kind != 'space':
+                yield Token(kind, match.group(), number)
+
+def join_statements(tokens):
+    """Lazily yield Statement(line, text) from a token stream.
+
+    A statement ends at ';' outside parentheses/braces. Block keywords such
+    as begin/end/endmodule are emitted as statements of their own. The
+    text is the statement's tokens joined by single spaces.
+    """
+    parts, first_line, depth = [], None, 0
+    for token in tokens:
+        if token.kind == 'directive':
+            continue
+        if token.kind == 'ident' and token.value in BLOCK_KEYWORDS and depth == 0:
+            if parts:
+                yield Statement(first_line, ' '.join(parts))
+                parts = []
+            yield Statement(token.line, token.value)
+            continue
+        if not parts:
+            first_line = token.line
+        parts.append(token.value)
+        if token.kind == 'op' and token.value in ('(', '{', '['):
+            depth += 1
+        elif token.kind == 'op' and token.value in (')', '}', ']'):
+            depth = max(depth - 1, 0)
+        elif token.value == ';' and depth == 0:
+            yield Statement(first_line, ' '.join(parts))
+            parts = []
+    if parts:
+        yield Statement(first_line, ' '.join(parts))
+
+def _strip_line(line, in_block):
+    # Blank the comments in one line. in_block says whether a /* */ comment
+    # is open at the start of the line; returns (line, in_block at its end).
+    prefix = ''
+    if in_block:
+        end = line.find('*/')
+        if end < 0:
+            return _spaces(line), True
+        prefix, line = _spaces(line[:end + 2]), line[end + 2:]
+    opened = False
+
+    def blank(match):
+        nonlocal opened
+        if match.group(0)[0] == '"':
+            return match.group(0)
+        opened = match.lastgroup == 'open'
+        return _spaces(match.group(0))
+
+    return prefix + LINE_COMMENT_PATTERN.sub(blank, line), opened
+
+def lex_lines(lines, defines=None, comments=False):
+    """Lazily turn raw lines (without line endings) into the lines SourceFile.lines() yields.
+
+    Comments are tracked across lines and `ifdef blocks are evaluated as the
+    lines go by, so nothing but the current line is held in memory.
+    """
+    conditions = None if defines is None else _Conditions(defines)
+    in_block = False
+    for line in lines:
+        if comments and conditions is None:
+            yield line
+            continue
+        stripped, in_block = _strip_line(line, in_block)
+        if conditions is not None and not conditions.keep(stripped):
+            yield ''
+        else:
+            yield line if comments else stripped
+
+def read_lines(path):
+    """Lazily yield the lines of path, decoded byte-for-byte (latin-1), split on '\\n' only."""
+    size = 0
+    with open(path, 'rb') as f:
+        instrument.count('files_read')
+        try:
+            for raw in f:
+                size += len(raw)
+                line = raw.decode('latin-1').rstrip('\n')
+                yield line[:-1] if line.endswith('\r') else line
+        finally:
+            instrument.count('bytes_read', size)
+
+# Files at least this large are streamed by iter_lines() instead of cached
+STREAM_SIZE = 1 << 20
+
+def iter_lines(path, defines=None, comments=False):
+    """Lazily yield the code (or active text) lines of path.
+
+    A file already in the cache, or small enough to be added to it, is served
+    from the shared SourceFile so a run lexes it once whichever tool asks
+    first; larger files are read a line at a time.
+    """
+    if _cache_enabled:
+        key = _cache_key(path, defines)
+        if key in _cache or key[2] < STREAM_SIZE:
+            return load(path, defines).lines(comments)
+    return lex_lines(read_lines(path), defines, comments)
+
+def iter_tokens(path, defines=None):
+    """Lazily yield the Tokens of path's code."""
+    return tokenize(iter_lines(path, defines))
+
+def iter_statements(path, defines=None):
+    """Lazily yield the joined Statements of path's code."""
+    return join_statements(iter_tokens(path, defines))
+
+def read_text(path):
+    """Read a whole file through mmap and decode it byte-for-byte (latin-1)."""
+    with open(path, 'rb') as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                data = mm[:]
+        except ValueError:
+            # Empty files cannot be mapped
+            data = b''
+    instrument.count('files_read')
+    instrument.count('bytes_read', len(data))
+    return data.decode('latin-1')
+
+def _defines_key(defines):
+    return None if defines is None else tuple(sorted(defines.items()))
+
+CACHE_SIZE = 256
+_cache = OrderedDict()
+_cache_enabled = True
+
+def _cache_key(path, defines):
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_mtime_ns, st.st_size, _defines_key(defines)
+
+def disable_cache():
+    """Stop caching SourceFiles in this process (pool workers see each file once)."""
+    global _cache_enabled
+    _cache_enabled = False
+    _cache.clear()
+
+def load(path, defines=None, cache=True):
+    """Return the SourceFile for path, reusing the per-process cache when the file is unchanged."""
+    if not (cache and _cache_enabled):
+        return SourceFile(path, read_text(path), defines)
+    key = _cache_key(path, defines)
+    source = _cache.get(key)
+    if source is not None:
+        _cache.move_to_end(key)
+        instrument.count('lex_cache_hits')
+        return source
+    source = _cache[key] = SourceFile(key[0], read_text(path), defines)
+    if len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+    return source
+
+def from_text(text, path='<text>', defines=None):
+    return SourceFile(path, text, defines)
+
+def decode(text, encoding='utf-8'):
+    """Decode lexer text (latin-1, byte for byte) as encoding, replacing invalid bytes."""
+    return text.encode('latin-1').decode(encoding, 'replace')
+
+def parse_define_args(values):
+    """Turn -D NAME or -D NAME=VALUE arguments into a defines dict (None when none given)."""
+    if not values:
+        return None
+    defines = {}
+    for value in values:
+        name, _, text = value.partition('=')
+        defines[name] = text
+    return defines
+
+def add_define_argument(parser):
+    parser.add_argument('-D', '--define', action='append', default=[], metavar='NAME[=VALUE]',
+                        help='Preprocessor define; when any are given, `ifdef blocks are evaluated')
@@ -1,45 +1,82 @@
+import os
 import re
 import json
+import hashlib
+import argparse
 import pandas as pd
+import vlex
+import fileutil
+import instrument
+from concurrent.futures import ProcessPoolExecutor
+
+HARMONIZE_PATTERN = re.compile(r'[^A-Za-z0-9]')
+FIELD_PATTERN = re.compile(r"(\w+QNew\w+)\s*=\s*.*;")
+QUEUE_PATTERN = re.compile(r"(\w+)QNew")
+QUEUE_PREFIX_PATTERN = re.compile(r"\w+QNew")
+COMMENT_PATTERN = re.compile(r"//\s*(.*)")
 
 def harmonize_field_name(field_name):
     """Standardize the field name by removing special characters and converting to uppercase."""
-    return re.sub(r'[^A-Za-z0-9]', '', field_name).upper()
+    return HARMONIZE_PATTERN.sub('', field_name).upper()
 
-def parse_verilog(file_path):
-    """Extract fields from Verilog file and harmonize their names."""
+def extract_queue_fields(file_path, defines=None):
+    """Scan a Verilog file and return its queue fields, without writing anything."""
     queue_data = {}
 
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
+    # Lines are streamed through the shared lexer with `ifdef'd-out code
+    # removed; the comments are kept since they carry the field descriptions
+    for line in vlex.iter_lines(file_path, defines, comments=True):
+        # Cheap substring test before any regex runs
+        if 'QNew' not in line:
+            continue
+        # The lexer works on latin-1; the comments go to the output as UTF-8
+        line = vlex.decode(line)
+        field_match = FIELD_PATTERN.search(line)
+        if not field_match:
+            continue
+
+        full_field = field_match.group(1)
+        queue_name = QUEUE_PATTERN.match(full_field).group(1)
+        field_name = QUEUE_PREFIX_PATTERN.sub("", full_field)
+
+        # Harmonize names
+        harmonized_field = harmonize_field_name(field_name)
+        harmonized_queue = harmonize_field_name(queue_name)
+
+        comment_match = COMMENT_PATTERN.search(line)
+        comment = comment_match.group(1).strip() if comment_match else ""
+
+        queue_data.setdefault(harmonized_queue, []).append({
+            "field": harmonized_field,
+            "comment": comment
+        })
 
-    field_pattern = re.compile(r"(\w+QNew\w+)\s*=\s*.*;")
-    comment_pattern = re.compile(r"//\s*(.*)")
+    return queue_data
 
-    for line in lines:
-        field_match = field_pattern.search(line)
-        if field_match:
-            full_field = field_match.group(1)
-            queue_name = re.match(r"(\w+)QNew", full_field).group(1)
-            field_name = re.sub(r"\w+QNew", "", full_field)
-            
-            # Harmonize names
-            harmonized_field = harmonize_field_name(field_name)
-            harmonized_queue = harmonize_field_name(queue_name)
+def extract_queue_fields_from_files(file_paths, jobs=None, defines=None):
+    """Extract queue fields from many files in parallel, merged in file order."""
+    queue_data = {}
 
-            comment_match = comment_pattern.search(line)
-            comment = comment_match.group(1).strip() if comment_match else ""
+    if len(file_paths) == 1:
+        results = [extract_queue_fields(file_paths[0], defines)]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=vlex.disable_cache) as executor:
+            results = list(executor.map(extract_queue_fields, file_paths, [defines] * len(file_paths)))
 
-            if harmonized_queue not in queue_data:
-                queue_data[harmonized_queue] = []
+    # executor.map keeps input order, so the merge does not depend on scheduling
+    for file_data in results:
+        for queue_name, fields in file_data.items():
+            queue_data.setdefault(queue_name, []).extend(fields)
 
-            queue_data[harmonized_queue].append({
-                "field": harmonized_field,
-                "comment": comment
-            })
+    return queue_data
 
-    with open("queue_fields.json", "w") as json_file:
-        json.dump(queue_data, json_file, indent=4)
+def parse_verilog(file_path, json_path="queue_fields.json", defines=None):
+    """Extract fields from Verilog file and harmonize their names."""
+    queue_data = extract_queue_fields(file_path, defines)
+
+    if json_path:
+        with open(json_path, "w") as json_file:
+            json.dump(queue_data, json_file, indent=4)
 
     return queue_data
 
@@ -65,6 +102,64 @@ def read_queue_fields_from_excel(file_path):
 
     return queue_data
 
+def _parse_workbook_fast(file_path):
+    """Read only the Field/Comment columns of every sheet and harmonize them vectorized."""
+    sheets = pd.read_excel(
+        file_path,
+        sheet_name=None,
+        usecols=lambda column: column in ('Field', 'Comment'),
+        engine='openpyxl',  # pandas opens the workbook read-only/streaming
+    )
+    queue_data = {}
+
+    for sheet_name, df in sheets.items():
+        harmonized_queue = harmonize_field_name(sheet_name)
+        harmonized_fields = df['Field'].fillna('').astype(str).str.replace(r'[^A-Za-z0-9]', '', regex=True).str.upper()
+        comments = df['Comment'] if 'Comment' in df else pd.Series([None] * len(df))
+
+        queue_data[harmonized_queue] = [
+            {"field": field, "comment": comment}
+            for field, comment in zip(harmonized_fields.tolist(), comments.tolist())
+        ]
+
+    return queue_data
+
+def read_queue_fields_fast(file_path, cache_dir=None):
+    """Like read_queue_fields_from_excel, with an on-disk cache keyed by workbook mtime and hash."""
+    cache_dir = cache_dir or os.path.dirname(os.path.abspath(file_path))
+    cache_file = os.path.join(cache_dir, f".{os.path.basename(file_path)}.cache.json")
+    st = os.stat(file_path)
+
+    cached = None
+    if os.path.exists(cache_file):
+        # A truncated or otherwise unreadable cache is treated as a miss
+        try:
+            with open(cache_file, 'r') as f:
+                cached = json.load(f)
+            if cached['mtime_ns'] == st.st_mtime_ns and cached['size'] == st.st_size:
+                return cached['data']
+        except (OSError, ValueError, KeyError, TypeError):
+            cached = None
+
+    with open(file_path, 'rb') as f:
+        sha1 = hashlib.sha1(f.read()).hexdigest()
+
+    if cached and cached.get('sha1') == sha1 and 'data' in cached:
+        queue_data = cached['data']
+    else:
+        queue_data = _parse_workbook_fast(file_path)
+
+    # The cache is only an optimization: in a read-only spec directory the
+    # workbook is simply parsed again next time
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with fileutil.atomic_open(cache_file, prefix='.xls2json_') as f:
+            json.dump({'mtime_ns': st.st_mtime_ns, 'size': st.st_size, 'sha1': sha1, 'data': queue_data}, f)
+    except OSError:
+        pass
+
+    return queue_data
+
 def compare_data(verilog_data, excel_data):
     """Compare and harmonize data between Verilog and Excel sources."""
     combined_data = {}
@@ -86,13 +181,41 @@ def compare_data(verilog_data, excel_data):
 
     return combined_data
 
-# Usage
-verilog_data = parse_verilog("design.sv")
-excel_data = read_queue_fields_from_excel("queue_fields.xlsx")
-harmonized_data = compare_data(verilog_data, excel_data)
-
-# Save harmonized data to JSON
-with open("harmonized_queue_data.json", "w") as json_file:
-    json.dump(harmonized_data, json_file, indent=4)
-
-print("Harmonized data saved to 'harmonized_queue_data.json'.")
\ No newline at end of file
+def main():
+    parser = argparse.ArgumentParser(description="Harmonize queue fields between Verilog sources and an Excel spec.")
+    parser.add_argument("sv_files", nargs="*", help="SystemVerilog files to scan (default: design.sv)")
+    parser.add_argument("-f", "--filelist", help="Filelist of SystemVerilog files to scan")
+    parser.add_argument("--excel", default="queue_fields.xlsx", help="Queue spec workbook (default: queue_fields.xlsx)")
+    parser.add_argument("--fields-json", default="queue_fields.json",
+                        help="Where to write the extracted Verilog fields; pass '' to skip (default: queue_fields.json)")
+    parser.add_argument("-o", "--output", default="harmonized_queue_data.json", help="Harmonized output JSON")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Worker processes for parsing Verilog files")
+    vlex.add_define_argument(parser)
+    instrument.add_arguments(parser)
+    args = parser.parse_args()
+
+    with instrument.session(args):
+        sv_files = list(args.sv_files)
+        if args.filelist:
+            from filter_filelist import FilelistReader
+            sv_files += [entry for entry in FilelistReader(expand_incdirs=False).iter_entries(args.filelist)
+                         if entry[0] not in '+-']
+        if not sv_files:
+            sv_files = ["design.sv"]
+
+        verilog_data = extract_queue_fields_from_files(sv_files, args.jobs, vlex.parse_define_args(args.define))
+        if args.fields_json:
+            with open(args.fields_json, "w") as json_file:
+                json.dump(verilog_data, json_file, indent=4)
+
+        excel_data = read_queue_fields_fast(args.excel)
+        harmonized_data = compare_data(verilog_data, excel_data)
+
+        # Save harmonized data to JSON
+        with open(args.output, "w") as json_file:
+            json.dump(harmonized_data, json_file, indent=4)
+
+        print(f"Harmonized data saved to '{args.output}'.")
+
+if __name__ == "__main__":
+    main()